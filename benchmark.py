@@ -0,0 +1,182 @@
+"""Benchmark das operações do `GerenciadorEstoque` em catálogos sintéticos de vários tamanhos.
+
+Gera catálogos distribuídos por `CATEGORIAS_PADRAO`, mede tempo e pico de memória
+(tracemalloc) de carga, gravação, cadastro, movimentação, busca, estatísticas e
+relatórios, e grava os resultados em JSON. Com `--comparar`, confronta os resultados
+com uma execução anterior e termina com código 1 se alguma operação piorou além da tolerância.
+
+Uso:
+    python benchmark.py --saida base.json
+    python benchmark.py --tamanhos 1000,100000 --comparar base.json
+"""
+import argparse
+import json
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from gerenciador import (CATEGORIAS_PADRAO, LIMITE_RESULTADOS_BUSCA, TAMANHO_PAGINA, GerenciadorEstoque,
+                         PersistenciaBinaria, PersistenciaJson, migrar_json_para_sqlite)
+
+TAMANHOS_PADRAO = (1_000, 100_000, 1_000_000)
+EXTENSOES = {'json': '.json', 'bin': '.bin', 'sqlite': '.db'}
+TIPOS = ["Cabo", "Capa", "Carregador", "Película", "Fone", "Suporte", "Pendrive", "Smartphone", "Adaptador"]
+MARCAS = ["Samsung", "Apple", "Xiaomi", "Motorola", "JBL", "Kingston", "Baseus", "Ugreen", "Anker"]
+TERMOS_BUSCA = ["cabo", "pelicula samsung", "Fone JBL 12", "carreg", "xyz inexistente", "42"]
+
+def gerar_estado(tamanho: int, semente: int = 42) -> dict:
+    """Monta o estado de um catálogo sintético no formato de `_exportar_estado`."""
+    aleatorio = random.Random(semente)
+    produtos = {}
+    for id_produto in range(1, tamanho + 1):
+        produtos[id_produto] = {
+            'id': id_produto,
+            'nome': f"{aleatorio.choice(TIPOS)} {aleatorio.choice(MARCAS)} {aleatorio.randint(1, 999)}",
+            'categoria': aleatorio.choice(CATEGORIAS_PADRAO),
+            'descricao': aleatorio.choice(["Sem descrição", "Importado", "Nacional", "Linha premium"]),
+            'quantidade': aleatorio.randint(0, 200),
+            'preco': round(aleatorio.uniform(5, 3000), 2),
+        }
+    return {'seq': 0, 'proximo_id': tamanho + 1, 'categorias': sorted(CATEGORIAS_PADRAO), 'produtos': produtos}
+
+def criar_catalogo(pasta: Path, tamanho: int, persistencia: str) -> Path:
+    estado = gerar_estado(tamanho)
+    caminho_json = pasta / 'catalogo.json'
+    PersistenciaJson(caminho_json)._gravar_snapshot(estado)
+    if persistencia == 'json':
+        return caminho_json
+    caminho = pasta / f"catalogo{EXTENSOES[persistencia]}"
+    if persistencia == 'bin':
+        PersistenciaBinaria(caminho)._gravar_snapshot(estado)
+    else:
+        migrar_json_para_sqlite(caminho_json, caminho)
+    return caminho
+
+def medir(funcao, repeticoes: int, operacoes: int = 1) -> dict:
+    """Executa `funcao` `repeticoes` vezes (mais uma sob tracemalloc) e resume tempo e memória."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    tracemalloc.start()
+    funcao()
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'operacoes': operacoes,
+        'tempo_s': min(tempos),
+        'tempo_mediano_s': statistics.median(tempos),
+        'por_operacao_us': min(tempos) / operacoes * 1e6,
+        'pico_memoria_mb': pico / 1024 / 1024,
+    }
+
+def medir_tamanho(tamanho: int, persistencia: str, colunar: bool, repeticoes: int) -> dict[str, dict]:
+    pasta = Path(tempfile.mkdtemp(prefix='benchmark-estoque-'))
+    try:
+        caminho = criar_catalogo(pasta, tamanho, persistencia)
+        resultados = {}
+
+        def carregar():
+            GerenciadorEstoque(caminho, colunar=colunar).fechar()
+        resultados['_carregar_dados'] = medir(carregar, repeticoes)
+
+        gerenciador = GerenciadorEstoque(caminho, colunar=colunar)
+        resultados['_salvar_dados'] = medir(lambda: gerenciador._salvar_dados(), repeticoes)
+
+        aleatorio = random.Random(7)
+        ids = aleatorio.choices(range(1, tamanho + 1), k=2_000)
+        resultados['adicionar_produto'] = medir(
+            lambda: [gerenciador.adicionar_produto(f"Novo {i}", CATEGORIAS_PADRAO[i % len(CATEGORIAS_PADRAO)],
+                                                     "Benchmark", 10, 9.9) for i in range(500)],
+            repeticoes, 500)
+        resultados['movimentar_estoque'] = medir(
+            lambda: [gerenciador.movimentar_estoque(id_produto, 1) for id_produto in ids], repeticoes, len(ids))
+        resultados['buscar_produtos_por_termo'] = medir(
+            lambda: [gerenciador.buscar_produtos_por_termo(termo, limite=LIMITE_RESULTADOS_BUSCA)
+                       for termo in TERMOS_BUSCA], repeticoes, len(TERMOS_BUSCA))
+        resultados['obter_estatisticas'] = medir(
+            lambda: [gerenciador.obter_estatisticas() for _ in range(1_000)], repeticoes, 1_000)
+        resultados['obter_estatisticas_por_categoria'] = medir(
+            lambda: [gerenciador.obter_estatisticas_por_categoria() for _ in range(100)], repeticoes, 100)
+        resultados['relatorio_todos_produtos'] = medir(lambda: gerenciador.consultar_produtos(), repeticoes)
+        resultados['relatorio_estoque_baixo'] = medir(lambda: gerenciador.listar_estoque_baixo(), repeticoes)
+        resultados['pagina_de_produtos'] = medir(
+            lambda: gerenciador.consultar_produtos(deslocamento=tamanho // 2, limite=TAMANHO_PAGINA), repeticoes)
+        resultados['consulta_filtrada'] = medir(
+            lambda: gerenciador.consultar_produtos(categoria="Cabos", preco_min=100, preco_max=500,
+                                                     ordenar_por='preco', limite=TAMANHO_PAGINA), repeticoes)
+        gerenciador.fechar()
+        return resultados
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+def comparar(atual: dict, base: dict, tolerancia: float) -> list[str]:
+    """Lista as operações em que o tempo ou o pico de memória piorou mais que `tolerancia`."""
+    regressoes = []
+    for tamanho, operacoes in atual['resultados'].items():
+        for operacao, medida in operacoes.items():
+            referencia = base['resultados'].get(tamanho, {}).get(operacao)
+            if referencia is None:
+                continue
+            for campo, minimo in (('tempo_s', 5e-3), ('pico_memoria_mb', 1.0)):
+                # Valores muito pequenos oscilam demais para serem comparados em proporção.
+                if max(medida[campo], referencia[campo]) < minimo:
+                    continue
+                razao = medida[campo] / max(referencia[campo], 1e-12)
+                if razao > 1 + tolerancia:
+                    regressoes.append(f"{operacao} ({tamanho} produtos): {campo} {referencia[campo]:.4g} -> "
+                                      f"{medida[campo]:.4g} ({razao:.2f}x)")
+    return regressoes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tamanhos', default=','.join(map(str, TAMANHOS_PADRAO)),
+                        help="tamanhos de catálogo separados por vírgula (padrão: %(default)s)")
+    parser.add_argument('--persistencia', choices=EXTENSOES, default='json')
+    parser.add_argument('--colunar', action='store_true', help="usa o armazenamento colunar")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--saida', type=Path, help="arquivo JSON de resultados (padrão: saída padrão)")
+    parser.add_argument('--comparar', type=Path, help="JSON de uma execução anterior usada como referência")
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help="piora relativa aceita antes de acusar regressão (padrão: %(default)s)")
+    args = parser.parse_args()
+
+    relatorio = {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'persistencia': args.persistencia,
+        'colunar': args.colunar,
+        'resultados': {},
+    }
+    for tamanho in (int(valor) for valor in args.tamanhos.split(',')):
+        print(f"Medindo catálogo com {tamanho} produtos...", file=sys.stderr)
+        resultados = medir_tamanho(tamanho, args.persistencia, args.colunar, args.repeticoes)
+        relatorio['resultados'][str(tamanho)] = resultados
+        for operacao, medida in resultados.items():
+            print(f"  {operacao:<34}{medida['tempo_s'] * 1000:>12.2f} ms{medida['por_operacao_us']:>14.1f} us/op"
+                  f"{medida['pico_memoria_mb']:>10.1f} MB", file=sys.stderr)
+
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        args.saida.write_text(texto, encoding='utf-8')
+    else:
+        print(texto)
+
+    if args.comparar:
+        regressoes = comparar(relatorio, json.loads(args.comparar.read_text(encoding='utf-8')), args.tolerancia)
+        if regressoes:
+            print("Regressões em relação a " + str(args.comparar) + ":\n  " + "\n  ".join(regressoes), file=sys.stderr)
+            sys.exit(1)
+        print(f"Nenhuma regressão em relação a {args.comparar}.", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
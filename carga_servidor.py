@@ -0,0 +1,132 @@
+"""Teste de carga do `servidor.py`: vários clientes simultâneos em localhost, com conexões persistentes.
+
+Sem `--porta`, cria um catálogo sintético temporário e sobe o servidor em um subprocesso.
+Cada cliente repete, até o fim da duração, leituras (produto por ID, busca e estatísticas) e
+movimentações (`--escritas` é a fração delas). No fim, mostra a vazão e as latências (p50 e p99)
+por tipo de requisição.
+
+Uso:
+    python carga_servidor.py --clientes 50 --duracao 10
+    python carga_servidor.py --lote-maximo 1      # o mesmo, sem agrupar as escritas
+    python carga_servidor.py --porta 8080          # contra um servidor já em execução
+"""
+import argparse
+import asyncio
+import json
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from benchmark import TERMOS_BUSCA, criar_catalogo
+
+async def requisitar(leitor: asyncio.StreamReader, escritor: asyncio.StreamWriter,
+                     metodo: str, alvo: str, corpo: dict | None = None) -> tuple[int, bytes]:
+    dados = b'' if corpo is None else json.dumps(corpo).encode('utf-8')
+    escritor.write(f"{metodo} {alvo} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                   f"Content-Length: {len(dados)}\r\n\r\n".encode('latin-1') + dados)
+    await escritor.drain()
+    status = int((await leitor.readline()).split()[1])
+    tamanho = 0
+    while (cabecalho := await leitor.readline()) not in (b'\r\n', b''):
+        nome, _, valor = cabecalho.decode('latin-1').partition(':')
+        if nome.lower() == 'content-length':
+            tamanho = int(valor)
+    return status, await leitor.readexactly(tamanho)
+
+async def cliente(porta: int, semente: int, produtos: int, escritas: float, fim: float,
+                  latencias: dict[str, list[float]], status: Counter) -> None:
+    aleatorio = random.Random(semente)
+    leitor, escritor = await asyncio.open_connection('127.0.0.1', porta)
+    try:
+        while time.perf_counter() < fim:
+            sorteio = aleatorio.random()
+            if sorteio < escritas:
+                tipo, metodo, alvo = 'POST /movimentos', 'POST', '/movimentos'
+                corpo = {'id': aleatorio.randint(1, produtos), 'quantidade': aleatorio.randint(-3, 3) or 1, 'motivo': 'carga'}
+            else:
+                corpo, metodo = None, 'GET'
+                sorteio = aleatorio.random()
+                if sorteio < 0.6:
+                    tipo, alvo = 'GET /produtos/{id}', f"/produtos/{aleatorio.randint(1, produtos)}"
+                elif sorteio < 0.9:
+                    tipo, alvo = 'GET /produtos?termo=', f"/produtos?termo={aleatorio.choice(TERMOS_BUSCA).replace(' ', '+')}&limite=20"
+                else:
+                    tipo, alvo = 'GET /estatisticas', '/estatisticas'
+            inicio = time.perf_counter()
+            codigo, _ = await requisitar(leitor, escritor, metodo, alvo, corpo)
+            latencias[tipo].append(time.perf_counter() - inicio)
+            status[codigo] += 1
+    finally:
+        escritor.close()
+
+def percentil(valores: list[float], fracao: float) -> float:
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(fracao * len(valores)))]
+
+async def medir(porta: int, clientes: int, duracao: float, produtos: int, escritas: float) -> None:
+    latencias: dict[str, list[float]] = defaultdict(list)
+    status: Counter = Counter()
+    fim = time.perf_counter() + duracao
+    await asyncio.gather(*(cliente(porta, semente, produtos, escritas, fim, latencias, status)
+                           for semente in range(clientes)))
+    todas = [valor for valores in latencias.values() for valor in valores]
+    print(f"{clientes} clientes, {duracao:.0f} s, {escritas:.0%} de escritas: {len(todas)} requisições, "
+          f"{len(todas) / duracao:.0f} req/s; status {dict(sorted(status.items()))}")
+    print(f"  {'Requisição':<24}{'Total':>9}{'req/s':>9}{'p50 (ms)':>11}{'p99 (ms)':>11}")
+    for tipo, valores in sorted(latencias.items()) + [('todas', todas)]:
+        print(f"  {tipo:<24}{len(valores):>9}{len(valores) / duracao:>9.0f}"
+              f"{percentil(valores, 0.5) * 1000:>11.2f}{percentil(valores, 0.99) * 1000:>11.2f}")
+
+def porta_livre() -> int:
+    with socket.socket() as conexao:
+        conexao.bind(('127.0.0.1', 0))
+        return conexao.getsockname()[1]
+
+def esperar_servidor(porta: int, processo: subprocess.Popen, limite: float = 120.0) -> None:
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        if processo.poll() is not None:
+            sys.exit("O servidor terminou antes de aceitar conexões.")
+        try:
+            socket.create_connection(('127.0.0.1', porta), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    sys.exit("O servidor não respondeu a tempo.")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clientes', type=int, default=50)
+    parser.add_argument('--duracao', type=float, default=10.0, help="segundos de medição (padrão: %(default)s)")
+    parser.add_argument('--escritas', type=float, default=0.3, help="fração de movimentações (padrão: %(default)s)")
+    parser.add_argument('--produtos', type=int, default=10_000, help="tamanho do catálogo (padrão: %(default)s)")
+    parser.add_argument('--porta', type=int, help="servidor já em execução (senão, sobe um temporário)")
+    parser.add_argument('--lote-maximo', type=int, help="repassado ao servidor temporário")
+    args = parser.parse_args()
+
+    if args.porta:
+        asyncio.run(medir(args.porta, args.clientes, args.duracao, args.produtos, args.escritas))
+        return
+    pasta = Path(tempfile.mkdtemp(prefix='carga-servidor-'))
+    porta = porta_livre()
+    comando = [sys.executable, str(Path(__file__).with_name('servidor.py')),
+               '--arquivo', str(criar_catalogo(pasta, args.produtos, 'json')), '--porta', str(porta)]
+    if args.lote_maximo:
+        comando += ['--lote-maximo', str(args.lote_maximo)]
+    processo = subprocess.Popen(comando)
+    try:
+        esperar_servidor(porta, processo)
+        asyncio.run(medir(porta, args.clientes, args.duracao, args.produtos, args.escritas))
+    finally:
+        processo.terminate()  # O servidor conclui as escritas da fila e informa quantas transações fez.
+        processo.wait()
+        shutil.rmtree(pasta, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Teste de estresse: vários processos movimentando o mesmo estoque ao mesmo tempo.
+
+Cada processo abre o seu próprio `GerenciadorEstoque` sobre os mesmos arquivos e faz
+movimentações aleatórias (algumas em lote, muitas saídas maiores que o estoque) e alguns
+cadastros. No final, o estoque relido do disco precisa bater exatamente com o estoque
+inicial somado às movimentações que cada processo viu confirmadas.
+
+Uso: python estresse_concorrencia.py [processos] [operacoes_por_processo] [json|bin|db|pasta]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from multiprocessing import Pool
+from pathlib import Path
+
+from gerenciador import CATEGORIAS_PADRAO, GerenciadorEstoque
+
+PRODUTOS_INICIAIS = 50
+QUANTIDADE_INICIAL = 20
+# Diário pequeno para que as compactações (e a troca de diário) aconteçam durante o teste.
+LIMITE_DIARIO = 16 * 1024
+
+def trabalhador(argumentos: tuple[str, int, int]) -> tuple[Counter, dict[int, int], int]:
+    caminho, semente, operacoes = argumentos
+    aleatorio = random.Random(semente)
+    gerenciador = GerenciadorEstoque(caminho, limite_diario=LIMITE_DIARIO)
+    movimentado: Counter = Counter()
+    cadastrados: dict[int, int] = {}
+    recusados = 0
+    for i in range(operacoes):
+        sorteio = aleatorio.random()
+        try:
+            if sorteio < 0.7:
+                id_produto, quantidade = aleatorio.randint(1, PRODUTOS_INICIAIS), aleatorio.randint(-6, 5)
+                gerenciador.movimentar_estoque(id_produto, quantidade)
+                movimentado[id_produto] += quantidade
+            elif sorteio < 0.95:
+                movimentos = [(aleatorio.randint(1, PRODUTOS_INICIAIS), aleatorio.randint(-4, 4))
+                              for _ in range(aleatorio.randint(2, 4))]
+                gerenciador.movimentar_estoque_em_lote(movimentos)
+                for id_produto, quantidade in movimentos:
+                    movimentado[id_produto] += quantidade
+            else:
+                quantidade = aleatorio.randint(0, 30)
+                produto = gerenciador.adicionar_produto(f"Produto {semente}-{i}", aleatorio.choice(CATEGORIAS_PADRAO),
+                                                        "Estresse", quantidade, 9.9)
+                cadastrados[produto.id] = quantidade
+        except ValueError:
+            recusados += 1
+    gerenciador.fechar()
+    return movimentado, cadastrados, recusados
+
+def main():
+    processos = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    operacoes = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    formato = sys.argv[3] if len(sys.argv) > 3 else 'json'
+    pasta = Path(tempfile.mkdtemp(prefix='estresse-'))
+    # Um caminho terminado em separador ativa o armazenamento fragmentado por categoria.
+    caminho = str(pasta / 'estoque') + os.sep if formato == 'pasta' else str(pasta / f"estoque.{formato}")
+
+    gerenciador = GerenciadorEstoque(caminho)
+    gerenciador.adicionar_produtos_em_lote(
+        [{'nome': f"Produto {i}", 'categoria': CATEGORIAS_PADRAO[i % len(CATEGORIAS_PADRAO)], 'descricao': "Inicial",
+          'quantidade': QUANTIDADE_INICIAL, 'preco': 10.0} for i in range(1, PRODUTOS_INICIAIS + 1)])
+    gerenciador.fechar()
+
+    inicio = time.perf_counter()
+    with Pool(processos) as pool:
+        resultados = pool.map(trabalhador, [(caminho, semente, operacoes) for semente in range(processos)])
+    duracao = time.perf_counter() - inicio
+
+    movimentado: Counter = Counter()
+    cadastrados: dict[int, int] = {}
+    recusados = 0
+    for movimentado_p, cadastrados_p, recusados_p in resultados:
+        movimentado.update(movimentado_p)
+        assert not cadastrados.keys() & cadastrados_p.keys(), "Dois processos cadastraram o mesmo ID."
+        cadastrados.update(cadastrados_p)
+        recusados += recusados_p
+
+    final = GerenciadorEstoque(caminho)
+    final.persistencia.garantir(final)  # Com ESTOQUE_SOB_DEMANDA=1, lê todos os fragmentos.
+    erros = []
+    for id_produto in range(1, PRODUTOS_INICIAIS + 1):
+        esperado = QUANTIDADE_INICIAL + movimentado[id_produto]
+        if final.produtos[id_produto].quantidade != esperado:
+            erros.append(f"ID {id_produto}: {final.produtos[id_produto].quantidade} (esperado {esperado})")
+    for id_produto, quantidade in cadastrados.items():
+        if id_produto not in final.produtos or final.produtos[id_produto].quantidade != quantidade:
+            erros.append(f"Produto cadastrado {id_produto} ausente ou com quantidade errada.")
+    if len(final.produtos) != PRODUTOS_INICIAIS + len(cadastrados):
+        erros.append(f"{len(final.produtos)} produtos (esperado {PRODUTOS_INICIAIS + len(cadastrados)}).")
+    if any(produto.quantidade < 0 for produto in final.produtos.values()):
+        erros.append("Há produtos com estoque negativo.")
+    estatisticas = final.obter_estatisticas()
+    if estatisticas['total_itens'] != sum(produto.quantidade for produto in final.produtos.values()):
+        erros.append("Estatísticas divergem da soma das quantidades.")
+    final.fechar()
+
+    total = processos * operacoes
+    print(f"{processos} processos x {operacoes} operações ({formato}) em {duracao:.1f} s "
+          f"({total / duracao:.0f} op/s); {recusados} saídas recusadas por falta de estoque; "
+          f"{len(cadastrados)} produtos cadastrados; arquivos em {pasta}")
+    if erros:
+        print("FALHOU:\n  " + "\n  ".join(erros))
+        sys.exit(1)
+    print("OK: totais finais exatos.")
+
+if __name__ == "__main__":
+    main()
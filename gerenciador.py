@@ -1,11 +1,36 @@
+import atexit
+import bisect
+import functools
+import heapq
+import itertools
 import json
+import math
+import mmap
 import os
+import re
+import struct
 import sys
+import threading
+import time
+import unicodedata
+import zlib
+from abc import ABC, abstractmethod
+from array import array
+from collections import deque
+from collections.abc import Iterable, Iterator, MutableMapping
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
 from enum import StrEnum
 from typing import Any
 
+try:
+    import fcntl
+except ImportError:  # Windows: travas de arquivo via msvcrt.
+    fcntl = None
+    import msvcrt
+
 # --- CONFIGURAÇÕES E TIPOS DE DADOS ---
 
 CATEGORIAS_PADRAO = [
@@ -13,6 +38,30 @@ CATEGORIAS_PADRAO = [
     "Fones de ouvido", "Suporte", "Películas"
 ]
 
+# Quantidade máxima de resultados exibidos na tela de busca (os mais relevantes primeiro).
+LIMITE_RESULTADOS_BUSCA = 100
+
+# Quantidade de produtos por página nas telas de seleção de produto.
+TAMANHO_PAGINA = 20
+
+# Tamanho (em bytes) a partir do qual o diário de operações é compactado em um novo snapshot.
+LIMITE_DIARIO_BYTES = 4 * 1024 * 1024
+
+# Produtos lidos do SQLite mantidos em memória; ao passar disso, os mais antigos são descartados.
+LIMITE_CACHE_SQLITE = 100_000
+
+# Entradas por bloco do `IndiceOrdenado` (um bloco é dividido ao passar do dobro).
+TAMANHO_BLOCO_INDICE = 1_000
+
+# Quantidade de linhas validadas e gravadas de uma vez na importação de produtos.
+TAMANHO_BLOCO_IMPORTACAO = 10_000
+
+# Quantidade de linhas do comando `lote` confirmadas em uma mesma transação (uma gravação por bloco).
+TAMANHO_BLOCO_LOTE = 1_000
+
+# Arquivo do estoque usado pelo menu e pela linha de comando quando nenhum outro é informado.
+ARQUIVO_PADRAO = 'meu_estoque.json'
+
 class Cores(StrEnum):
     """Enum para códigos de cores ANSI, facilitando a manutenção do estilo."""
     HEADER = '\033[95m'
@@ -25,9 +74,9 @@ class Cores(StrEnum):
     BOLD = '\033[1m'
     UNDERLINE = '\033[4m'
 
-@dataclass
+@dataclass(slots=True)
 class Produto:
-    """Representa a estrutura de um produto usando um dataclass."""
+    """Representa a estrutura de um produto usando um dataclass (com __slots__, sem __dict__ por instância)."""
     id: int
     nome: str
     categoria: str
@@ -35,119 +84,3024 @@ class Produto:
     quantidade: int
     preco: float
 
-class GerenciadorEstoque:
-    """Classe responsável pela lógica de negócio e persistência dos dados."""
-    def __init__(self, nome_arquivo: str | Path = 'estoque.json', estoque_minimo: int = 10):
-        self.caminho_arquivo = Path(nome_arquivo)
+CAMPOS_PRODUTO = ('id', 'nome', 'categoria', 'descricao', 'quantidade', 'preco')
+CAMPOS_ORDENACAO = ('nome', 'quantidade', 'preco')
+
+def produto_para_dict(produto: Any) -> dict[str, Any]:
+    """Converte um produto (Produto ou ProdutoColunar) em dicionário serializável."""
+    return {campo: getattr(produto, campo) for campo in CAMPOS_PRODUTO}
+
+def normalizar_texto(texto: str) -> str:
+    """Converte o texto para minúsculas e remove os acentos ("Películas" -> "peliculas")."""
+    if texto.isascii():
+        return texto.lower()
+    decomposto = unicodedata.normalize('NFKD', texto.casefold())
+    return ''.join(c for c in decomposto if not unicodedata.combining(c))
+
+def _trigramas(texto: str) -> set[str]:
+    """Retorna os trigramas do texto; textos com menos de 3 caracteres viram uma única chave."""
+    if len(texto) < 3:
+        return {texto}
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+@functools.cache
+def _numpy() -> Any:
+    """Importa o NumPy no primeiro uso (ele só serve ao armazenamento colunar e custa caro na partida)."""
+    try:
+        import numpy
+    except ImportError:  # NumPy é opcional: sem ele, o armazenamento colunar usa apenas array/itertools.
+        return None
+    return numpy
+
+class IndiceBusca:
+    """Índice invertido de trigramas sobre os nomes normalizados, com os produtos agrupados por categoria.
+
+    É atualizado incrementalmente pelo `GerenciadorEstoque`, de modo que uma busca só
+    visita as listas de candidatos dos trigramas do termo, e não o catálogo inteiro.
+    As listas são `array` de IDs (8 bytes por entrada, contra ~60 de um `set`) que só crescem:
+    remover um produto deixa as entradas antigas, que a busca descarta ao conferir o nome, e
+    as listas são refeitas quando as entradas obsoletas passam da metade.
+    """
+    campos = frozenset({'nome', 'categoria'})
+
+    def __init__(self):
+        self._postagens: dict[str, array] = {}
+        self._nomes: dict[int, str] = {}
+        self._entradas = 0
+        self._obsoletas = 0
+        self._por_categoria: dict[str, set[int]] = {}
+        self._categorias_normalizadas: dict[str, str] = {}
+
+    def adicionar(self, produto: Produto) -> None:
+        nome = normalizar_texto(produto.nome)
+        self._nomes[produto.id] = nome
+        self._indexar_nome(produto.id, nome)
+        if produto.categoria not in self._por_categoria:
+            self._por_categoria[produto.categoria] = set()
+            self._categorias_normalizadas[produto.categoria] = normalizar_texto(produto.categoria)
+        self._por_categoria[produto.categoria].add(produto.id)
+
+    def remover(self, produto: Produto) -> None:
+        nome = self._nomes.pop(produto.id)
+        self._obsoletas += len(_trigramas(nome))
+        if self._obsoletas > 1024 and self._obsoletas * 2 > self._entradas:
+            self._reconstruir()
+        ids_categoria = self._por_categoria[produto.categoria]
+        ids_categoria.discard(produto.id)
+        if not ids_categoria:
+            del self._por_categoria[produto.categoria]
+            del self._categorias_normalizadas[produto.categoria]
+
+    def _indexar_nome(self, id_produto: int, nome: str) -> None:
+        trigramas = _trigramas(nome)
+        for trigrama in trigramas:
+            postagem = self._postagens.get(trigrama)
+            if postagem is None:
+                postagem = self._postagens[trigrama] = array('q')
+            postagem.append(id_produto)
+        self._entradas += len(trigramas)
+
+    def _reconstruir(self) -> None:
+        """Refaz as listas de candidatos só com os nomes atuais, descartando as entradas obsoletas."""
+        self._postagens = {}
+        self._entradas = self._obsoletas = 0
+        for id_produto, nome in self._nomes.items():
+            self._indexar_nome(id_produto, nome)
+
+    def buscar(self, termo: str, limite: int | None = None) -> dict[int, tuple[int, str]]:
+        """Retorna {id: (relevância, nome normalizado)} dos produtos cujo nome ou categoria contém o termo.
+
+        Relevância (menor é melhor): 1 nome igual, 2 nome começa com o termo, 3 alguma
+        palavra começa com o termo, 4 nome contém o termo, 5 apenas a categoria contém.
+        Com `limite`, as correspondências só por categoria são omitidas se já houver
+        resultados suficientes pelo nome.
+        """
+        termo = normalizar_texto(termo)
+        if not termo:
+            return {id_p: (4, nome) for id_p, nome in self._nomes.items()}
+        if len(termo) >= 3:
+            # Parte da menor lista: a conferência do nome abaixo descarta quem não contém o termo inteiro.
+            candidatos = set(min((self._postagens.get(t, ()) for t in _trigramas(termo)), key=len))
+        else:
+            candidatos = set()
+            for chave, postagem in self._postagens.items():
+                if termo in chave:
+                    candidatos.update(postagem)
+        encontrados = {}
+        for id_p in candidatos:
+            nome = self._nomes.get(id_p)
+            if nome is None:  # entrada obsoleta de um produto removido
+                continue
+            if nome == termo:
+                encontrados[id_p] = (1, nome)
+            elif nome.startswith(termo):
+                encontrados[id_p] = (2, nome)
+            elif f' {termo}' in nome:
+                encontrados[id_p] = (3, nome)
+            elif termo in nome:
+                encontrados[id_p] = (4, nome)
+        if limite is not None and len(encontrados) >= limite:
+            return encontrados
+        for categoria, ids_categoria in self._por_categoria.items():
+            if termo in self._categorias_normalizadas[categoria]:
+                for id_p in ids_categoria:
+                    if id_p not in encontrados:
+                        encontrados[id_p] = (5, self._nomes[id_p])
+        return encontrados
+
+    def ids_da_categoria(self, categoria: str) -> set[int]:
+        """Retorna os IDs dos produtos de uma categoria (nome exato)."""
+        return self._por_categoria.get(categoria, set())
+
+class IndiceOrdenado:
+    """Pares (valor do campo, id) mantidos em ordem, para listagens, intervalos e paginação.
+
+    Os pares ficam em blocos ordenados de até 2 × `TAMANHO_BLOCO_INDICE` entradas. Inserir ou
+    remover acha o bloco por bisect e desloca só esse bloco (O(log n) mais o bloco), em vez da
+    lista inteira. Inserções feitas antes da primeira consulta (como na carga do arquivo) só são
+    acrescentadas; a ordenação e a divisão em blocos acontecem uma única vez, no primeiro uso.
+    """
+    def __init__(self, campo: str):
+        self.campo = campo
+        self.campos = frozenset({campo})
+        self._soltas: list[tuple[Any, int]] = []
+        self._blocos: list[list[tuple[Any, int]]] = []
+        self._maximos: list[tuple[Any, int]] = []  # a última entrada de cada bloco
+        self._total = 0
+
+    def _garantir_ordem(self) -> None:
+        if self._soltas:
+            entradas = sorted(itertools.chain(itertools.chain.from_iterable(self._blocos), self._soltas))
+            self._soltas = []
+            self._blocos = [entradas[i:i + TAMANHO_BLOCO_INDICE] for i in range(0, len(entradas), TAMANHO_BLOCO_INDICE)]
+            self._maximos = [bloco[-1] for bloco in self._blocos]
+
+    def adicionar(self, produto: Produto) -> None:
+        entrada = (getattr(produto, self.campo), produto.id)
+        self._total += 1
+        if self._soltas or not self._blocos:
+            self._soltas.append(entrada)
+            return
+        i = min(bisect.bisect_left(self._maximos, entrada), len(self._blocos) - 1)
+        bloco = self._blocos[i]
+        bisect.insort(bloco, entrada)
+        self._maximos[i] = bloco[-1]
+        if len(bloco) > 2 * TAMANHO_BLOCO_INDICE:
+            self._blocos[i:i + 1] = [bloco[:TAMANHO_BLOCO_INDICE], bloco[TAMANHO_BLOCO_INDICE:]]
+            self._maximos[i:i + 1] = [bloco[TAMANHO_BLOCO_INDICE - 1], bloco[-1]]
+
+    def adicionar_varios(self, produtos: list[Produto]) -> None:
+        """Acrescenta as entradas sem ordenar; a próxima consulta ordena tudo uma vez (o que já estava em ordem é aproveitado)."""
+        self._soltas.extend([(getattr(produto, self.campo), produto.id) for produto in produtos])
+        self._total += len(produtos)
+
+    def remover(self, produto: Produto) -> None:
+        self._garantir_ordem()
+        entrada = (getattr(produto, self.campo), produto.id)
+        i = bisect.bisect_left(self._maximos, entrada)
+        if i == len(self._blocos):
+            return
+        bloco = self._blocos[i]
+        posicao = bisect.bisect_left(bloco, entrada)
+        if posicao < len(bloco) and bloco[posicao] == entrada:
+            del bloco[posicao]
+            self._total -= 1
+            if bloco:
+                self._maximos[i] = bloco[-1]
+            else:
+                del self._blocos[i], self._maximos[i]
+
+    def _posicao(self, chave: tuple) -> int:
+        """Posição (no índice inteiro) da primeira entrada maior ou igual a `chave`."""
+        i = bisect.bisect_left(self._maximos, chave)
+        if i == len(self._blocos):
+            return self._total
+        return sum(map(len, self._blocos[:i])) + bisect.bisect_left(self._blocos[i], chave)
+
+    def _limites(self, minimo: Any = None, maximo: Any = None) -> tuple[int, int]:
+        self._garantir_ordem()
+        inicio = 0 if minimo is None else self._posicao((minimo,))
+        fim = self._total if maximo is None else self._posicao((maximo, math.inf))
+        return inicio, max(inicio, fim)
+
+    def contar(self, minimo: Any = None, maximo: Any = None) -> int:
+        """Conta quantos produtos têm o campo entre `minimo` e `maximo` (inclusive), em O(log n)."""
+        inicio, fim = self._limites(minimo, maximo)
+        return fim - inicio
+
+    def intervalo(self, minimo: Any = None, maximo: Any = None, decrescente: bool = False,
+                  deslocamento: int = 0) -> Iterator[int]:
+        """Percorre, em ordem, os IDs com o campo entre `minimo` e `maximo` (inclusive), pulando os `deslocamento` primeiros.
+
+        O salto é feito pelo tamanho dos blocos, sem visitar as entradas puladas.
+        """
+        inicio, fim = self._limites(minimo, maximo)
+        if decrescente:  # Posições contadas a partir do fim do índice.
+            inicio, fim = self._total - fim, self._total - inicio
+        inicio += deslocamento
+        for bloco in reversed(self._blocos) if decrescente else self._blocos:
+            tamanho = len(bloco)
+            if inicio < tamanho and fim > 0:
+                if decrescente:
+                    yield from (id_p for _, id_p in reversed(bloco[tamanho - min(fim, tamanho):tamanho - inicio]))
+                else:
+                    yield from (id_p for _, id_p in bloco[inicio:fim])
+            inicio, fim = max(0, inicio - tamanho), fim - tamanho
+            if fim <= 0:
+                return
+
+def _estatisticas_vazias() -> dict[str, Any]:
+    return {'total_produtos': 0, 'total_itens': 0, 'baixo_estoque': 0, 'valor_total': 0.0}
+
+class EstatisticasEstoque:
+    """Agregados do estoque (gerais e por categoria) mantidos por delta a cada alteração.
+
+    Cada alteração retira a contribuição antiga do produto e soma a nova, então ler as
+    estatísticas custa O(1) independentemente do tamanho do catálogo.
+    """
+    campos = frozenset({'categoria', 'quantidade', 'preco'})
+
+    def __init__(self, estoque_minimo: int):
         self.estoque_minimo = estoque_minimo
-        self.produtos: dict[int, Produto] = {}
+        self.gerais = _estatisticas_vazias()
+        self.por_categoria: dict[str, dict[str, Any]] = {}
+
+    def contabilizar(self, produto: Produto, sinal: int = 1) -> None:
+        """Soma (sinal=1) ou retira (sinal=-1) a contribuição de um produto."""
+        categoria = self.por_categoria.get(produto.categoria)
+        if categoria is None:
+            categoria = self.por_categoria[produto.categoria] = _estatisticas_vazias()
+        baixo = sinal if produto.quantidade < self.estoque_minimo else 0
+        for alvo in (self.gerais, categoria):
+            alvo['total_produtos'] += sinal
+            alvo['total_itens'] += sinal * produto.quantidade
+            alvo['baixo_estoque'] += baixo
+            alvo['valor_total'] += sinal * produto.quantidade * produto.preco
+            if alvo['total_produtos'] == 0:
+                alvo['valor_total'] = 0.0
+        if categoria['total_produtos'] == 0:
+            del self.por_categoria[produto.categoria]
+
+    def adicionar(self, produto: Produto) -> None:
+        self.contabilizar(produto)
+
+    def adicionar_varios(self, produtos: list[Produto]) -> None:
+        """Soma vários produtos acumulando por categoria antes de tocar nos agregados."""
+        totais: dict[str, list] = {}
+        for produto in produtos:
+            total = totais.get(produto.categoria)
+            if total is None:
+                total = totais[produto.categoria] = [0, 0, 0, 0.0]
+            total[0] += 1
+            total[1] += produto.quantidade
+            total[2] += produto.quantidade < self.estoque_minimo
+            total[3] += produto.quantidade * produto.preco
+        for nome, (produtos_categoria, itens, baixo, valor) in totais.items():
+            categoria = self.por_categoria.get(nome)
+            if categoria is None:
+                categoria = self.por_categoria[nome] = _estatisticas_vazias()
+            for alvo in (self.gerais, categoria):
+                alvo['total_produtos'] += produtos_categoria
+                alvo['total_itens'] += itens
+                alvo['baixo_estoque'] += baixo
+                alvo['valor_total'] += valor
+
+    def remover(self, produto: Produto) -> None:
+        self.contabilizar(produto, -1)
+
+    def recalcular(self, produtos: Iterable[Produto]) -> None:
+        """Refaz todos os agregados a partir de uma contagem completa."""
+        self.gerais = _estatisticas_vazias()
+        self.por_categoria = {}
+        for produto in produtos:
+            self.contabilizar(produto)
+
+    def conferir(self, recontagem: 'EstatisticasEstoque') -> None:
+        """Compara os agregados com uma recontagem completa e lança RuntimeError se divergirem."""
+        for nome, esperado, atual in [('geral', recontagem.gerais, self.gerais)] + [
+                (categoria, recontagem.por_categoria.get(categoria, {}), self.por_categoria.get(categoria, {}))
+                for categoria in recontagem.por_categoria.keys() | self.por_categoria.keys()]:
+            if esperado.keys() != atual.keys() or any(
+                    not math.isclose(esperado[chave], atual[chave], rel_tol=1e-9, abs_tol=1e-6) for chave in esperado):
+                raise RuntimeError(f"Estatísticas divergentes ({nome}): esperado {esperado}, obtido {atual}.")
+
+class _DicionarioTextos:
+    """Codifica textos repetidos (categorias, descrições) como inteiros."""
+    def __init__(self):
+        self.textos: list[str] = []
+        self.codigos: dict[str, int] = {}
+
+    def codificar(self, texto: str) -> int:
+        codigo = self.codigos.get(texto)
+        if codigo is None:
+            codigo = self.codigos[texto] = len(self.textos)
+            self.textos.append(texto)
+        return codigo
+
+def _propriedade_coluna(campo: str) -> property:
+    def ler(self):
+        return self._armazem.ler(campo, self._posicao())
+    def gravar(self, valor):
+        self._armazem.gravar(campo, self._posicao(), valor)
+    return property(ler, gravar)
+
+class ProdutoColunar:
+    """Visão leve (com __slots__) de um produto guardado no `ArmazemColunar`.
+
+    Tem os mesmos atributos de `Produto`, mas lê e grava direto nas colunas.
+    """
+    __slots__ = ('_armazem', 'id', '_linha', '_geracao')
+
+    def __init__(self, armazem: 'ArmazemColunar', id_produto: int, linha: int):
+        self._armazem = armazem
+        self.id = id_produto
+        self._linha = linha
+        self._geracao = armazem.geracao
+
+    def _posicao(self) -> int:
+        if self._geracao != self._armazem.geracao:
+            self._linha = self._armazem.linha(self.id)
+            self._geracao = self._armazem.geracao
+        return self._linha
+
+    nome = _propriedade_coluna('nome')
+    categoria = _propriedade_coluna('categoria')
+    descricao = _propriedade_coluna('descricao')
+    quantidade = _propriedade_coluna('quantidade')
+    preco = _propriedade_coluna('preco')
+
+    def __eq__(self, outro: object) -> bool:
+        if not isinstance(outro, (Produto, ProdutoColunar)):
+            return NotImplemented
+        return produto_para_dict(self) == produto_para_dict(outro)
+
+    def __repr__(self) -> str:
+        return f"Produto({', '.join(f'{campo}={valor!r}' for campo, valor in produto_para_dict(self).items())})"
+
+class ArmazemColunar(MutableMapping):
+    """Guarda os produtos em colunas em vez de um objeto por produto, para catálogos muito grandes.
+
+    IDs, quantidades e preços ficam em `array` tipados; nomes são internados e categorias e
+    descrições são codificadas em dicionários. Os IDs ficam em ordem crescente (busca por
+    bisect) e uma remoção só desativa a linha até a próxima compactação. Tem a interface de
+    `dict[int, Produto]`, entregando visões `ProdutoColunar`, e oferece filtros e recontagens
+    que operam coluna a coluna (com NumPy, se instalado).
+    """
+    def __init__(self):
+        self._ids = array('q')
+        self._quantidades = array('q')
+        self._precos = array('d')
+        self._nomes: list[str] = []
+        self._categorias = array('I')
+        self._descricoes = array('I')
+        self._ativos = bytearray()
+        self._dic_categorias = _DicionarioTextos()
+        self._dic_descricoes = _DicionarioTextos()
+        self._total = 0
+        self._inativas = 0
+        self.geracao = 0
+
+    def linha(self, id_produto: int) -> int:
+        """Retorna a posição do produto nas colunas (KeyError se não existir)."""
+        ids = self._ids
+        # IDs costumam ser sequenciais: tenta primeiro a posição direta antes do bisect.
+        posicao = id_produto - ids[0] if ids else 0
+        if not (0 <= posicao < len(ids) and ids[posicao] == id_produto):
+            posicao = bisect.bisect_left(ids, id_produto)
+        if posicao < len(self._ids) and self._ids[posicao] == id_produto and self._ativos[posicao]:
+            return posicao
+        raise KeyError(id_produto)
+
+    def ler(self, campo: str, linha: int) -> Any:
+        match campo:
+            case 'nome': return self._nomes[linha]
+            case 'categoria': return self._dic_categorias.textos[self._categorias[linha]]
+            case 'descricao': return self._dic_descricoes.textos[self._descricoes[linha]]
+            case 'quantidade': return self._quantidades[linha]
+            case 'preco': return self._precos[linha]
+        raise AttributeError(campo)
+
+    def gravar(self, campo: str, linha: int, valor: Any) -> None:
+        match campo:
+            case 'nome': self._nomes[linha] = sys.intern(valor)
+            case 'categoria': self._categorias[linha] = self._dic_categorias.codificar(valor)
+            case 'descricao': self._descricoes[linha] = self._dic_descricoes.codificar(valor)
+            case 'quantidade': self._quantidades[linha] = valor
+            case 'preco': self._precos[linha] = valor
+            case _: raise AttributeError(campo)
+
+    def __getitem__(self, id_produto: int) -> ProdutoColunar:
+        return ProdutoColunar(self, id_produto, self.linha(id_produto))
+
+    def __contains__(self, id_produto: object) -> bool:
+        try:
+            self.linha(id_produto)
+            return True
+        except (KeyError, TypeError):
+            return False
+
+    def __setitem__(self, id_produto: int, produto: Any) -> None:
+        posicao = bisect.bisect_left(self._ids, id_produto)
+        if posicao < len(self._ids) and self._ids[posicao] == id_produto:
+            if not self._ativos[posicao]:
+                self._ativos[posicao] = 1
+                self._inativas -= 1
+                self._total += 1
+        else:
+            if posicao < len(self._ids):
+                self.geracao += 1
+            self._ids.insert(posicao, id_produto)
+            self._quantidades.insert(posicao, 0)
+            self._precos.insert(posicao, 0.0)
+            self._nomes.insert(posicao, '')
+            self._categorias.insert(posicao, 0)
+            self._descricoes.insert(posicao, 0)
+            self._ativos.insert(posicao, 1)
+            self._total += 1
+        for campo in CAMPOS_PRODUTO[1:]:
+            self.gravar(campo, posicao, getattr(produto, campo))
+
+    def __delitem__(self, id_produto: int) -> None:
+        posicao = self.linha(id_produto)
+        self._ativos[posicao] = 0
+        self._nomes[posicao] = ''
+        self._total -= 1
+        self._inativas += 1
+        self.geracao += 1
+        if self._inativas > 1024 and self._inativas * 2 > len(self._ids):
+            self._compactar()
+
+    def pop(self, id_produto: int, *padrao: Any) -> Any:
+        """Remove o produto e devolve uma cópia `Produto` independente das colunas."""
+        if id_produto not in self and padrao:
+            return padrao[0]
+        produto = Produto(**produto_para_dict(self[id_produto]))
+        del self[id_produto]
+        return produto
+
+    def _compactar(self) -> None:
+        """Descarta as linhas inativas."""
+        ativos = bytes(self._ativos)
+        for coluna in ('_ids', '_quantidades', '_precos', '_categorias', '_descricoes'):
+            atual = getattr(self, coluna)
+            setattr(self, coluna, array(atual.typecode, itertools.compress(atual, ativos)))
+        self._nomes = list(itertools.compress(self._nomes, ativos))
+        self._ativos = bytearray(b'\x01' * self._total)
+        self._inativas = 0
+        self.geracao += 1
+
+    def __len__(self) -> int:
+        return self._total
+
+    def __iter__(self) -> Iterator[int]:
+        return itertools.compress(self._ids, self._ativos)
+
+    def values(self) -> Iterator[ProdutoColunar]:
+        return (ProdutoColunar(self, self._ids[i], i) for i in itertools.compress(range(len(self._ids)), self._ativos))
+
+    def items(self) -> Iterator[tuple[int, ProdutoColunar]]:
+        return ((produto.id, produto) for produto in self.values())
+
+    def _mascara(self, np: Any, codigo: int | None, condicoes: list[tuple[str, Any, Any]]) -> Any:
+        """Monta com NumPy a máscara booleana das linhas ativas que atendem aos filtros."""
+        colunas = {'quantidade': (self._quantidades, np.int64), 'preco': (self._precos, np.float64)}
+        mascara = np.frombuffer(self._ativos, dtype=np.uint8).astype(bool)
+        if codigo is not None:
+            mascara &= np.frombuffer(self._categorias, dtype=np.uint32) == codigo
+        for campo, minimo, maximo in condicoes:
+            coluna = np.frombuffer(colunas[campo][0], dtype=colunas[campo][1])
+            if minimo is not None:
+                mascara &= coluna >= minimo
+            if maximo is not None:
+                mascara &= coluna <= maximo
+        return mascara
+
+    def filtrar(self, categoria: str | None = None, faixas: dict[str, tuple[Any, Any]] | None = None) -> list[int]:
+        """Retorna os IDs que atendem à categoria e às faixas {campo: (mínimo, máximo)}, coluna a coluna."""
+        condicoes = [(campo, minimo, maximo) for campo, (minimo, maximo) in (faixas or {}).items()
+                     if minimo is not None or maximo is not None]
+        codigo = None if categoria is None else self._dic_categorias.codigos.get(categoria, -1)
+        if (np := _numpy()) is not None:
+            return list(itertools.compress(self._ids, self._mascara(np, codigo, condicoes).tobytes()))
+        # Sem NumPy, um laço simples sobre as colunas é mais rápido que encadear `map` por condição.
+        faixa = {campo: (minimo, maximo) for campo, minimo, maximo in condicoes}
+        qtd_min, qtd_max = faixa.get('quantidade', (None, None))
+        prc_min, prc_max = faixa.get('preco', (None, None))
+        return [id_p for id_p, ativo, codigo_linha, quantidade, preco
+                in zip(self._ids, self._ativos, self._categorias, self._quantidades, self._precos)
+                if ativo and (codigo is None or codigo_linha == codigo)
+                and (qtd_min is None or quantidade >= qtd_min) and (qtd_max is None or quantidade <= qtd_max)
+                and (prc_min is None or preco >= prc_min) and (prc_max is None or preco <= prc_max)]
+
+    def recontar(self, estoque_minimo: int) -> EstatisticasEstoque:
+        """Recalcula as estatísticas (gerais e por categoria) direto das colunas."""
+        estatisticas = EstatisticasEstoque(estoque_minimo)
+        totais: dict[int, list] = {}
+        if (np := _numpy()) is not None:
+            quantidades = np.frombuffer(self._quantidades, dtype=np.int64)
+            precos = np.frombuffer(self._precos, dtype=np.float64)
+            for codigo in range(len(self._dic_categorias.textos)):
+                mascara = self._mascara(np, codigo, [])
+                qtd = quantidades[mascara]
+                if len(qtd):
+                    totais[codigo] = [len(qtd), int(qtd.sum()), int((qtd < estoque_minimo).sum()),
+                                      float(qtd @ precos[mascara])]
+        else:
+            # Uma única passada acumulando por categoria.
+            for ativo, codigo, quantidade, preco in zip(self._ativos, self._categorias, self._quantidades, self._precos):
+                if ativo:
+                    total = totais.get(codigo)
+                    if total is None:
+                        total = totais[codigo] = [0, 0, 0, 0.0]
+                    total[0] += 1
+                    total[1] += quantidade
+                    total[2] += quantidade < estoque_minimo
+                    total[3] += quantidade * preco
+        for codigo, (produtos, itens, baixo, valor) in sorted(totais.items()):
+            categoria = estatisticas.por_categoria[self._dic_categorias.textos[codigo]] = {
+                'total_produtos': produtos, 'total_itens': itens, 'baixo_estoque': baixo, 'valor_total': valor}
+            for chave, valor_categoria in categoria.items():
+                estatisticas.gerais[chave] += valor_categoria
+        return estatisticas
+
+_ESPACOS_JSON = re.compile(r'[ \t\n\r]*')
+
+class _LeitorJson:
+    """Lê valores JSON de um arquivo em blocos, mantendo em memória só o trecho ainda não consumido."""
+    def __init__(self, arquivo, tamanho_bloco: int):
+        self.arquivo = arquivo
+        self.tamanho_bloco = tamanho_bloco
+        self.buffer = ''
+        self.posicao = 0
+        self.fim = False
+        self._decodificador = json.JSONDecoder()
+
+    def _ler_mais(self) -> bool:
+        bloco = self.arquivo.read(self.tamanho_bloco)
+        if not bloco:
+            self.fim = True
+            return False
+        self.buffer = self.buffer[self.posicao:] + bloco
+        self.posicao = 0
+        return True
+
+    def _pular_espacos(self) -> None:
+        while True:
+            self.posicao = _ESPACOS_JSON.match(self.buffer, self.posicao).end()
+            if self.posicao < len(self.buffer) or not self._ler_mais():
+                return
+
+    def consumir_se(self, caractere: str) -> bool:
+        self._pular_espacos()
+        if self.buffer.startswith(caractere, self.posicao):
+            self.posicao += 1
+            return True
+        return False
+
+    def esperar(self, caractere: str) -> None:
+        if not self.consumir_se(caractere):
+            raise json.JSONDecodeError(f"Esperado '{caractere}'", self.buffer, self.posicao)
+
+    def esperar_fim(self) -> None:
+        self._pular_espacos()
+        if self.posicao < len(self.buffer):
+            raise json.JSONDecodeError("Conteúdo extra após o JSON", self.buffer, self.posicao)
+
+    def valor(self) -> Any:
+        """Decodifica o próximo valor; se ele pode continuar no bloco seguinte, lê mais e tenta de novo."""
+        self._pular_espacos()
+        while True:
+            try:
+                valor, fim = self._decodificador.raw_decode(self.buffer, self.posicao)
+                if fim < len(self.buffer) or self.fim:
+                    self.posicao = fim
+                    return valor
+            except json.JSONDecodeError:
+                if self.fim:
+                    raise
+            self._ler_mais()
+
+def ler_json_incremental(caminho: str | Path, tamanho_bloco: int = 64 * 1024) -> Iterator[tuple[str, Any]]:
+    """Percorre um snapshot JSON sem carregar o texto inteiro nem a árvore completa.
+
+    Gera os pares (chave, valor) do objeto principal; os itens de "produtos" são gerados
+    um a um como ('produto', dados), de modo que cada produto pode ser descartado após o uso.
+    """
+    with Path(caminho).open(encoding='utf-8') as arquivo:
+        leitor = _LeitorJson(arquivo, tamanho_bloco)
+        leitor.esperar('{')
+        if leitor.consumir_se('}'):
+            leitor.esperar_fim()
+            return
+        while True:
+            chave = leitor.valor()
+            leitor.esperar(':')
+            if chave == 'produtos':
+                leitor.esperar('{')
+                if not leitor.consumir_se('}'):
+                    while True:
+                        leitor.valor()  # chave do produto (o id, repetido dentro dos dados)
+                        leitor.esperar(':')
+                        yield 'produto', leitor.valor()
+                        if leitor.consumir_se('}'):
+                            break
+                        leitor.esperar(',')
+            else:
+                yield chave, leitor.valor()
+            if leitor.consumir_se('}'):
+                leitor.esperar_fim()
+                return
+            leitor.esperar(',')
+
+def _travar_arquivo(arquivo, bloquear: bool) -> bool:
+    if fcntl is not None:
+        try:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX if bloquear else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+    arquivo.seek(16)  # trava um byte depois da versão, que continua legível pelos outros processos
+    while True:
+        try:
+            msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not bloquear:
+                return False
+            time.sleep(0.01)
+
+def _destravar_arquivo(arquivo) -> None:
+    if fcntl is not None:
+        fcntl.flock(arquivo.fileno(), fcntl.LOCK_UN)
+    else:
+        arquivo.seek(16)
+        msvcrt.locking(arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+
+class TravaArquivo:
+    """Trava exclusiva entre processos (advisory lock) sobre um arquivo auxiliar, reentrante no processo.
+
+    O arquivo também guarda uma versão de 8 bytes (o `seq` da última operação gravada),
+    que permite a cada processo saber, sem travar, se o seu estado em memória está desatualizado.
+    """
+    def __init__(self, caminho: str | Path):
+        self.caminho = Path(caminho)
+        self._arquivo = None
+        self._nivel = 0
+        self._local = threading.RLock()
+
+    def _abrir(self):
+        if self._arquivo is None:
+            self._arquivo = os.fdopen(os.open(self.caminho, os.O_RDWR | os.O_CREAT, 0o666), 'r+b', buffering=0)
+        return self._arquivo
+
+    def adquirir(self, bloquear: bool = True) -> bool:
+        if not self._local.acquire(blocking=bloquear):
+            return False
+        if self._nivel == 0:
+            try:
+                travado = _travar_arquivo(self._abrir(), bloquear)
+            except BaseException:
+                self._local.release()
+                raise
+            if not travado:
+                self._local.release()
+                return False
+        self._nivel += 1
+        return True
+
+    def liberar(self) -> None:
+        self._nivel -= 1
+        if self._nivel == 0:
+            _destravar_arquivo(self._arquivo)
+        self._local.release()
+
+    def __enter__(self) -> 'TravaArquivo':
+        self.adquirir()
+        return self
+
+    def __exit__(self, *excecao: Any) -> None:
+        self.liberar()
+
+    def ler_versao(self) -> int:
+        arquivo = self._abrir()
+        if hasattr(os, 'pread'):
+            dados = os.pread(arquivo.fileno(), 8, 0)
+        else:
+            arquivo.seek(0)
+            dados = arquivo.read(8)
+        return int.from_bytes(dados, 'little') if len(dados) == 8 else 0
+
+    def gravar_versao(self, versao: int) -> None:
+        arquivo = self._abrir()
+        if hasattr(os, 'pwrite'):
+            os.pwrite(arquivo.fileno(), versao.to_bytes(8, 'little'), 0)
+        else:
+            arquivo.seek(0)
+            arquivo.write(versao.to_bytes(8, 'little'))
+
+    def fechar(self) -> None:
+        if self._arquivo is not None and self._nivel == 0:
+            self._arquivo.close()
+            self._arquivo = None
+
+def _fsync(caminho: Path) -> None:
+    """Garante que o conteúdo do arquivo chegou ao disco (e não só ao cache do sistema)."""
+    with open(caminho, 'rb+') as arquivo:
+        os.fsync(arquivo.fileno())
+
+def _fsync_diretorio(pasta: Path) -> None:
+    """Torna duráveis as renomeações feitas na pasta (não há equivalente no Windows)."""
+    if os.name == 'posix':
+        descritor = os.open(pasta, os.O_RDONLY)
+        try:
+            os.fsync(descritor)
+        finally:
+            os.close(descritor)
+
+class _DiarioDefasado(Exception):
+    """Faltam operações no diário lido: o processo precisa recarregar o estado completo."""
+
+class Persistencia(ABC):
+    """Interface dos mecanismos de persistência usados pelo `GerenciadorEstoque`.
+
+    `carregar` preenche o gerenciador, `registrar` grava uma operação já confirmada
+    (no formato do diário, com `seq`) e `salvar` grava o estado completo. Mecanismos que
+    carregam produtos sob demanda derivam de `PersistenciaSobDemanda`.
+
+    `exclusivo` envolve cada transação: garante acesso exclusivo entre processos e, antes
+    das alterações, traz para a memória o que outros processos já gravaram (`sincronizar`).
+    `bytes_gravados` acumula o volume gravado em disco pelo mecanismo (quando ele sabe medir),
+    somado por `_contar_bytes` porque o diário e a compactação gravam em threads diferentes;
+    `tamanho_ultimo_registro` é o tamanho da última operação passada a `registrar`.
+
+    Um mecanismo que carrega partes do catálogo sob demanda as completa em `garantir` (só a
+    categoria indicada ou tudo) e pode acompanhar as alterações com `observadores`, objetos
+    notificados como os índices do gerenciador. Com `salvar_ao_fechar`, `fechar` do
+    gerenciador grava o estado antes de fechar o mecanismo.
+    """
+    carrega_tudo = True
+    bytes_gravados = 0
+    tamanho_ultimo_registro: int | None = None
+    salvar_ao_fechar = False
+
+    def __init__(self, caminho: str | Path):
+        self.caminho = Path(caminho)
+        self._trava_bytes = threading.Lock()
+
+    def _contar_bytes(self, quantidade: int) -> None:
+        with self._trava_bytes:
+            self.bytes_gravados += quantidade
+
+    @abstractmethod
+    def carregar(self, gerenciador: 'GerenciadorEstoque') -> None: ...
+
+    @abstractmethod
+    def registrar(self, gerenciador: 'GerenciadorEstoque', registro: dict[str, Any]) -> None: ...
+
+    @abstractmethod
+    def salvar(self, gerenciador: 'GerenciadorEstoque') -> None: ...
+
+    @contextmanager
+    def exclusivo(self, gerenciador: 'GerenciadorEstoque') -> Iterator[None]:
+        yield
+
+    def sincronizar(self, gerenciador: 'GerenciadorEstoque') -> None:
+        pass
+
+    def garantir(self, gerenciador: 'GerenciadorEstoque', categoria: str | None = None) -> None:
+        pass
+
+    def observadores(self) -> list[Any]:
+        return []
+
+    def fechar(self) -> None:
+        pass
+
+class PersistenciaSobDemanda(Persistencia):
+    """Mecanismo que não carrega o catálogo inteiro (`carrega_tudo = False`).
+
+    Os produtos são lidos conforme o uso, então o próprio mecanismo responde às buscas,
+    listagens e estatísticas (`buscar`, `consultar` e `estatisticas`). Com `recontar`,
+    `estatisticas` faz a contagem completa em vez de ler os agregados mantidos.
+    """
+    carrega_tudo = False
+
+    @abstractmethod
+    def buscar(self, termo: str, limite: int | None) -> list[int]: ...
+
+    @abstractmethod
+    def consultar(self, categoria: str | None, faixas: dict[str, tuple[Any, Any]], ordenar_por: str,
+                  decrescente: bool, deslocamento: int, limite: int | None) -> list[int]: ...
+
+    @abstractmethod
+    def estatisticas(self, estoque_minimo: int, recontar: bool = False) -> EstatisticasEstoque: ...
+
+class PersistenciaJson(Persistencia):
+    """Snapshot JSON mais um diário (write-ahead log) onde cada operação acrescenta uma linha.
+
+    Quando o diário passa de `limite_diario` bytes (ou do tamanho do último snapshot, se
+    for maior), um novo snapshot é gravado em segundo plano e o diário é descartado.
+
+    Vários processos podem usar os mesmos arquivos: as gravações acontecem com a trava
+    `<arquivo>.lock`, que também guarda a versão (o `seq` da última operação). Antes de
+    cada transação, o processo lê as operações novas do diário a partir do ponto em que
+    parou; só recarrega tudo se perdeu operações (duas compactações desde a última leitura).
+    A troca do snapshot é protegida por uma segunda trava, `<arquivo>.compactacao.lock`.
+
+    Com `gravacao_adiada` (segundos), as operações confirmadas ficam em memória e uma thread
+    as grava juntas, com fsync, depois dessa janela. A trava entre processos só é mantida
+    durante cada transação e cada gravação; se outro processo gravou enquanto havia operações
+    pendentes, elas são refeitas sobre o estado novo antes de gravadas (`_rebasear`). Só esperam
+    a janela as operações que continuam válidas sobre qualquer estado: inclusões (que devolvem o
+    ID) e saídas (conferidas contra o estoque) são gravadas na hora, ainda com a trava, junto com
+    a fila. `fechar` e o encerramento do interpretador (atexit) gravam o que estiver pendente.
+    """
+    def __init__(self, caminho: str | Path, limite_diario: int = LIMITE_DIARIO_BYTES,
+                 gravacao_adiada: float | None = None, leitura_incremental: bool = False):
+        super().__init__(caminho)
+        self.leitura_incremental = leitura_incremental
+        self.caminho_diario = self.caminho.with_name(self.caminho.name + '.diario')
+        self.caminho_diario_antigo = self.caminho.with_name(self.caminho.name + '.diario.antigo')
+        self.limite_diario = limite_diario
+        self._tamanho_snapshot = 0
+        self._diario = None
+        self._leitura = None  # o mesmo diário, aberto para acompanhar o que outros processos acrescentam
+        self._compactacao: threading.Thread | None = None
+        self._trava = TravaArquivo(self.caminho.with_name(self.caminho.name + '.lock'))
+        self._trava_compactacao = TravaArquivo(self.caminho.with_name(self.caminho.name + '.compactacao.lock'))
+        self.gravacao_adiada = gravacao_adiada
+        self._pendentes: list[bytes] = []
+        self._seq_pendente = 0
+        self._seq_base = 0  # a versão do diário sobre a qual as operações pendentes foram feitas
+        self._gerenciador: 'GerenciadorEstoque | None' = None
+        self._aviso = threading.Event()
+        self._gravador: threading.Thread | None = None
+        self._encerrar = False
+        self._erro: Exception | None = None
+
+    def carregar(self, gerenciador: 'GerenciadorEstoque') -> None:
+        """Carrega o último snapshot e reaplica as operações registradas no diário."""
+        with self._trava, self._trava_compactacao:
+            self._carregar(gerenciador)
+
+    def _carregar(self, gerenciador: 'GerenciadorEstoque') -> None:
+        if not self.caminho.exists():
+            gerenciador.categorias.update(CATEGORIAS_PADRAO)
+        else:
+            self._tamanho_snapshot = self.caminho.stat().st_size
+            try:
+                self._ler_snapshot(gerenciador)
+            except (ValueError, OSError):
+                copia = self._guardar_corrompido()
+                print(f"{Cores.WARNING}Aviso: Arquivo '{self.caminho}' corrompido. Ele e o diário foram guardados "
+                      f"como '{copia}' e o estoque começa com dados limpos.{Cores.ENDC}")
+                gerenciador._reiniciar_estado()
+                self._tamanho_snapshot = 0
+            if not gerenciador.categorias:
+                gerenciador.categorias.update(CATEGORIAS_PADRAO)
+        self._fechar_leitura()
+        if self.caminho_diario_antigo.exists():
+            with self.caminho_diario_antigo.open('r+b') as arquivo:
+                self._ler_registros(gerenciador, arquivo)
+        if self.caminho_diario.exists():
+            self._leitura = self.caminho_diario.open('r+b')
+            self._ler_registros(gerenciador, self._leitura)
+        if self.caminho_diario_antigo.exists():
+            # Uma compactação foi interrompida: consolida tudo em um snapshot novo.
+            self.salvar(gerenciador)
+
+    def _guardar_corrompido(self) -> Path:
+        """Renomeia o snapshot ilegível e os diários (que dependem dele) para `*.corrompido-<data>`."""
+        sufixo = f".corrompido-{time.strftime('%Y%m%d-%H%M%S')}"
+        for caminho in (self.caminho, self.caminho_diario, self.caminho_diario_antigo):
+            if caminho.exists():
+                os.replace(caminho, caminho.with_name(caminho.name + sufixo))
+        return self.caminho.with_name(self.caminho.name + sufixo)
+
+    def _ler_snapshot(self, gerenciador: 'GerenciadorEstoque') -> None:
+        """Lê o snapshot JSON com `json.loads`; com `leitura_incremental`, insere cada produto assim que é decodificado.
+
+        A leitura incremental usa menos da metade da memória, mas é quase duas vezes mais lenta.
+        """
+        if self.leitura_incremental:
+            itens = ler_json_incremental(self.caminho)
+        else:
+            dados = json.loads(self.caminho.read_bytes())
+            if not isinstance(dados, dict) or not isinstance(dados.get('produtos', {}), dict):
+                raise ValueError("Snapshot JSON em formato inesperado.")
+            produtos = dados.pop('produtos', {})
+            itens = itertools.chain(dados.items(), (('produto', produto) for produto in produtos.values()))
+        for chave, valor in itens:
+            match chave:
+                case 'seq':
+                    gerenciador.seq = valor
+                case 'proximo_id':
+                    gerenciador.proximo_id = valor
+                case 'categorias':
+                    gerenciador.categorias = set(valor)
+                case 'produto':
+                    valor.setdefault('descricao', 'Sem descrição')
+                    gerenciador._inserir_produto(Produto(**valor))
+
+    def _ler_registros(self, gerenciador: 'GerenciadorEstoque', arquivo, continuo: bool = False) -> None:
+        """Reaplica as operações do diário a partir da posição atual, descartando uma última linha incompleta.
+
+        Com `continuo`, um salto na numeração (operações que este processo não leu) lança `_DiarioDefasado`.
+        """
+        posicao = arquivo.tell()
+        for linha in iter(arquivo.readline, b''):
+            try:
+                if not linha.endswith(b'\n'):
+                    raise ValueError("Linha incompleta.")
+                registro = json.loads(linha)
+            except ValueError:
+                arquivo.truncate(posicao)
+                arquivo.seek(posicao)
+                break
+            posicao += len(linha)
+            if registro['seq'] > gerenciador.seq:
+                if continuo and registro['seq'] != gerenciador.seq + 1:
+                    raise _DiarioDefasado()
+                self._preparar_registro(gerenciador, registro)
+                gerenciador._aplicar_registro(registro)
+                gerenciador.seq = registro['seq']
+
+    def _preparar_registro(self, gerenciador: 'GerenciadorEstoque', registro: dict[str, Any]) -> None:
+        """Chamado antes de reaplicar uma operação do diário."""
+
+    @contextmanager
+    def exclusivo(self, gerenciador: 'GerenciadorEstoque') -> Iterator[None]:
+        with self._trava:
+            self._sincronizar(gerenciador)
+            yield
+
+    def sincronizar(self, gerenciador: 'GerenciadorEstoque') -> None:
+        """Aplica as operações gravadas por outros processos (sem travar, se não houver nenhuma)."""
+        if self._trava.ler_versao() > (self._seq_base if self._pendentes else gerenciador.seq):
+            with self._trava:
+                self._sincronizar(gerenciador)
+
+    def _sincronizar(self, gerenciador: 'GerenciadorEstoque') -> None:
+        """Com a trava obtida: lê o restante do diário e, se ele foi trocado, o diário novo."""
+        if self._pendentes and self._trava.ler_versao() != self._seq_base:
+            self._rebasear()
+        versao = self._trava.ler_versao()
+        if versao <= gerenciador.seq:
+            return
+        try:
+            if self._leitura is not None:
+                self._ler_registros(gerenciador, self._leitura, continuo=True)
+                if self._diario_trocado():
+                    self._fechar_leitura()
+                    self._fechar_diario()
+            if self._leitura is None and self.caminho_diario.exists():
+                self._leitura = self.caminho_diario.open('r+b')
+                self._ler_registros(gerenciador, self._leitura, continuo=True)
+            if gerenciador.seq < versao:
+                raise _DiarioDefasado()
+        except _DiarioDefasado:
+            self._recarregar(gerenciador)
+
+    def _diario_trocado(self) -> bool:
+        try:
+            return os.stat(self.caminho_diario).st_ino != os.fstat(self._leitura.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _recarregar(self, gerenciador: 'GerenciadorEstoque') -> None:
+        self._aguardar_compactacao()
+        self._fechar_diario()
+        with self._trava_compactacao:
+            gerenciador._reiniciar_estado()
+            self._carregar(gerenciador)
+
+    def _abrir_diario(self) -> None:
+        if self._diario is None:
+            self._diario = self.caminho_diario.open('ab')
+            if self._leitura is None or self._diario_trocado():
+                self._fechar_leitura()
+                self._leitura = self.caminho_diario.open('r+b')
+
+    def _escrever_diario(self, linhas: list[bytes], seq: int) -> None:
+        """Acrescenta linhas ao diário e publica a nova versão (com a trava obtida)."""
+        self._abrir_diario()
+        dados = b''.join(linhas)
+        self._diario.write(dados)
+        self._diario.flush()
+        if self.gravacao_adiada is not None:
+            os.fsync(self._diario.fileno())
+        self._contar_bytes(len(dados))
+        self._leitura.seek(self._diario.tell())
+        self._trava.gravar_versao(seq)
+
+    def registrar(self, gerenciador: 'GerenciadorEstoque', registro: dict[str, Any]) -> None:
+        """Acrescenta uma operação ao diário (custo O(1)) e dispara a compactação se necessário.
+
+        Na gravação adiada, a operação só entra na fila da thread gravadora, salvo as que
+        `_gravacao_imediata` aponta, gravadas na hora com a fila à frente.
+        """
+        dados = (json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        self.tamanho_ultimo_registro = len(dados)
+        with self._trava:
+            if self._erro is not None:
+                erro, self._erro = self._erro, None
+                raise erro
+            self._abrir_diario()
+            if self.gravacao_adiada is None or self._gravacao_imediata(registro):
+                # Com a trava obtida, a fila já está sobre a versão atual do diário (`_sincronizar`).
+                pendentes, self._pendentes = self._pendentes, []
+                try:
+                    self._escrever_diario([*pendentes, dados], registro['seq'])
+                except BaseException:
+                    self._pendentes = pendentes
+                    raise
+            else:
+                if not self._pendentes:
+                    self._seq_base, self._gerenciador = registro['seq'] - 1, gerenciador
+                    self._iniciar_gravador()
+                    self._aviso.set()
+                self._pendentes.append(dados)
+                self._seq_pendente = registro['seq']
+            # Compactar só quando o diário supera também o snapshot mantém o custo amortizado
+            # constante mesmo em cargas grandes, que de outra forma regravariam o catálogo várias vezes.
+            tamanho = self._diario.tell() + sum(map(len, self._pendentes))
+            if tamanho >= max(self.limite_diario, self._tamanho_snapshot):
+                self._compactar(gerenciador)
+
+    @staticmethod
+    def _gravacao_imediata(registro: dict[str, Any]) -> bool:
+        """Se a operação depende do estado em que foi validada: inclusões (o ID já foi devolvido) e saídas."""
+        match registro['op']:
+            case 'adicionar':
+                return True
+            case 'movimentar':
+                return registro['quantidade'] < 0
+            case 'lote':
+                return any(map(PersistenciaJson._gravacao_imediata, registro['ops']))
+        return False
+
+    def _iniciar_gravador(self) -> None:
+        if self._gravador is None:
+            self._encerrar = False
+            self._gravador = threading.Thread(target=self._gravar_em_segundo_plano, name='gravacao-estoque', daemon=True)
+            self._gravador.start()
+            atexit.register(self.descarregar)
+
+    def _gravar_em_segundo_plano(self) -> None:
+        """Thread gravadora: espera a janela de `gravacao_adiada` e grava de uma vez o que acumulou."""
+        while not self._encerrar:
+            self._aviso.wait()
+            if self._encerrar:
+                return
+            time.sleep(self.gravacao_adiada)
+            self._aviso.clear()
+            try:
+                self._descarregar(rebasear=False)
+            except Exception as erro:  # Repassado à próxima operação; as linhas continuam pendentes.
+                self._erro = erro
+                self._aviso.set()
+
+    def descarregar(self) -> None:
+        """Grava já as operações pendentes da gravação adiada."""
+        self._descarregar(rebasear=True)
+
+    def _descarregar(self, rebasear: bool) -> None:
+        """Grava as operações pendentes, se nenhum outro processo gravou no diário depois delas.
+
+        Se gravou, elas precisam ser refeitas sobre o estado novo, o que altera o estado em memória:
+        a thread gravadora (`rebasear=False`) deixa isso para a próxima transação ou para `fechar`.
+        """
+        with self._trava:
+            if not self._pendentes:
+                return
+            if self._trava.ler_versao() != self._seq_base:
+                if rebasear:
+                    self._rebasear()
+                return
+            pendentes, self._pendentes = self._pendentes, []
+            try:
+                self._escrever_diario(pendentes, self._seq_pendente)
+            except BaseException:
+                self._pendentes[:0] = pendentes
+                raise
+
+    def _rebasear(self) -> None:
+        """Com a trava obtida: recarrega o estado do disco e refaz e grava as operações pendentes depois das novas.
+
+        A fila só tem operações que não dependem do estado em que foram validadas (entradas,
+        alterações de cadastro, remoções e categorias; veja `_gravacao_imediata`), então elas são
+        reaplicadas como no diário. As que citam produtos que o outro processo removeu são descartadas.
+        """
+        gerenciador = self._gerenciador
+        registros = [json.loads(dados) for dados in self._pendentes]
+        self._pendentes = []
+        self._recarregar(gerenciador)
+        seq_base, linhas = gerenciador.seq, []
+        for registro in registros:
+            registro = self._reaplicar(gerenciador, registro)
+            if registro is not None:
+                gerenciador.seq += 1
+                linhas.append((json.dumps({'seq': gerenciador.seq, **registro}, ensure_ascii=False,
+                                          separators=(',', ':')) + '\n').encode('utf-8'))
+        try:
+            if linhas:
+                self._escrever_diario(linhas, gerenciador.seq)
+        except BaseException:
+            self._pendentes, self._seq_base, self._seq_pendente = linhas, seq_base, gerenciador.seq
+            raise
+
+    def _reaplicar(self, gerenciador: 'GerenciadorEstoque', registro: dict[str, Any]) -> dict[str, Any] | None:
+        """Reaplica uma operação pendente e a retorna sem `seq`; None se ela não se aplica mais."""
+        registro = {chave: valor for chave, valor in registro.items() if chave != 'seq'}
+        if registro['op'] == 'lote':
+            operacoes = [operacao for operacao in (self._reaplicar(gerenciador, operacao) for operacao in registro['ops'])
+                         if operacao is not None]
+            return {**registro, 'ops': operacoes} if operacoes else None
+        self._preparar_registro(gerenciador, registro)
+        if 'id' in registro and registro['id'] not in gerenciador.produtos:
+            return None
+        gerenciador._aplicar_registro(registro)
+        return registro
+
+    def _escrever_snapshot(self, caminho: Path, estado: dict[str, Any]) -> None:
+        caminho.write_text(json.dumps(estado, indent=4, ensure_ascii=False), encoding='utf-8')
+
+    def _estado_para_snapshot(self, gerenciador: 'GerenciadorEstoque') -> dict[str, Any]:
+        """Cópia do estado que o próximo snapshot vai gravar (tirada com o estado consistente)."""
+        return gerenciador._exportar_estado()
+
+    def _gravar_snapshot(self, estado: dict[str, Any]) -> None:
+        """Grava o snapshot de forma atômica (temporário + fsync + rename) e remove o diário já incorporado.
+
+        A trava de compactação guarda o `seq` do último snapshot: um snapshot mais antigo que
+        ele (de uma compactação que terminou depois de outra mais nova) é descartado.
+        """
+        with self._trava_compactacao:
+            if self._trava_compactacao.ler_versao() > estado['seq']:
+                return
+            caminho_temp = self.caminho.with_name(self.caminho.name + '.tmp')
+            self._escrever_snapshot(caminho_temp, estado)
+            _fsync(caminho_temp)
+            self._tamanho_snapshot = caminho_temp.stat().st_size
+            self._contar_bytes(self._tamanho_snapshot)
+            os.replace(caminho_temp, self.caminho)
+            _fsync_diretorio(self.caminho.parent)
+            self._trava_compactacao.gravar_versao(estado['seq'])
+            self.caminho_diario_antigo.unlink(missing_ok=True)
+
+    def _compactar(self, gerenciador: 'GerenciadorEstoque') -> None:
+        """Inicia a gravação de um novo snapshot em segundo plano.
+
+        O diário atual é renomeado para `.diario.antigo` e as novas operações passam
+        a ir para um diário vazio; o antigo só é apagado depois que o snapshot foi gravado.
+        """
+        self.descarregar()
+        self._aguardar_compactacao()
+        if self.caminho_diario_antigo.exists():
+            # Outro processo ainda está gravando o snapshot dele; se não estiver, a compactação
+            # anterior foi interrompida e o estado é consolidado agora mesmo.
+            if self._trava_compactacao.adquirir(bloquear=False):
+                try:
+                    self.salvar(gerenciador)
+                finally:
+                    self._trava_compactacao.liberar()
+            return
+        estado = self._estado_para_snapshot(gerenciador)
+        self._fechar_diario()
+        self._fechar_leitura()
+        os.replace(self.caminho_diario, self.caminho_diario_antigo)
+        self._compactacao = threading.Thread(target=self._gravar_snapshot, args=(estado,), name='compactacao-estoque')
+        self._compactacao.start()
+
+    def _aguardar_compactacao(self) -> None:
+        if self._compactacao is not None:
+            self._compactacao.join()
+            self._compactacao = None
+
+    def _fechar_diario(self) -> None:
+        if self._diario is not None:
+            self._diario.close()
+            self._diario = None
+
+    def _fechar_leitura(self) -> None:
+        if self._leitura is not None:
+            self._leitura.close()
+            self._leitura = None
+
+    def salvar(self, gerenciador: 'GerenciadorEstoque') -> None:
+        """Grava de forma síncrona um snapshot completo e descarta os diários."""
+        with self._trava:
+            self.descarregar()
+            self._sincronizar(gerenciador)
+            self._aguardar_compactacao()
+            self._fechar_diario()
+            self._fechar_leitura()
+            with self._trava_compactacao:
+                self._gravar_snapshot(self._estado_para_snapshot(gerenciador))
+                self.caminho_diario.unlink(missing_ok=True)
+
+    def fechar(self) -> None:
+        """Grava as operações pendentes, aguarda uma compactação pendente e fecha o diário."""
+        self.descarregar()
+        if self._gravador is not None:
+            self._encerrar = True
+            self._aviso.set()
+            self._gravador.join()
+            self._gravador = None
+            atexit.unregister(self.descarregar)
+        self._aguardar_compactacao()
+        self._fechar_diario()
+        self._fechar_leitura()
+        self._trava.fechar()
+        self._trava_compactacao.fechar()
+
+# Snapshot binário: cabeçalho fixo (assinatura, versão, CRC-32 do conteúdo, seq, proximo_id e
+# tamanhos) seguido de colunas de largura fixa alinhadas em 8 bytes — ids, quantidades (int64),
+# preços (float64), índices de nome/categoria/descrição (uint32) e categorias do estoque — e,
+# por fim, a tabela de textos (UTF-8, sem repetição, separados por NUL).
+ASSINATURA_SNAPSHOT = b'ESTOQUE\x00'
+VERSAO_SNAPSHOT = 1
+_CABECALHO_SNAPSHOT = struct.Struct('<8sHHIqqQQQQ')
+
+def _alinhar(dados: bytes) -> bytes:
+    return dados + bytes(-len(dados) % 8)
+
+class PersistenciaBinaria(PersistenciaJson):
+    """Igual à `PersistenciaJson`, mas com o snapshot em formato binário colunar.
+
+    O arquivo é lido por `mmap` e validado pela assinatura, versão e CRC-32; as colunas
+    numéricas são convertidas em bloco, sem decodificar texto produto a produto. Se o
+    snapshot binário ainda não existe, os dados são migrados do JSON indicado em `legado`.
+    """
+    def __init__(self, caminho: str | Path, limite_diario: int = LIMITE_DIARIO_BYTES,
+                 legado: str | Path | None = None, gravacao_adiada: float | None = None):
+        super().__init__(caminho, limite_diario, gravacao_adiada)
+        self.legado = Path(legado) if legado is not None else None
+
+    def _carregar(self, gerenciador: 'GerenciadorEstoque') -> None:
+        if not self.caminho.exists() and self.legado is not None and self.legado.exists():
+            origem = PersistenciaJson(self.legado)
+            origem.carregar(gerenciador)
+            origem.fechar()
+            self.salvar(gerenciador)
+            return
+        super()._carregar(gerenciador)
+
+    def _ler_snapshot(self, gerenciador: 'GerenciadorEstoque') -> None:
+        with self.caminho.open('rb') as arquivo, mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            self._decodificar(gerenciador, mapa)
+
+    def _decodificar(self, gerenciador: 'GerenciadorEstoque', mapa: mmap.mmap) -> None:
+        if len(mapa) < _CABECALHO_SNAPSHOT.size:
+            raise ValueError("Snapshot binário truncado.")
+        (assinatura, versao, _, crc, seq, proximo_id, total_produtos, total_categorias,
+         total_textos, tamanho_textos) = _CABECALHO_SNAPSHOT.unpack_from(mapa)
+        if assinatura != ASSINATURA_SNAPSHOT:
+            raise ValueError("Arquivo não é um snapshot binário do estoque.")
+        if versao != VERSAO_SNAPSHOT:
+            raise ValueError(f"Versão de snapshot não suportada: {versao}.")
+        with memoryview(mapa)[_CABECALHO_SNAPSHOT.size:] as conteudo:
+            if zlib.crc32(conteudo) != crc:
+                raise ValueError("Checksum do snapshot binário não confere.")
+
+        posicao = _CABECALHO_SNAPSHOT.size
+        def coluna(formato: str, quantidade: int) -> list[Any]:
+            nonlocal posicao
+            valores = array(formato)
+            tamanho = valores.itemsize * quantidade
+            valores.frombytes(mapa[posicao:posicao + tamanho])
+            if sys.byteorder != 'little':
+                valores.byteswap()
+            posicao += tamanho + (-tamanho % 8)
+            return valores.tolist()
+
+        ids = coluna('q', total_produtos)
+        quantidades = coluna('q', total_produtos)
+        precos = coluna('d', total_produtos)
+        nomes = coluna('I', total_produtos)
+        categorias = coluna('I', total_produtos)
+        descricoes = coluna('I', total_produtos)
+        categorias_estoque = coluna('I', total_categorias)
+        textos = mapa[posicao:posicao + tamanho_textos].decode('utf-8').split('\x00') if total_textos else []
+        if len(textos) != total_textos:
+            raise ValueError("Tabela de textos do snapshot binário inconsistente.")
+        texto = textos.__getitem__
+
+        gerenciador.seq = seq
+        gerenciador.proximo_id = proximo_id
+        gerenciador.categorias = set(map(texto, categorias_estoque))
+        for produto in map(Produto, ids, map(texto, nomes), map(texto, categorias),
+                           map(texto, descricoes), quantidades, precos):
+            gerenciador._inserir_produto(produto)
+
+    def _escrever_snapshot(self, caminho: Path, estado: dict[str, Any]) -> None:
+        textos: dict[str, int] = {}
+        def codigo(texto: str) -> int:
+            if texto not in textos:
+                if '\x00' in texto:
+                    raise ValueError("Textos com caractere NUL não podem ser gravados no snapshot binário.")
+                textos[texto] = len(textos)
+            return textos[texto]
+
+        produtos = estado['produtos'].values()
+        colunas = [
+            array('q', [p['id'] for p in produtos]),
+            array('q', [p['quantidade'] for p in produtos]),
+            array('d', [p['preco'] for p in produtos]),
+            array('I', [codigo(p['nome']) for p in produtos]),
+            array('I', [codigo(p['categoria']) for p in produtos]),
+            array('I', [codigo(p['descricao']) for p in produtos]),
+            array('I', [codigo(c) for c in estado['categorias']]),
+        ]
+        if sys.byteorder != 'little':
+            for valores in colunas:
+                valores.byteswap()
+        partes = [_alinhar(valores.tobytes()) for valores in colunas]
+        partes.append('\x00'.join(textos).encode('utf-8'))
+        crc = 0
+        for parte in partes:
+            crc = zlib.crc32(parte, crc)
+        cabecalho = _CABECALHO_SNAPSHOT.pack(ASSINATURA_SNAPSHOT, VERSAO_SNAPSHOT, 0, crc, estado['seq'],
+                                             estado['proximo_id'], len(produtos), len(estado['categorias']),
+                                             len(textos), len(partes[-1]))
+        with caminho.open('wb') as arquivo:
+            arquivo.write(cabecalho)
+            arquivo.writelines(partes)
+
+# Catálogo fragmentado: versão do manifesto, colunas de cada produto nos fragmentos (a categoria
+# é a do próprio fragmento) e tamanho total a partir do qual a carga usa um pool de processos.
+VERSAO_MANIFESTO = 1
+CAMPOS_FRAGMENTO = ('id', 'nome', 'descricao', 'quantidade', 'preco')
+LIMITE_CARGA_PARALELA_BYTES = 8 * 1024 * 1024
+
+def _ler_fragmento(caminho: str) -> list[list[Any]]:
+    """Lê e valida as linhas de produtos de um fragmento (função de módulo para rodar no pool de processos).
+
+    Uma linha fora do formato invalida o fragmento inteiro, que então é guardado à parte como
+    um arquivo ilegível, em vez de interromper a carga no meio da inserção.
+    """
+    with open(caminho, 'r', encoding='utf-8') as f:
+        dados = json.load(f)
+    if (not isinstance(dados, dict) or dados.get('campos') != list(CAMPOS_FRAGMENTO)
+            or not isinstance(dados.get('produtos'), list)):
+        raise ValueError(f"Fragmento inválido: {caminho}")
+    for linha in dados['produtos']:
+        if not (isinstance(linha, list) and len(linha) == len(CAMPOS_FRAGMENTO)
+                and type(linha[0]) is int and isinstance(linha[1], str) and isinstance(linha[2], str)
+                and type(linha[3]) is int and type(linha[4]) in (int, float)):
+            raise ValueError(f"Fragmento inválido: {caminho} (linha {linha!r:.80})")
+    return dados['produtos']
+
+class _FragmentosAlterados:
+    """Observador que marca a categoria (o fragmento) de cada produto inserido, alterado ou removido.
+
+    Também mantém os IDs de cada categoria, para que a compactação copie um fragmento sem
+    depender do índice de busca (que, com `busca_sob_demanda`, só é montado no primeiro uso).
+    """
+    campos = frozenset(CAMPOS_FRAGMENTO) | {'categoria'}
+
+    def __init__(self, persistencia: 'PersistenciaFragmentada'):
+        self.persistencia = persistencia
+        self.ids_por_categoria: dict[str, set[int]] = {}
+
+    def adicionar(self, produto: Produto) -> None:
+        self.ids_por_categoria.setdefault(produto.categoria, set()).add(produto.id)
+        if not self.persistencia._carregando:
+            self.persistencia._alterados.add(produto.categoria)
+
+    def remover(self, produto: Produto) -> None:
+        ids_categoria = self.ids_por_categoria.get(produto.categoria, set())
+        ids_categoria.discard(produto.id)
+        if not ids_categoria:
+            self.ids_por_categoria.pop(produto.categoria, None)
+        if not self.persistencia._carregando:
+            self.persistencia._alterados.add(produto.categoria)
+
+class PersistenciaFragmentada(PersistenciaJson):
+    """Catálogo dividido por categoria: uma pasta com `manifesto.json` e um arquivo por categoria.
+
+    O manifesto guarda `seq`, `proximo_id`, as categorias e, de cada fragmento, o arquivo e os
+    agregados (os mesmos de `EstatisticasEstoque`). O diário é o da `PersistenciaJson`
+    (`manifesto.json.diario`); a compactação regrava só os fragmentos alterados desde a anterior,
+    cada um em um arquivo novo, e a troca do manifesto confirma o conjunto. Mudar um produto
+    de categoria marca os dois fragmentos. Os arquivos substituídos só são apagados na
+    compactação seguinte, para que outros processos ainda leiam os que o manifesto deles cita.
+
+    Os fragmentos grandes são lidos em paralelo por um pool de processos. Com `sob_demanda`,
+    a carga lê só o manifesto: cada fragmento é lido na primeira vez que a sua categoria é
+    usada, e as operações sobre o catálogo inteiro (busca, listagens sem categoria, ID ainda
+    não carregado) leem os restantes. Até lá, as estatísticas usam os agregados do manifesto.
+    """
+    salvar_ao_fechar = True
+
+    def __init__(self, pasta: str | Path, limite_diario: int = LIMITE_DIARIO_BYTES,
+                 gravacao_adiada: float | None = None, sob_demanda: bool = False, processos: int | None = None):
+        self.pasta = Path(pasta)
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        super().__init__(self.pasta / 'manifesto.json', limite_diario, gravacao_adiada)
+        self.sob_demanda = sob_demanda
+        self.processos = processos
+        self._fragmentos: dict[str, dict[str, Any]] = {}
+        self._substituidos: list[str] = []
+        self._nao_carregados: set[str] = set()
+        self._alterados: set[str] = set()
+        self._gravando: set[str] = set()
+        self._semeados: dict[str, dict[str, Any]] = {}  # agregados somados às estatísticas, por fragmento
+        self._carregando = False
+
+    def observadores(self) -> list[Any]:
+        self._observador = _FragmentosAlterados(self)
+        return [self._observador]
+
+    def _carregar(self, gerenciador: 'GerenciadorEstoque') -> None:
+        self._fragmentos, self._substituidos = {}, []
+        self._nao_carregados, self._alterados, self._gravando, self._semeados = set(), set(), set(), {}
+        super()._carregar(gerenciador)
+
+    def _ler_snapshot(self, gerenciador: 'GerenciadorEstoque') -> None:
+        manifesto = self._ler_manifesto()
+        if manifesto is None:
+            raise ValueError("Manifesto ilegível.")
+        self._tamanho_snapshot = 0  # Compactar só regrava os fragmentos alterados: basta o limite do diário.
+        gerenciador.seq = manifesto['seq']
+        gerenciador.proximo_id = manifesto['proximo_id']
+        gerenciador.categorias = set(manifesto['categorias'])
+        self._fragmentos, self._substituidos = manifesto['fragmentos'], manifesto['substituidos']
+        self._nao_carregados = set(self._fragmentos)
+        if not self.sob_demanda:
+            self._carregar_fragmentos(gerenciador, sorted(self._nao_carregados))
+            return
+        # Os agregados do manifesto só valem se foram calculados com o mesmo estoque mínimo.
+        diferentes = [categoria for categoria, fragmento in self._fragmentos.items()
+                      if fragmento['estoque_minimo'] != gerenciador.estoque_minimo]
+        for categoria in self._nao_carregados.difference(diferentes):
+            self._somar_agregados(gerenciador, categoria, 1)
+        self._carregar_fragmentos(gerenciador, diferentes)
+
+    def _ler_manifesto(self) -> dict[str, Any] | None:
+        try:
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                manifesto = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            return None
+        if (not isinstance(manifesto, dict) or manifesto.get('versao') != VERSAO_MANIFESTO
+                or not {'seq', 'proximo_id', 'categorias', 'fragmentos'} <= manifesto.keys()):
+            return None
+        manifesto.setdefault('substituidos', [])
+        return manifesto
+
+    def _somar_agregados(self, gerenciador: 'GerenciadorEstoque', categoria: str, sinal: int) -> None:
+        """Soma às estatísticas os agregados de um fragmento ainda não carregado (ou, com sinal -1, os retira)."""
+        estatisticas = gerenciador._estatisticas
+        if sinal > 0:
+            fragmento = self._semeados[categoria] = self._fragmentos[categoria]
+        else:
+            fragmento = self._semeados.pop(categoria)
+        por_categoria = estatisticas.por_categoria.setdefault(categoria, _estatisticas_vazias())
+        for alvo in (estatisticas.gerais, por_categoria):
+            for chave in ('total_produtos', 'total_itens', 'baixo_estoque', 'valor_total'):
+                alvo[chave] += sinal * fragmento[chave]
+            if alvo['total_produtos'] == 0:
+                alvo['valor_total'] = 0.0
+        if por_categoria['total_produtos'] == 0:
+            del estatisticas.por_categoria[categoria]
+
+    def _carregar_fragmentos(self, gerenciador: 'GerenciadorEstoque', categorias: list[str]) -> None:
+        """Lê os fragmentos indicados (em paralelo, se forem grandes) e insere os produtos no gerenciador.
+
+        Um fragmento ilegível é renomeado para `*.corrompido-<data>` e a categoria fica sem produtos.
+        """
+        if not categorias:
+            return
+        caminhos = [str(self.pasta / self._fragmentos[categoria]['arquivo']) for categoria in categorias]
+        processos = self.processos or os.cpu_count() or 1
+        with ExitStack() as pilha:
+            if (len(caminhos) > 1 and processos > 1
+                    and sum(os.path.getsize(caminho) for caminho in caminhos) >= LIMITE_CARGA_PARALELA_BYTES):
+                from concurrent.futures import ProcessPoolExecutor
+                executor = pilha.enter_context(ProcessPoolExecutor(min(processos, len(caminhos))))
+                leituras = [executor.submit(_ler_fragmento, caminho).result for caminho in caminhos]
+            else:
+                leituras = [functools.partial(_ler_fragmento, caminho) for caminho in caminhos]
+            for categoria, caminho, ler in zip(categorias, caminhos, leituras):
+                try:
+                    linhas = ler()
+                except ValueError:
+                    copia = f"{caminho}.corrompido-{time.strftime('%Y%m%d-%H%M%S')}"
+                    os.replace(caminho, copia)
+                    print(f"{Cores.WARNING}Aviso: Fragmento '{caminho}' corrompido, guardado como '{copia}'. "
+                          f"A categoria '{categoria}' começa sem produtos.{Cores.ENDC}")
+                    linhas = []
+                if categoria in self._semeados:
+                    self._somar_agregados(gerenciador, categoria, -1)
+                self._carregando = True
+                try:
+                    for id_produto, nome, descricao, quantidade, preco in linhas:
+                        gerenciador._inserir_produto(Produto(id_produto, nome, categoria, descricao, quantidade, preco))
+                finally:
+                    self._carregando = False
+                self._nao_carregados.discard(categoria)
+                if not linhas:
+                    self._alterados.add(categoria)  # O manifesto deixa de citar o fragmento perdido.
+
+    def garantir(self, gerenciador: 'GerenciadorEstoque', categoria: str | None = None) -> None:
+        """Carrega o fragmento de `categoria` (ou todos os que faltam), se ainda não estiver na memória."""
+        if not self._nao_carregados:
+            return
+        try:
+            self._garantir(gerenciador, categoria)
+        except FileNotFoundError:
+            # O fragmento citado pelo nosso manifesto já foi apagado (houve duas compactações):
+            # recarrega tudo a partir do manifesto atual.
+            with self._trava:
+                self.descarregar()
+                self._recarregar(gerenciador)
+            self._garantir(gerenciador, categoria)
+
+    def _garantir(self, gerenciador: 'GerenciadorEstoque', categoria: str | None) -> None:
+        with self._trava_compactacao:
+            alvos = self._nao_carregados if categoria is None else self._nao_carregados & {categoria}
+            self._carregar_fragmentos(gerenciador, sorted(alvos))
+
+    def _preparar_registro(self, gerenciador: 'GerenciadorEstoque', registro: dict[str, Any]) -> None:
+        """Antes de reaplicar uma operação, carrega os fragmentos que ela altera."""
+        if not self._nao_carregados:
+            return
+        try:
+            match registro['op']:
+                case 'adicionar':
+                    self._garantir(gerenciador, registro['produto']['categoria'])
+                case 'movimentar' | 'atualizar' | 'remover':
+                    if registro['id'] not in gerenciador.produtos:
+                        self._garantir(gerenciador, None)
+                    if registro['op'] == 'atualizar' and 'categoria' in registro['campos']:
+                        self._garantir(gerenciador, registro['campos']['categoria'])
+                case 'lote':
+                    for operacao in registro['ops']:
+                        self._preparar_registro(gerenciador, operacao)
+        except FileNotFoundError:
+            raise _DiarioDefasado()
+
+    def _estado_para_snapshot(self, gerenciador: 'GerenciadorEstoque') -> dict[str, Any]:
+        """Copia só os fragmentos alterados (e os de uma gravação anterior que não terminou)."""
+        categorias = self._alterados | self._gravando
+        self._alterados, self._gravando = set(), categorias
+        fragmentos, agregados = {}, {}
+        for categoria in categorias:
+            ids = sorted(self._observador.ids_por_categoria.get(categoria, ()))
+            fragmentos[categoria] = [[p.id, p.nome, p.descricao, p.quantidade, p.preco]
+                                     for p in (gerenciador.produtos[id_produto] for id_produto in ids)]
+            agregados[categoria] = {**gerenciador._estatisticas.por_categoria.get(categoria, _estatisticas_vazias()),
+                                    'estoque_minimo': gerenciador.estoque_minimo}
+        return {'seq': gerenciador.seq, 'proximo_id': gerenciador.proximo_id,
+                'categorias': sorted(gerenciador.categorias), 'fragmentos': fragmentos, 'agregados': agregados}
+
+    def _nome_fragmento(self, categoria: str, seq: int) -> str:
+        base = re.sub(r'[^a-z0-9]+', '-', normalizar_texto(categoria)).strip('-')[:40] or 'categoria'
+        return f"{base}-{zlib.crc32(categoria.encode('utf-8')):08x}-{seq}.json"
+
+    def _gravar_arquivo(self, caminho: Path, conteudo: str) -> None:
+        caminho_temp = caminho.with_name(caminho.name + '.tmp')
+        caminho_temp.write_text(conteudo, encoding='utf-8')
+        _fsync(caminho_temp)
+        self._contar_bytes(caminho_temp.stat().st_size)
+        os.replace(caminho_temp, caminho)
+
+    def _gravar_snapshot(self, estado: dict[str, Any]) -> None:
+        """Grava os fragmentos alterados em arquivos novos e então troca o manifesto (o ponto de confirmação)."""
+        with self._trava_compactacao:
+            if self._trava_compactacao.ler_versao() > estado['seq']:
+                self._gravando = set()
+                return
+            # O manifesto em disco pode ser de outro processo e mais novo que o lido na carga.
+            atual = self._ler_manifesto()
+            if atual is not None:
+                self._fragmentos, self._substituidos = atual['fragmentos'], atual['substituidos']
+            fragmentos = dict(self._fragmentos)
+            substituidos = []
+            for categoria, linhas in estado['fragmentos'].items():
+                nome = self._nome_fragmento(categoria, estado['seq'])
+                anterior = fragmentos.pop(categoria, None)
+                if anterior is not None and anterior['arquivo'] != nome:
+                    substituidos.append(anterior['arquivo'])
+                if linhas:
+                    self._gravar_arquivo(self.pasta / nome, json.dumps(
+                        {'versao': VERSAO_MANIFESTO, 'categoria': categoria, 'campos': CAMPOS_FRAGMENTO,
+                         'produtos': linhas}, ensure_ascii=False, separators=(',', ':')))
+                    fragmentos[categoria] = {'arquivo': nome, **estado['agregados'][categoria]}
+            self._gravar_arquivo(self.caminho, json.dumps(
+                {'versao': VERSAO_MANIFESTO, 'seq': estado['seq'], 'proximo_id': estado['proximo_id'],
+                 'categorias': estado['categorias'], 'fragmentos': fragmentos, 'substituidos': substituidos},
+                indent=4, ensure_ascii=False))
+            _fsync_diretorio(self.pasta)
+            self._trava_compactacao.gravar_versao(estado['seq'])
+            citados = {fragmento['arquivo'] for fragmento in fragmentos.values()}
+            for nome in self._substituidos:
+                if nome not in citados:
+                    (self.pasta / nome).unlink(missing_ok=True)
+            self._fragmentos, self._substituidos = fragmentos, substituidos
+            self._gravando = set()
+            self.caminho_diario_antigo.unlink(missing_ok=True)
+
+    def salvar(self, gerenciador: 'GerenciadorEstoque') -> None:
+        """Consolida o diário regravando só os fragmentos alterados (nada, se não houver alterações)."""
+        with self._trava:
+            self.descarregar()
+            self._sincronizar(gerenciador)
+            self._aguardar_compactacao()
+            if (not self._alterados and not self._gravando and not self.caminho_diario_antigo.exists()
+                    and self._trava_compactacao.ler_versao() == gerenciador.seq and self.caminho.exists()):
+                return
+            super().salvar(gerenciador)
+
+def _escapar_like(texto: str) -> str:
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+class ProdutosSqlite(MutableMapping):
+    """Mapeamento id -> Produto que lê do SQLite sob demanda e guarda em memória o que já foi lido.
+
+    Inclusões e remoções feitas em memória e ainda não gravadas (dentro de uma transação)
+    são acompanhadas para que `len`, `in` e a iteração reflitam o estado em memória.
+    Fora de transações, o cache guarda no máximo `limite_cache` produtos: ao passar disso,
+    a metade lida há mais tempo é descartada (o que está no cache já foi gravado no banco).
+    """
+    def __init__(self, conexao, limite_cache: int = LIMITE_CACHE_SQLITE):
+        self._conexao = conexao
+        self._limite_cache = limite_cache
+        self._cache: dict[int, Produto] = {}
+        self._inseridos: set[int] = set()
+        self._removidos: set[int] = set()
+
+    def _ler_do_banco(self, id_produto: int) -> Produto | None:
+        linha = self._conexao.execute(
+            "SELECT id, nome, categoria, descricao, quantidade, preco FROM produtos WHERE id = ?", (id_produto,)).fetchone()
+        return Produto(*linha) if linha else None
+
+    def __getitem__(self, id_produto: int) -> Produto:
+        produto = self._cache.get(id_produto)
+        if produto is None:
+            if id_produto in self._removidos or (produto := self._ler_do_banco(id_produto)) is None:
+                raise KeyError(id_produto)
+            if len(self._cache) >= self._limite_cache and not self._conexao.in_transaction:
+                for antigo in list(itertools.islice(self._cache, len(self._cache) // 2)):
+                    del self._cache[antigo]
+            self._cache[id_produto] = produto
+        return produto
+
+    def __setitem__(self, id_produto: int, produto: Produto) -> None:
+        if id_produto in self._removidos:
+            self._removidos.discard(id_produto)
+        elif id_produto not in self._cache and self._ler_do_banco(id_produto) is None:
+            self._inseridos.add(id_produto)
+        self._cache[id_produto] = produto
+
+    def __delitem__(self, id_produto: int) -> None:
+        self[id_produto]
+        del self._cache[id_produto]
+        if id_produto in self._inseridos:
+            self._inseridos.discard(id_produto)
+        else:
+            self._removidos.add(id_produto)
+
+    def confirmar(self) -> None:
+        """Chamado depois que as operações pendentes foram gravadas no banco."""
+        self._inseridos.clear()
+        self._removidos.clear()
+
+    def descartar_cache(self) -> None:
+        self._cache.clear()
+        self.confirmar()
+
+    def __len__(self) -> int:
+        (total,) = self._conexao.execute("SELECT COUNT(*) FROM produtos").fetchone()
+        return total + len(self._inseridos) - len(self._removidos)
+
+    def __iter__(self) -> Iterator[int]:
+        for (id_produto,) in self._conexao.execute("SELECT id FROM produtos ORDER BY id"):
+            if id_produto not in self._removidos:
+                yield id_produto
+        yield from sorted(self._inseridos)
+
+    def values(self) -> Iterator[Produto]:
+        """Percorre todos os produtos sem guardá-los em memória (exceto os que já estavam)."""
+        for linha in self._conexao.execute(
+                "SELECT id, nome, categoria, descricao, quantidade, preco FROM produtos ORDER BY id"):
+            if linha[0] not in self._removidos:
+                yield self._cache.get(linha[0]) or Produto(*linha)
+        for id_produto in sorted(self._inseridos):
+            yield self._cache[id_produto]
+
+    def items(self) -> Iterator[tuple[int, Produto]]:
+        return ((produto.id, produto) for produto in self.values())
+
+class PersistenciaSqlite(PersistenciaSobDemanda):
+    """Banco SQLite (modo WAL) com uma linha por produto e índices por nome, categoria, quantidade e preço.
+
+    Os produtos são carregados sob demanda, então a inicialização não depende do tamanho
+    do catálogo. Cada operação vira instruções SQL por linha, e buscas e listagens são
+    resolvidas no próprio banco. Consultas enxergam apenas o que já foi gravado, ou seja,
+    não veem as alterações de uma transação ainda em andamento.
+
+    As estatísticas ficam na tabela `estatisticas`, mantida por gatilhos na mesma transação
+    que altera os produtos, contra o estoque mínimo guardado em `meta`. Enquanto não há
+    estoque mínimo guardado (banco novo ou migrado), os gatilhos não fazem nada; a primeira
+    leitura com outro estoque mínimo refaz a tabela com uma agregação completa.
+    """
+    def __init__(self, caminho: str | Path):
+        import sqlite3
+        super().__init__(caminho)
+        self._conexao = sqlite3.connect(self.caminho, isolation_level=None, timeout=60)
+        self._conexao.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS produtos (
+                id INTEGER PRIMARY KEY, nome TEXT NOT NULL, categoria TEXT NOT NULL, descricao TEXT NOT NULL,
+                quantidade INTEGER NOT NULL, preco REAL NOT NULL, nome_busca TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS idx_produtos_nome ON produtos (nome);
+            CREATE INDEX IF NOT EXISTS idx_produtos_categoria ON produtos (categoria);
+            CREATE INDEX IF NOT EXISTS idx_produtos_quantidade ON produtos (quantidade);
+            CREATE INDEX IF NOT EXISTS idx_produtos_preco ON produtos (preco);
+            CREATE TABLE IF NOT EXISTS categorias (nome TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS estatisticas (
+                categoria TEXT PRIMARY KEY, total_produtos INTEGER NOT NULL, total_itens INTEGER NOT NULL,
+                baixo_estoque INTEGER NOT NULL, valor_total REAL NOT NULL);
+            CREATE TRIGGER IF NOT EXISTS estatisticas_inserir AFTER INSERT ON produtos
+            WHEN (SELECT valor FROM meta WHERE chave = 'estoque_minimo') IS NOT NULL BEGIN
+                INSERT OR IGNORE INTO estatisticas VALUES (NEW.categoria, 0, 0, 0, 0.0);
+                UPDATE estatisticas SET total_produtos = total_produtos + 1, total_itens = total_itens + NEW.quantidade,
+                    baixo_estoque = baixo_estoque + (NEW.quantidade < (SELECT valor FROM meta WHERE chave = 'estoque_minimo')),
+                    valor_total = valor_total + NEW.quantidade * NEW.preco
+                WHERE categoria = NEW.categoria;
+            END;
+            CREATE TRIGGER IF NOT EXISTS estatisticas_remover AFTER DELETE ON produtos
+            WHEN (SELECT valor FROM meta WHERE chave = 'estoque_minimo') IS NOT NULL BEGIN
+                UPDATE estatisticas SET total_produtos = total_produtos - 1, total_itens = total_itens - OLD.quantidade,
+                    baixo_estoque = baixo_estoque - (OLD.quantidade < (SELECT valor FROM meta WHERE chave = 'estoque_minimo')),
+                    valor_total = valor_total - OLD.quantidade * OLD.preco
+                WHERE categoria = OLD.categoria;
+                DELETE FROM estatisticas WHERE categoria = OLD.categoria AND total_produtos = 0;
+            END;
+            CREATE TRIGGER IF NOT EXISTS estatisticas_atualizar AFTER UPDATE OF categoria, quantidade, preco ON produtos
+            WHEN (SELECT valor FROM meta WHERE chave = 'estoque_minimo') IS NOT NULL BEGIN
+                UPDATE estatisticas SET total_produtos = total_produtos - 1, total_itens = total_itens - OLD.quantidade,
+                    baixo_estoque = baixo_estoque - (OLD.quantidade < (SELECT valor FROM meta WHERE chave = 'estoque_minimo')),
+                    valor_total = valor_total - OLD.quantidade * OLD.preco
+                WHERE categoria = OLD.categoria;
+                INSERT OR IGNORE INTO estatisticas VALUES (NEW.categoria, 0, 0, 0, 0.0);
+                UPDATE estatisticas SET total_produtos = total_produtos + 1, total_itens = total_itens + NEW.quantidade,
+                    baixo_estoque = baixo_estoque + (NEW.quantidade < (SELECT valor FROM meta WHERE chave = 'estoque_minimo')),
+                    valor_total = valor_total + NEW.quantidade * NEW.preco
+                WHERE categoria = NEW.categoria;
+                DELETE FROM estatisticas WHERE categoria = OLD.categoria AND total_produtos = 0;
+            END;
+        """)
+        self.produtos = ProdutosSqlite(self._conexao)
+        self._versao_dados = None
+
+    def carregar(self, gerenciador: 'GerenciadorEstoque') -> None:
+        (self._versao_dados,) = self._conexao.execute("PRAGMA data_version").fetchone()
+        meta = dict(self._conexao.execute("SELECT chave, valor FROM meta"))
+        gerenciador.seq = meta.get('seq', 0)
+        gerenciador.proximo_id = meta.get('proximo_id', 1)
+        categorias = {nome for (nome,) in self._conexao.execute("SELECT nome FROM categorias")}
+        gerenciador.categorias = categorias or set(CATEGORIAS_PADRAO)
+        gerenciador.produtos = self.produtos
+
+    def _executar_sql(self, registro: dict[str, Any]) -> None:
+        match registro['op']:
+            case 'adicionar':
+                p = registro['produto']
+                self._conexao.execute(
+                    "INSERT INTO produtos (id, nome, categoria, descricao, quantidade, preco, nome_busca) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (p['id'], p['nome'], p['categoria'], p['descricao'], p['quantidade'], p['preco'],
+                     normalizar_texto(p['nome'])))
+            case 'movimentar':
+                self._conexao.execute("UPDATE produtos SET quantidade = quantidade + ? WHERE id = ?",
+                                      (registro['quantidade'], registro['id']))
+            case 'atualizar':
+                campos = dict(registro['campos'])
+                if 'nome' in campos:
+                    campos['nome_busca'] = normalizar_texto(campos['nome'])
+                atribuicoes = ', '.join(f"{campo} = ?" for campo in campos)
+                self._conexao.execute(f"UPDATE produtos SET {atribuicoes} WHERE id = ?",
+                                      (*campos.values(), registro['id']))
+            case 'remover':
+                self._conexao.execute("DELETE FROM produtos WHERE id = ?", (registro['id'],))
+            case 'categoria':
+                self._conexao.execute("INSERT OR IGNORE INTO categorias (nome) VALUES (?)", (registro['categoria'],))
+            case 'remover_categoria':
+                self._conexao.execute("DELETE FROM categorias WHERE nome = ?", (registro['categoria'],))
+            case 'lote':
+                for operacao in registro['ops']:
+                    self._executar_sql(operacao)
+
+    @contextmanager
+    def exclusivo(self, gerenciador: 'GerenciadorEstoque') -> Iterator[None]:
+        """Abre uma transação de escrita (`BEGIN IMMEDIATE`), confirmada ao fim da transação do gerenciador."""
+        self._conexao.execute("BEGIN IMMEDIATE")
+        try:
+            self._sincronizar(gerenciador)
+            yield
+        except BaseException:
+            self._conexao.execute("ROLLBACK")
+            raise
+        self._conexao.execute("COMMIT")
+
+    def sincronizar(self, gerenciador: 'GerenciadorEstoque') -> None:
+        self._sincronizar(gerenciador)
+
+    def _sincronizar(self, gerenciador: 'GerenciadorEstoque') -> None:
+        """Se outra conexão gravou no banco (`PRAGMA data_version` mudou), descarta o que está em memória."""
+        (versao,) = self._conexao.execute("PRAGMA data_version").fetchone()
+        if versao != self._versao_dados:
+            self.produtos.descartar_cache()
+            self.carregar(gerenciador)
+
+    def registrar(self, gerenciador: 'GerenciadorEstoque', registro: dict[str, Any]) -> None:
+        """Executa a operação na transação SQL aberta por `exclusivo`, junto com `seq` e `proximo_id`."""
+        self._executar_sql(registro)
+        self._conexao.executemany("INSERT OR REPLACE INTO meta (chave, valor) VALUES (?, ?)",
+                                  [('seq', registro['seq']), ('proximo_id', gerenciador.proximo_id)])
+        self.produtos.confirmar()
+
+    def salvar(self, gerenciador: 'GerenciadorEstoque') -> None:
+        """Cada operação já é gravada no banco; aqui apenas consolidamos o WAL no arquivo principal."""
+        self._conexao.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def fechar(self) -> None:
+        self._conexao.close()
+
+    def buscar(self, termo: str, limite: int | None) -> list[int]:
+        normalizado = normalizar_texto(termo)
+        escapado = _escapar_like(normalizado)
+        # isascii: `isdigit` também aceita dígitos como '²', que `int` recusa.
+        id_exato = int(termo) if termo.isascii() and termo.isdigit() and str(int(termo)) == termo else -1
+        categorias = [categoria for (categoria,) in self._conexao.execute("SELECT DISTINCT categoria FROM produtos")
+                      if normalizado in normalizar_texto(categoria)]
+        marcadores = ', '.join(f':categoria{i}' for i in range(len(categorias))) or 'NULL'
+        consulta = f"""
+            SELECT id FROM produtos
+            WHERE id = :id OR nome_busca LIKE :contem ESCAPE '\\' OR categoria IN ({marcadores})
+            ORDER BY CASE
+                WHEN id = :id THEN 0
+                WHEN nome_busca = :termo THEN 1
+                WHEN nome_busca LIKE :prefixo ESCAPE '\\' THEN 2
+                WHEN nome_busca LIKE :palavra ESCAPE '\\' THEN 3
+                WHEN nome_busca LIKE :contem ESCAPE '\\' THEN 4
+                ELSE 5 END, nome_busca, id
+            LIMIT :limite"""
+        parametros = {'id': id_exato, 'termo': normalizado, 'prefixo': f'{escapado}%',
+                      'palavra': f'% {escapado}%', 'contem': f'%{escapado}%',
+                      'limite': -1 if limite is None else limite}
+        parametros.update({f'categoria{i}': categoria for i, categoria in enumerate(categorias)})
+        return [id_p for (id_p,) in self._conexao.execute(consulta, parametros)]
+
+    def consultar(self, categoria: str | None, faixas: dict[str, tuple[Any, Any]], ordenar_por: str,
+                  decrescente: bool, deslocamento: int, limite: int | None) -> list[int]:
+        condicoes, parametros = [], []
+        if categoria is not None:
+            condicoes.append("categoria = ?")
+            parametros.append(categoria)
+        for campo, (minimo, maximo) in faixas.items():
+            if minimo is not None:
+                condicoes.append(f"{campo} >= ?")
+                parametros.append(minimo)
+            if maximo is not None:
+                condicoes.append(f"{campo} <= ?")
+                parametros.append(maximo)
+        onde = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        direcao = "DESC" if decrescente else "ASC"
+        consulta = f"SELECT id FROM produtos {onde} ORDER BY {ordenar_por} {direcao}, id {direcao} LIMIT ? OFFSET ?"
+        parametros += [-1 if limite is None else limite, deslocamento]
+        return [id_p for (id_p,) in self._conexao.execute(consulta, parametros)]
+
+    def estatisticas(self, estoque_minimo: int, recontar: bool = False) -> EstatisticasEstoque:
+        """Lê os agregados mantidos pelos gatilhos (refeitos antes se o estoque mínimo guardado for outro)."""
+        agregacao = ("SELECT categoria, COUNT(*), SUM(quantidade), SUM(quantidade < ?), TOTAL(quantidade * preco) "
+                     "FROM produtos GROUP BY categoria")
+        if recontar:
+            linhas = self._conexao.execute(agregacao, (estoque_minimo,)).fetchall()
+        else:
+            guardado = self._conexao.execute("SELECT valor FROM meta WHERE chave = 'estoque_minimo'").fetchone()
+            if guardado != (estoque_minimo,):
+                self._refazer_estatisticas(agregacao, estoque_minimo)
+            linhas = self._conexao.execute("SELECT * FROM estatisticas ORDER BY categoria").fetchall()
+        estatisticas = EstatisticasEstoque(estoque_minimo)
+        for categoria, produtos, itens, baixo, valor in linhas:
+            estatisticas.por_categoria[categoria] = {
+                'total_produtos': produtos, 'total_itens': itens, 'baixo_estoque': baixo, 'valor_total': valor}
+            for chave, valor_categoria in estatisticas.por_categoria[categoria].items():
+                estatisticas.gerais[chave] += valor_categoria
+        return estatisticas
+
+    def _refazer_estatisticas(self, agregacao: str, estoque_minimo: int) -> None:
+        """Refaz a tabela `estatisticas` para outro estoque mínimo, na transação aberta ou em uma própria."""
+        propria = not self._conexao.in_transaction
+        if propria:
+            self._conexao.execute("BEGIN IMMEDIATE")
+        try:
+            self._conexao.execute("DELETE FROM estatisticas")
+            self._conexao.execute(f"INSERT INTO estatisticas {agregacao}", (estoque_minimo,))
+            self._conexao.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES ('estoque_minimo', ?)",
+                                  (estoque_minimo,))
+        except BaseException:
+            if propria:
+                self._conexao.execute("ROLLBACK")
+            raise
+        if propria:
+            self._conexao.execute("COMMIT")
+
+def migrar_json_para_sqlite(origem: str | Path, destino: str | Path) -> int:
+    """Copia um estoque JSON (snapshot + diário) para um banco SQLite novo e retorna quantos produtos migrou."""
+    if Path(destino).exists():
+        raise FileExistsError(f"O banco '{destino}' já existe.")
+    estoque_json = GerenciadorEstoque(origem)
+    sqlite = PersistenciaSqlite(destino)
+    conexao = sqlite._conexao
+    conexao.execute("BEGIN")
+    conexao.executemany(
+        "INSERT INTO produtos (id, nome, categoria, descricao, quantidade, preco, nome_busca) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((p.id, p.nome, p.categoria, p.descricao, p.quantidade, p.preco, normalizar_texto(p.nome))
+         for p in estoque_json.produtos.values()))
+    conexao.executemany("INSERT INTO categorias (nome) VALUES (?)", ((c,) for c in estoque_json.categorias))
+    conexao.executemany("INSERT INTO meta (chave, valor) VALUES (?, ?)",
+                        [('seq', estoque_json.seq), ('proximo_id', estoque_json.proximo_id)])
+    conexao.execute("COMMIT")
+    sqlite.fechar()
+    estoque_json.fechar()
+    return len(estoque_json.produtos)
+
+def _formato_arquivo(caminho: Path) -> str:
+    formatos = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+    if caminho.suffix.lower() not in formatos:
+        raise ValueError(f"Formato de '{caminho}' não suportado: use .csv ou .jsonl.")
+    return formatos[caminho.suffix.lower()]
+
+def _ler_linhas(caminho: Path, formato: str) -> Iterator[tuple[int, Any]]:
+    """Gera (número da linha, conteúdo) sem carregar o arquivo: dicionários no CSV, texto no JSONL.
+
+    As linhas JSONL só são decodificadas na validação, para que isso também rode nos processos auxiliares.
+    """
+    if formato == 'csv':
+        import csv
+        with caminho.open(newline='', encoding='utf-8-sig') as arquivo:
+            try:
+                dialeto = csv.Sniffer().sniff(arquivo.read(64 * 1024), delimiters=',;\t')
+            except csv.Error:
+                dialeto = csv.excel
+            arquivo.seek(0)
+            leitor = csv.DictReader(arquivo, dialect=dialeto)
+            for dados in leitor:
+                yield leitor.line_num, dados
+    else:
+        with caminho.open(encoding='utf-8') as arquivo:
+            for numero, linha in enumerate(arquivo, 1):
+                if linha.strip():
+                    yield numero, linha
+
+def _em_blocos(itens: Iterable[Any], tamanho: int) -> Iterator[list[Any]]:
+    itens = iter(itens)
+    while bloco := list(itertools.islice(itens, tamanho)):
+        yield bloco
+
+def _converter_linha(dados: Any) -> dict[str, Any]:
+    """Valida e converte uma linha importada no formato de `adicionar_produtos_em_lote`."""
+    if isinstance(dados, str):
+        dados = json.loads(dados)
+    if not isinstance(dados, dict):
+        raise ValueError("A linha não é um objeto com os campos do produto.")
+    nome = str(dados.get('nome') or '').strip()
+    if not nome:
+        raise ValueError("O nome não pode ser vazio.")
+    categoria = str(dados.get('categoria') or '').strip()
+    if not categoria:
+        raise ValueError("A categoria não pode ser vazia.")
+    quantidade = dados.get('quantidade')
+    # isascii: `isdigit` também aceita dígitos como '²', que `int` recusa.
+    if isinstance(quantidade, str) and (digitos := quantidade.strip().lstrip('+')).isascii() and digitos.isdigit():
+        quantidade = int(digitos)
+    elif isinstance(quantidade, float) and quantidade.is_integer():
+        quantidade = int(quantidade)
+    if isinstance(quantidade, bool) or not isinstance(quantidade, int) or quantidade < 0:
+        raise ValueError("A quantidade deve ser um inteiro zero ou positivo.")
+    preco = dados.get('preco')
+    if isinstance(preco, str):
+        texto = preco.strip()
+        try:
+            preco = float(texto.replace(',', '.') if '.' not in texto else texto)
+        except ValueError:
+            pass
+    if isinstance(preco, bool) or not isinstance(preco, (int, float)) or not math.isfinite(preco) or preco < 0:
+        raise ValueError("O preço deve ser um número positivo.")
+    return {'nome': nome, 'categoria': categoria, 'descricao': str(dados.get('descricao') or '').strip(),
+            'quantidade': quantidade, 'preco': float(preco)}
+
+def _validar_bloco(bloco: list[tuple[int, Any]]) -> tuple[list[dict[str, Any]], list[tuple[int, str]]]:
+    """Converte um bloco de linhas; retorna os produtos válidos e (posição no bloco, motivo) dos rejeitados."""
+    validos, rejeitados = [], []
+    for posicao, (_, dados) in enumerate(bloco):
+        try:
+            validos.append(_converter_linha(dados))
+        except ValueError as erro:
+            rejeitados.append((posicao, str(erro)))
+    return validos, rejeitados
+
+def _validar_em_paralelo(executor, blocos: Iterable[list[tuple[int, Any]]], maximo_pendentes: int):
+    """Distribui os blocos entre os processos, com no máximo `maximo_pendentes` em andamento, preservando a ordem."""
+    pendentes = deque()
+    for bloco in blocos:
+        pendentes.append((bloco, executor.submit(_validar_bloco, bloco)))
+        if len(pendentes) >= maximo_pendentes:
+            bloco, futuro = pendentes.popleft()
+            yield bloco, futuro.result()
+    while pendentes:
+        bloco, futuro = pendentes.popleft()
+        yield bloco, futuro.result()
+
+def importar_produtos(gerenciador: 'GerenciadorEstoque', caminho: str | Path, relatorio_erros: str | Path | None = None,
+                      tamanho_bloco: int = TAMANHO_BLOCO_IMPORTACAO, processos: int | None = None) -> dict[str, int]:
+    """Importa produtos de um arquivo CSV ou JSONL em blocos, com memória constante.
+
+    Cada bloco é validado (em `processos` processos auxiliares; por padrão um por CPU) e
+    gravado com `adicionar_produtos_em_lote`, ou seja, em uma única transação. Os IDs do
+    arquivo são ignorados e novos IDs são atribuídos. Linhas rejeitadas vão para o relatório
+    CSV `relatorio_erros` (por padrão `<arquivo>.erros.csv`), com a linha e o motivo.
+    """
+    caminho = Path(caminho)
+    formato = _formato_arquivo(caminho)
+    relatorio_erros = Path(relatorio_erros) if relatorio_erros else caminho.with_name(caminho.name + '.erros.csv')
+    relatorio_erros.unlink(missing_ok=True)
+    processos = processos or os.cpu_count() or 1
+    resultado = {'importados': 0, 'rejeitados': 0}
+    blocos = _em_blocos(_ler_linhas(caminho, formato), tamanho_bloco)
+    with ExitStack() as pilha:
+        if processos > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            executor = pilha.enter_context(ProcessPoolExecutor(processos))
+            validacoes = _validar_em_paralelo(executor, blocos, processos * 2)
+        else:
+            validacoes = ((bloco, _validar_bloco(bloco)) for bloco in blocos)
+        relatorio = None
+        for bloco, (validos, rejeitados) in validacoes:
+            if validos:
+                gerenciador.adicionar_produtos_em_lote(validos)
+            resultado['importados'] += len(validos)
+            resultado['rejeitados'] += len(rejeitados)
+            if rejeitados and relatorio is None:
+                import csv
+                arquivo = pilha.enter_context(relatorio_erros.open('w', newline='', encoding='utf-8'))
+                relatorio = csv.writer(arquivo)
+                relatorio.writerow(['linha', 'erro', 'conteudo'])
+            for posicao, erro in rejeitados:
+                numero, dados = bloco[posicao]
+                conteudo = dados.strip() if isinstance(dados, str) else json.dumps(dados, ensure_ascii=False)
+                relatorio.writerow([numero, erro, conteudo])
+    return resultado
+
+def exportar_produtos(gerenciador: 'GerenciadorEstoque', caminho: str | Path, categoria: str | None = None) -> int:
+    """Grava os produtos (opcionalmente de uma categoria) em CSV ou JSONL, um por vez, e retorna quantos gravou."""
+    caminho = Path(caminho)
+    formato = _formato_arquivo(caminho)
+    gerenciador.persistencia.garantir(gerenciador, categoria)
+    produtos = (p for p in gerenciador.produtos.values() if categoria is None or p.categoria == categoria)
+    total = 0
+    with caminho.open('w', newline='', encoding='utf-8') as arquivo:
+        if formato == 'csv':
+            import csv
+            escritor = csv.writer(arquivo)
+            escritor.writerow(CAMPOS_PRODUTO)
+            for produto in produtos:
+                escritor.writerow([getattr(produto, campo) for campo in CAMPOS_PRODUTO])
+                total += 1
+        else:
+            for produto in produtos:
+                arquivo.write(json.dumps(produto_para_dict(produto), ensure_ascii=False) + '\n')
+                total += 1
+    return total
+
+# Registro do livro de movimentações: instante (segundos desde a época), ID do produto, quantidade
+# e os índices (a partir de 1; 0 = ausente) da categoria e do motivo na tabela de textos.
+REGISTRO_MOVIMENTO = struct.Struct('<dqqII')
+# Movimentações acumuladas nos resumos entre uma gravação automática e outra.
+INTERVALO_RESUMOS = 100_000
+
+def _validar_motivo(motivo: Any) -> None:
+    # O livro só é gravado depois do diário: um motivo inválido precisa ser recusado antes da transação.
+    if motivo is not None and not isinstance(motivo, str):
+        raise ValueError("O motivo deve ser um texto.")
+
+class LivroMovimentos:
+    """Histórico das movimentações de estoque, só de acréscimos, com resumos diários e mensais.
+
+    Cada movimentação confirmada vira um registro binário de tamanho fixo em `<arquivo>.movimentos`;
+    categorias e motivos são gravados uma única vez em `<arquivo>.movimentos.textos` e citados
+    por índice. Os resumos (entradas, saídas e número de movimentações por dia e por mês, de cada
+    produto e de cada categoria) são atualizados a cada registro e gravados em
+    `<arquivo>.movimentos.resumos` com a marca d'água: a posição do livro até onde eles já contam.
+    Os resumos só são lidos no primeiro relatório (`somar`), junto com os registros depois da marca;
+    até lá, `registrar` apenas acrescenta ao livro. Os relatórios usam os resumos mensais nos meses
+    completos e os diários nas pontas do período, sem percorrer o livro.
+
+    O livro é gravado depois do diário do estoque, fora do mesmo commit: se o processo cair entre
+    as duas gravações, as movimentações já confirmadas no estoque ficam fora do livro e dos relatórios.
+    """
+    def __init__(self, caminho_base: str | Path):
+        caminho_base = Path(caminho_base)
+        self.caminho = caminho_base.with_name(caminho_base.name + '.movimentos')
+        self.caminho_textos = self.caminho.with_name(self.caminho.name + '.textos')
+        self.caminho_resumos = self.caminho.with_name(self.caminho.name + '.resumos')
+        self._trava = TravaArquivo(self.caminho.with_name(self.caminho.name + '.lock'))
+        self.textos: list[str] = []
+        self._indices_textos: dict[str, int] = {}
+        self._posicao_textos = 0
+        self.resumos: dict[str, dict[str, dict[str, dict[Any, list[int]]]]] = {'dia': {}, 'mes': {}}
+        self.marca = 0
+        self._nao_salvos = 0
+        self._dia_atual = (0.0, 0.0, '')
+        self._resumos_carregados = False
+
+    def _carregar_resumos(self) -> None:
+        """Lê os resumos gravados; se estiverem ausentes ou ilegíveis, eles são refeitos a partir do livro."""
+        try:
+            with open(self.caminho_resumos, 'r', encoding='utf-8') as f:
+                dados = json.load(f)
+            resumos = {escala: {periodo: {'produtos': {int(id_p): v for id_p, v in grupos['produtos'].items()},
+                                          'categorias': grupos['categorias']}
+                                for periodo, grupos in dados[escala].items()} for escala in ('dia', 'mes')}
+            marca = dados['marca']
+        except FileNotFoundError:
+            return
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError, AttributeError):
+            print(f"{Cores.WARNING}Aviso: resumos de movimentações ilegíveis em '{self.caminho_resumos}'; "
+                  f"refazendo a partir do livro.{Cores.ENDC}")
+            return
+        if marca % REGISTRO_MOVIMENTO.size == 0:
+            self.resumos, self.marca = resumos, marca
+
+    def _ler_textos(self) -> None:
+        """Lê as categorias e motivos acrescentados à tabela de textos desde a última leitura."""
+        try:
+            with open(self.caminho_textos, 'rb') as f:
+                f.seek(self._posicao_textos)
+                novos = f.read()
+        except FileNotFoundError:
+            return
+        completos = novos[:novos.rfind(b'\n') + 1]
+        self._posicao_textos += len(completos)
+        for linha in completos.decode('utf-8').splitlines():
+            self._indices_textos[linha] = len(self.textos) + 1
+            self.textos.append(linha)
+
+    def _texto(self, indice: int) -> str:
+        if indice > len(self.textos):  # Texto acrescentado por outro processo depois da última leitura.
+            self._ler_textos()
+        return self.textos[indice - 1] if indice else ''
+
+    def _periodos(self, instante: float) -> tuple[str, str]:
+        """Dia (AAAA-MM-DD) e mês (AAAA-MM), no fuso local, de um instante; o último dia visto fica em cache."""
+        inicio, fim, dia = self._dia_atual
+        if not inicio <= instante < fim:
+            data = datetime.fromtimestamp(instante).date()
+            inicio = datetime.combine(data, datetime.min.time()).timestamp()
+            fim = datetime.combine(data + timedelta(days=1), datetime.min.time()).timestamp()
+            dia = data.isoformat()
+            self._dia_atual = (inicio, fim, dia)
+        return dia, dia[:7]
+
+    def _acumular(self, instante: float, id_produto: int, quantidade: int, categoria: str) -> None:
+        posicao = 0 if quantidade >= 0 else 1
+        for escala, periodo in zip(('dia', 'mes'), self._periodos(instante)):
+            grupos = self.resumos[escala].get(periodo)
+            if grupos is None:
+                grupos = self.resumos[escala][periodo] = {'produtos': {}, 'categorias': {}}
+            for totais in (grupos['produtos'].setdefault(id_produto, [0, 0, 0]),
+                           grupos['categorias'].setdefault(categoria, [0, 0, 0])):
+                totais[posicao] += abs(quantidade)
+                totais[2] += 1
+
+    def atualizar(self) -> None:
+        """Acumula nos resumos os registros gravados depois da marca d'água (inclusive por outros processos).
+
+        Na primeira chamada, lê antes os resumos gravados.
+        """
+        if not self._resumos_carregados:
+            self._carregar_resumos()
+            self._resumos_carregados = True
+        try:
+            with open(self.caminho, 'rb') as f:
+                tamanho = os.fstat(f.fileno()).st_size
+                if tamanho < self.marca:  # O livro foi apagado ou substituído: refaz tudo.
+                    self.resumos, self.marca = {'dia': {}, 'mes': {}}, 0
+                f.seek(self.marca)
+                dados = f.read(tamanho - self.marca)
+        except FileNotFoundError:
+            return
+        dados = dados[:len(dados) - len(dados) % REGISTRO_MOVIMENTO.size]
+        # Os textos são gravados antes dos registros que os citam, então são lidos depois deles.
+        self._ler_textos()
+        for instante, id_produto, quantidade, categoria, _ in REGISTRO_MOVIMENTO.iter_unpack(dados):
+            self._acumular(instante, id_produto, quantidade, self._texto(categoria))
+        self.marca += len(dados)
+        self._nao_salvos += len(dados) // REGISTRO_MOVIMENTO.size
+
+    def _indice_texto(self, texto: str | None, novos: list[str]) -> int:
+        # Quebras de linha separam a tabela de textos: todo espaço vira um só; só espaços conta como ausente.
+        texto = ' '.join(texto.split()) if texto else ''
+        if not texto:
+            return 0
+        if texto not in self._indices_textos:
+            novos.append(texto)
+            self._indices_textos[texto] = len(self.textos) + 1
+            self.textos.append(texto)
+        return self._indices_textos[texto]
+
+    def registrar(self, movimentos: Iterable[tuple[int, int, str, str | None]], instante: float | None = None) -> None:
+        """Acrescenta ao livro movimentações confirmadas (ID, quantidade, categoria, motivo)."""
+        instante = time.time() if instante is None else instante
+        with self._trava:
+            if self._resumos_carregados:
+                self.atualizar()
+            else:
+                self._ler_textos()
+            novos: list[str] = []
+            registros = [(id_produto, quantidade, self._indice_texto(categoria, novos), self._indice_texto(motivo, novos))
+                         for id_produto, quantidade, categoria, motivo in movimentos]
+            if novos:
+                dados_textos = ''.join(f"{texto}\n" for texto in novos).encode('utf-8')
+                with open(self.caminho_textos, 'ab') as f:
+                    f.write(dados_textos)
+                self._posicao_textos += len(dados_textos)
+            with open(self.caminho, 'ab') as f:
+                # Um registro incompleto no fim (queda no meio de uma gravação) é descartado.
+                if (resto := f.tell() % REGISTRO_MOVIMENTO.size):
+                    f.truncate(f.tell() - resto)
+                    f.seek(0, os.SEEK_END)
+                f.write(b''.join(REGISTRO_MOVIMENTO.pack(instante, id_produto, quantidade, categoria, motivo)
+                                 for id_produto, quantidade, categoria, motivo in registros))
+            if self._resumos_carregados:
+                for id_produto, quantidade, categoria, _ in registros:
+                    self._acumular(instante, id_produto, quantidade, self._texto(categoria))
+                self.marca += len(registros) * REGISTRO_MOVIMENTO.size
+            self._nao_salvos += len(registros)
+            if self._nao_salvos >= INTERVALO_RESUMOS:
+                self.salvar()
+
+    def salvar(self) -> None:
+        """Grava os resumos e a marca d'água de forma atômica."""
+        with self._trava:
+            if not self._resumos_carregados:
+                self.atualizar()
+            dados = {'marca': self.marca, **self.resumos}
+            caminho_temp = self.caminho_resumos.with_name(f"{self.caminho_resumos.name}.{os.getpid()}.tmp")
+            # `json.dumps` usa o codificador em C; `json.dump` direto no arquivo seria bem mais lento.
+            caminho_temp.write_text(json.dumps(dados, ensure_ascii=False, separators=(',', ':')), encoding='utf-8')
+            os.replace(caminho_temp, self.caminho_resumos)
+            self._nao_salvos = 0
+
+    def fechar(self) -> None:
+        # Sem relatórios, os resumos nem foram lidos: a próxima leitura conta o que passou da marca.
+        if self._nao_salvos and self._resumos_carregados:
+            self.salvar()
+        self._trava.fechar()
+
+    def somar(self, inicio: date, fim: date, por: str = 'produtos') -> dict[Any, list[int]]:
+        """Soma [entradas, saídas, movimentações] de `inicio` a `fim` (inclusive), por produto ou categoria."""
+        self.atualizar()
+        totais: dict[Any, list[int]] = {}
+        dia = inicio
+        while dia <= fim:
+            proximo_mes = (dia.replace(day=28) + timedelta(days=4)).replace(day=1)
+            if dia.day == 1 and proximo_mes - timedelta(days=1) <= fim:
+                grupos, dia = self.resumos['mes'].get(dia.isoformat()[:7]), proximo_mes
+            else:
+                grupos, dia = self.resumos['dia'].get(dia.isoformat()), dia + timedelta(days=1)
+            for chave, (entradas, saidas, movimentacoes) in (grupos or {}).get(por, {}).items():
+                soma = totais.setdefault(chave, [0, 0, 0])
+                soma[0] += entradas
+                soma[1] += saidas
+                soma[2] += movimentacoes
+        return totais
+
+    def ler(self, id_produto: int | None = None, inicio: float | None = None,
+            fim: float | None = None) -> Iterator[dict[str, Any]]:
+        """Percorre o livro em ordem (instantes em segundos desde a época); útil para o histórico de um produto."""
+        try:
+            f = open(self.caminho, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            self._ler_textos()
+            while bloco := f.read(REGISTRO_MOVIMENTO.size * 65536):
+                bloco = bloco[:len(bloco) - len(bloco) % REGISTRO_MOVIMENTO.size]
+                for instante, id_p, quantidade, categoria, motivo in REGISTRO_MOVIMENTO.iter_unpack(bloco):
+                    if ((id_produto is None or id_p == id_produto) and (inicio is None or instante >= inicio)
+                            and (fim is None or instante < fim)):
+                        yield {'instante': instante, 'id': id_p, 'quantidade': quantidade,
+                               'categoria': self._texto(categoria),
+                               'motivo': self._texto(motivo) or None}
+
+# Métodos do GerenciadorEstoque e do mecanismo de persistência medidos quando as métricas estão ligadas.
+METODOS_INSTRUMENTADOS = (
+    '_carregar_dados', '_salvar_dados', 'sincronizar', 'adicionar_produto', 'buscar_produto',
+    'buscar_produtos_por_termo', 'consultar_produtos', 'listar_estoque_baixo', 'atualizar_produto',
+    'remover_produto', 'movimentar_estoque', 'movimentar_estoque_em_lote', 'adicionar_produtos_em_lote',
+    'obter_estatisticas', 'obter_estatisticas_por_categoria', 'obter_categorias', 'adicionar_categoria',
+    'relatorio_consumo', 'relatorio_giro',
+)
+METODOS_PERSISTENCIA_INSTRUMENTADOS = ('carregar', 'registrar', 'salvar', 'sincronizar')
+LIMITES_SEGUNDOS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+LIMITES_BYTES = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+
+class Histograma:
+    """Contagens acumuladas por faixa (no formato dos histogramas do Prometheus), soma e total."""
+    def __init__(self, limites: tuple[float, ...]):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float) -> None:
+        self.contagens[bisect.bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def quantil(self, q: float) -> float:
+        """Estimativa (limite superior da faixa) do quantil `q`."""
+        alvo = q * self.total
+        acumulado = 0
+        for limite, contagem in zip((*self.limites, math.inf), self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return limite
+        return math.inf
+
+class Metricas:
+    """Contadores, histogramas de latência e volume gravado do `GerenciadorEstoque`.
+
+    Só existe quando as métricas são ligadas (`metricas=True` ou `ESTOQUE_METRICAS=1`); nesse
+    caso o gerenciador troca os métodos medidos, na própria instância, por versões que chamam
+    `medir`. Desligadas, nada é envolvido e o custo é zero. `texto_prometheus` gera o formato
+    de exposição do Prometheus e `exportar` o grava em `arquivo` (`ESTOQUE_METRICAS_ARQUIVO`).
+    """
+    def __init__(self, arquivo: str | Path | None = None):
+        self.arquivo = Path(arquivo) if arquivo else None
+        self.latencias: dict[str, Histograma] = {}
+        self.erros: dict[str, int] = {}
+        self.bytes_gravados: dict[str, Histograma] = {}
+        self.medidores: dict[str, Any] = {}
+        self._trava = threading.Lock()
+
+    def medir(self, nome: str, funcao):
+        """Envolve `funcao`, registrando a latência de cada chamada (e as que terminam em exceção)."""
+        with self._trava:
+            histograma = self.latencias.setdefault(nome, Histograma(LIMITES_SEGUNDOS))
+
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            except BaseException:
+                with self._trava:
+                    self.erros[nome] = self.erros.get(nome, 0) + 1
+                raise
+            finally:
+                duracao = time.perf_counter() - inicio
+                with self._trava:
+                    histograma.observar(duracao)
+        return medida
+
+    def observar_bytes(self, nome: str, quantidade: int) -> None:
+        with self._trava:
+            self.bytes_gravados.setdefault(nome, Histograma(LIMITES_BYTES)).observar(quantidade)
+
+    def resumo(self) -> dict[str, dict[str, Any]]:
+        """Chamadas, erros, tempo total/médio e percentis estimados de cada operação medida."""
+        with self._trava:
+            return {nome: {'chamadas': h.total, 'erros': self.erros.get(nome, 0), 'tempo_total_s': h.soma,
+                           'tempo_medio_s': h.soma / h.total if h.total else 0.0,
+                           'p50_s': h.quantil(0.5), 'p99_s': h.quantil(0.99)}
+                    for nome, h in self.latencias.items() if h.total}
+
+    def texto_prometheus(self) -> str:
+        linhas = []
+        def histograma(metrica: str, ajuda: str, histogramas: dict[str, Histograma]) -> None:
+            linhas.extend([f"# HELP {metrica} {ajuda}", f"# TYPE {metrica} histogram"])
+            for nome, h in sorted(histogramas.items()):
+                acumulado = 0
+                for limite, contagem in zip((*h.limites, '+Inf'), h.contagens):
+                    acumulado += contagem
+                    linhas.append(f'{metrica}_bucket{{operacao="{nome}",le="{limite}"}} {acumulado}')
+                linhas.append(f'{metrica}_sum{{operacao="{nome}"}} {h.soma}')
+                linhas.append(f'{metrica}_count{{operacao="{nome}"}} {h.total}')
+        with self._trava:
+            histograma('estoque_operacao_segundos', "Latência das operações do estoque.", self.latencias)
+            linhas.extend(["# HELP estoque_operacao_erros_total Chamadas encerradas com exceção.",
+                           "# TYPE estoque_operacao_erros_total counter"])
+            linhas.extend(f'estoque_operacao_erros_total{{operacao="{nome}"}} {total}'
+                          for nome, total in sorted(self.erros.items()))
+            histograma('estoque_gravacao_bytes', "Bytes de cada operação gravada no diário.", self.bytes_gravados)
+            for nome, (tipo, ajuda, ler) in sorted(self.medidores.items()):
+                linhas.extend([f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}", f"{nome} {ler()}"])
+        return '\n'.join(linhas) + '\n'
+
+    def exportar(self, caminho: str | Path | None = None) -> None:
+        """Grava `texto_prometheus()` de forma atômica (útil para o textfile collector do node_exporter)."""
+        caminho = Path(caminho) if caminho else self.arquivo
+        if caminho is None:
+            raise ValueError("Nenhum arquivo de métricas informado.")
+        caminho_temp = caminho.with_name(caminho.name + '.tmp')
+        caminho_temp.write_text(self.texto_prometheus(), encoding='utf-8')
+        os.replace(caminho_temp, caminho)
+
+class GerenciadorEstoque:
+    """Classe responsável pela lógica de negócio e persistência dos dados.
+
+    A gravação fica a cargo de um mecanismo de `Persistencia`: por padrão o JSON com
+    diário (`PersistenciaJson`, com leitura incremental do snapshot se `ESTOQUE_JSON_INCREMENTAL=1`); arquivos `.bin` usam o snapshot binário (`PersistenciaBinaria`),
+    migrando o `.json` de mesmo nome na primeira carga, `.db`/`.sqlite` usam `PersistenciaSqlite` e
+    uma pasta (existente ou com `/` no fim) usa `PersistenciaFragmentada`, sob demanda com
+    `ESTOQUE_SOB_DEMANDA=1`. As movimentações confirmadas também vão para o `LivroMovimentos`
+    (`movimentos=False` desliga).
+    Com `gravacao_adiada` (segundos; ou `ESTOQUE_GRAVACAO_ADIADA`), o JSON e o binário gravam o
+    diário em segundo plano, agrupando as operações dessa janela (veja `PersistenciaJson`).
+    Com `busca_sob_demanda`, o índice de busca (metade do tempo de carga) só é montado na primeira busca.
+    """
+    def __init__(self, nome_arquivo: str | Path = 'estoque.json', estoque_minimo: int = 10,
+                 limite_diario: int = LIMITE_DIARIO_BYTES, depuracao: bool = False, colunar: bool = False,
+                 persistencia: Persistencia | None = None, metricas: bool = False,
+                 movimentos: bool = True, gravacao_adiada: float | None = None, busca_sob_demanda: bool = False):
+        if gravacao_adiada is None and os.environ.get('ESTOQUE_GRAVACAO_ADIADA'):
+            gravacao_adiada = float(os.environ['ESTOQUE_GRAVACAO_ADIADA'])
+        if persistencia is None:
+            sufixo = Path(nome_arquivo).suffix
+            if Path(nome_arquivo).is_dir() or str(nome_arquivo).endswith(('/', os.sep)):
+                persistencia = PersistenciaFragmentada(nome_arquivo, limite_diario, gravacao_adiada,
+                                                       sob_demanda=os.environ.get('ESTOQUE_SOB_DEMANDA') == '1')
+            elif sufixo in ('.db', '.sqlite', '.sqlite3'):
+                if gravacao_adiada is not None:
+                    raise ValueError("A gravação adiada não está disponível para o SQLite.")
+                if colunar:
+                    raise ValueError("O armazenamento colunar não está disponível para o SQLite.")
+                persistencia = PersistenciaSqlite(nome_arquivo)
+            elif sufixo == '.bin':
+                persistencia = PersistenciaBinaria(nome_arquivo, limite_diario, legado=Path(nome_arquivo).with_suffix('.json'),
+                                                   gravacao_adiada=gravacao_adiada)
+            else:
+                persistencia = PersistenciaJson(nome_arquivo, limite_diario, gravacao_adiada,
+                                                leitura_incremental=os.environ.get('ESTOQUE_JSON_INCREMENTAL') == '1')
+        elif colunar and not persistencia.carrega_tudo:
+            raise ValueError("O armazenamento colunar exige um mecanismo que carregue todos os produtos.")
+        self.persistencia = persistencia
+        self.caminho_arquivo = persistencia.caminho
+        self.depuracao = depuracao or os.environ.get('ESTOQUE_DEPURACAO') == '1'
+        self.colunar = colunar
+        self.busca_sob_demanda = busca_sob_demanda
+        self._estoque_minimo = estoque_minimo
+        self._pendentes: list[dict[str, Any]] | None = None
+        self._desfazer: list[dict[str, Any]] = []
+        self.livro = LivroMovimentos(self.caminho_arquivo) if movimentos else None
+        self.metricas: Metricas | None = None
+        arquivo_metricas = os.environ.get('ESTOQUE_METRICAS_ARQUIVO')
+        if metricas or arquivo_metricas or os.environ.get('ESTOQUE_METRICAS') == '1':
+            self._instrumentar(Metricas(arquivo_metricas))
+        self._fechado = False
+        self._perfil = None
+        if arquivo_perfil := os.environ.get('ESTOQUE_PROFILE'):
+            import cProfile
+            self._perfil = (cProfile.Profile(), arquivo_perfil)
+            self._perfil[0].enable()
+        self._reiniciar_estado()
+        inicio = time.perf_counter()
+        self._carregar_dados()
+        if self.metricas:
+            duracao = time.perf_counter() - inicio
+            self.metricas.medidores['estoque_carga_segundos'] = ('gauge', "Duração da carga inicial.", lambda: duracao)
+
+    def _instrumentar(self, metricas: Metricas) -> None:
+        """Liga as métricas trocando, nesta instância, os métodos medidos por versões instrumentadas."""
+        self.metricas = metricas
+        for nome in METODOS_INSTRUMENTADOS:
+            setattr(self, nome, metricas.medir(nome, getattr(self, nome)))
+        for nome in METODOS_PERSISTENCIA_INSTRUMENTADOS:
+            setattr(self.persistencia, nome, metricas.medir(f"persistencia.{nome}", getattr(self.persistencia, nome)))
+        registrar = self.persistencia.registrar
+
+        def registrar_medido(gerenciador: 'GerenciadorEstoque', registro: dict[str, Any]) -> None:
+            registrar(gerenciador, registro)
+            if self.persistencia.tamanho_ultimo_registro is not None:
+                metricas.observar_bytes('persistencia.registrar', self.persistencia.tamanho_ultimo_registro)
+        self.persistencia.registrar = registrar_medido
+        metricas.medidores.update({
+            'estoque_produtos': ('gauge', "Produtos cadastrados.", lambda: len(self.produtos)),
+            'estoque_seq': ('gauge', "Número da última operação gravada.", lambda: self.seq),
+            'estoque_bytes_gravados_total': ('counter', "Bytes gravados em disco (diário e snapshots).",
+                                             lambda: self.persistencia.bytes_gravados),
+        })
+
+    def _reiniciar_estado(self) -> None:
+        """Cria o estado em memória vazio (produtos, categorias e índices), antes de uma carga completa."""
+        self.produtos: dict[int, Produto] | ArmazemColunar = ArmazemColunar() if self.colunar else {}
         self.categorias: set[str] = set()
         self.proximo_id: int = 1
-        self._carregar_dados()
+        self.seq: int = 0
+        self._estatisticas = EstatisticasEstoque(self._estoque_minimo)
+        self._busca: IndiceBusca | None = None if self.busca_sob_demanda else IndiceBusca()
+        # No modo colunar, as listagens filtram direto as colunas em vez de manter índices ordenados.
+        self._indices_ordenados = {} if self.colunar else {campo: IndiceOrdenado(campo) for campo in CAMPOS_ORDENACAO}
+        # Estruturas atualizadas a cada alteração; um mecanismo que não carrega tudo consulta o próprio banco.
+        self._indices: list[Any] = []
+        if self.persistencia.carrega_tudo:
+            self._indices = [self._estatisticas, *self._indices_ordenados.values()]
+            if self._busca is not None:
+                self._indices.insert(0, self._busca)
+        self._indices.extend(self.persistencia.observadores())
+
+    @property
+    def _indice_busca(self) -> IndiceBusca:
+        """O índice de busca; com `busca_sob_demanda`, é montado no primeiro uso a partir dos produtos em memória."""
+        if self._busca is None:
+            self._busca = IndiceBusca()
+            for produto in self.produtos.values():
+                self._busca.adicionar(produto)
+            self._indices.append(self._busca)
+        return self._busca
+
+    @property
+    def estoque_minimo(self) -> int:
+        return self._estoque_minimo
+
+    @estoque_minimo.setter
+    def estoque_minimo(self, valor: int) -> None:
+        """Alterar o estoque mínimo muda quais produtos contam como baixo estoque, então recontamos."""
+        self._estoque_minimo = valor
+        self._estatisticas.estoque_minimo = valor
+        if self.persistencia.carrega_tudo:
+            recontagem = self._recontar_estatisticas()
+            self._estatisticas.gerais, self._estatisticas.por_categoria = recontagem.gerais, recontagem.por_categoria
+
+    def _recontar_estatisticas(self) -> EstatisticasEstoque:
+        """Recalcula as estatísticas com uma passada completa (direto das colunas no modo colunar)."""
+        if not self.persistencia.carrega_tudo:
+            return self.persistencia.estatisticas(self.estoque_minimo, recontar=True)
+        self.persistencia.garantir(self)
+        if isinstance(self.produtos, ArmazemColunar):
+            return self.produtos.recontar(self.estoque_minimo)
+        recontagem = EstatisticasEstoque(self.estoque_minimo)
+        recontagem.recalcular(self.produtos.values())
+        return recontagem
 
     def _carregar_dados(self) -> None:
-        """Carrega os dados do arquivo JSON, garantindo compatibilidade com versões antigas."""
-        if not self.caminho_arquivo.exists():
-            self.categorias.update(CATEGORIAS_PADRAO)
+        """Carrega os dados pelo mecanismo de persistência configurado."""
+        self.persistencia.carregar(self)
+
+    def _inserir_produto(self, produto: Produto) -> None:
+        """Insere um produto na memória e nos índices."""
+        self.produtos[produto.id] = produto
+        for indice in self._indices:
+            indice.adicionar(produto)
+
+    def _inserir_produtos(self, produtos: list[Produto]) -> None:
+        """Insere vários produtos na memória e nos índices (de uma vez nos que têm `adicionar_varios`)."""
+        for produto in produtos:
+            self.produtos[produto.id] = produto
+        for indice in self._indices:
+            if adicionar_varios := getattr(indice, 'adicionar_varios', None):
+                adicionar_varios(produtos)
+            else:
+                for produto in produtos:
+                    indice.adicionar(produto)
+
+    def _retirar_produto(self, id_produto: int) -> None:
+        """Remove um produto da memória e dos índices."""
+        produto = self.produtos.pop(id_produto)
+        for indice in self._indices:
+            indice.remover(produto)
+
+    def _alterar_produto(self, produto: Produto, campos: dict[str, Any]) -> None:
+        """Altera campos de um produto, atualizando só os índices que dependem deles."""
+        afetados = [indice for indice in self._indices if not indice.campos.isdisjoint(campos)]
+        for indice in afetados:
+            indice.remover(produto)
+        for campo, valor in campos.items():
+            setattr(produto, campo, valor)
+        for indice in afetados:
+            indice.adicionar(produto)
+
+    def _aplicar_registro(self, registro: dict[str, Any]) -> None:
+        """Aplica em memória uma operação no formato em que ela é gravada no diário."""
+        match registro['op']:
+            case 'adicionar':
+                dados_p = registro['produto']
+                self._inserir_produto(Produto(**dados_p))
+                self.proximo_id = max(self.proximo_id, dados_p['id'] + 1)
+            case 'movimentar':
+                produto = self.produtos[registro['id']]
+                self._alterar_produto(produto, {'quantidade': produto.quantidade + registro['quantidade']})
+            case 'atualizar':
+                self._alterar_produto(self.produtos[registro['id']], registro['campos'])
+            case 'remover':
+                self._retirar_produto(registro['id'])
+            case 'categoria':
+                self.categorias.add(registro['categoria'])
+            case 'remover_categoria':
+                self.categorias.discard(registro['categoria'])
+            case 'lote':
+                # Inclusões seguidas (como as de uma importação) entram nos índices de uma vez.
+                for adicao, operacoes in itertools.groupby(registro['ops'], key=lambda operacao: operacao['op'] == 'adicionar'):
+                    if adicao:
+                        novos = [Produto(**operacao['produto']) for operacao in operacoes]
+                        self._inserir_produtos(novos)
+                        self.proximo_id = max(self.proximo_id, max(produto.id for produto in novos) + 1)
+                    else:
+                        for operacao in operacoes:
+                            self._aplicar_registro(operacao)
+
+    def _registro_inverso(self, registro: dict[str, Any]) -> dict[str, Any]:
+        """Monta a operação que desfaz `registro`, usada no rollback de transações."""
+        match registro['op']:
+            case 'adicionar':
+                return {'op': 'remover', 'id': registro['produto']['id']}
+            case 'movimentar':
+                return {'op': 'movimentar', 'id': registro['id'], 'quantidade': -registro['quantidade']}
+            case 'atualizar':
+                produto = self.produtos[registro['id']]
+                return {'op': 'atualizar', 'id': registro['id'],
+                        'campos': {campo: getattr(produto, campo) for campo in registro['campos']}}
+            case 'remover':
+                return {'op': 'adicionar', 'produto': produto_para_dict(self.produtos[registro['id']])}
+            case 'categoria':
+                return {'op': 'remover_categoria', 'categoria': registro['categoria']}
+        raise ValueError(f"Operação desconhecida: {registro['op']}")
+
+    @contextmanager
+    def transacao(self) -> Iterator[None]:
+        """Agrupa operações: elas são aplicadas em memória e persistidas uma única vez ao final.
+
+        Se qualquer operação (ou a gravação) falhar, todas as alterações feitas dentro do
+        bloco são desfeitas. Transações aninhadas participam da transação externa. A transação
+        externa tem acesso exclusivo aos arquivos e começa com as alterações de outros processos já aplicadas.
+        """
+        if self._pendentes is not None:
+            yield
             return
-        try:
-            dados = json.loads(self.caminho_arquivo.read_text(encoding='utf-8'))
-            self.proximo_id = dados.get('proximo_id', 1)
-            categorias_salvas = dados.get('categorias', [])
-            self.categorias = set(categorias_salvas if categorias_salvas else CATEGORIAS_PADRAO)
-            produtos_carregados = dados.get('produtos', {})
-            for id_p, dados_p in produtos_carregados.items():
-                dados_p.setdefault('descricao', 'Sem descrição')
-                self.produtos[int(id_p)] = Produto(**dados_p)
-        except (json.JSONDecodeError, IOError):
-            print(f"{Cores.WARNING}Aviso: Arquivo '{self.caminho_arquivo}' corrompido. Começando com dados limpos.{Cores.ENDC}")
-            self.categorias.update(CATEGORIAS_PADRAO)
+        with self.persistencia.exclusivo(self):
+            self._pendentes, self._desfazer = [], []
+            proximo_id, seq = self.proximo_id, self.seq
+            try:
+                yield
+                movimentos = [registro for registro in self._pendentes if registro['op'] == 'movimentar']
+                if len(self._pendentes) == 1:
+                    self._registrar_operacao(self._pendentes[0])
+                elif self._pendentes:
+                    self._registrar_operacao({'op': 'lote', 'ops': self._pendentes})
+            except BaseException:
+                for inverso in reversed(self._desfazer):
+                    self._aplicar_registro(inverso)
+                # Uma gravação que falhou não pode deixar um buraco na numeração do diário.
+                self.proximo_id, self.seq = proximo_id, seq
+                raise
+            finally:
+                self._pendentes, self._desfazer = None, []
+            if movimentos and self.livro:
+                self.livro.registrar((registro['id'], registro['quantidade'],
+                                      produto.categoria if (produto := self.produtos.get(registro['id'])) else '',
+                                      registro.get('motivo')) for registro in movimentos)
 
-    def _salvar_dados(self) -> None:
-        """Salva o estado atual da memória no arquivo JSON."""
-        dados_para_salvar = {
+    def _executar(self, registro: dict[str, Any]) -> None:
+        """Aplica uma operação em memória e a persiste no diário (ao fim da transação corrente)."""
+        with self.transacao():
+            self._desfazer.append(self._registro_inverso(registro))
+            self._aplicar_registro(registro)
+            self._pendentes.append(registro)
+
+    def _executar_varios(self, registros: list[dict[str, Any]]) -> None:
+        """Como `_executar`, para operações independentes entre si (sobre produtos distintos), aplicadas de uma vez."""
+        with self.transacao():
+            self._desfazer.extend(self._registro_inverso(registro) for registro in registros)
+            self._aplicar_registro({'op': 'lote', 'ops': registros})
+            self._pendentes.extend(registros)
+
+    def _registrar_operacao(self, registro: dict[str, Any]) -> None:
+        """Numera a operação confirmada e a entrega ao mecanismo de persistência."""
+        self.seq += 1
+        self.persistencia.registrar(self, {'seq': self.seq, **registro})
+
+    def _exportar_estado(self) -> dict[str, Any]:
+        """Retorna uma cópia serializável do estado atual."""
+        self.persistencia.garantir(self)
+        return {
+            'seq': self.seq,
             'proximo_id': self.proximo_id,
             'categorias': sorted(list(self.categorias)),
-            'produtos': {p_id: asdict(produto) for p_id, produto in self.produtos.items()}
+            'produtos': {p_id: produto_para_dict(produto) for p_id, produto in self.produtos.items()}
         }
-        json_string = json.dumps(dados_para_salvar, indent=4, ensure_ascii=False)
-        self.caminho_arquivo.write_text(json_string, encoding='utf-8')
+
+    def _salvar_dados(self) -> None:
+        """Grava de forma síncrona o estado completo pelo mecanismo de persistência."""
+        self.persistencia.salvar(self)
+
+    def sincronizar(self) -> None:
+        """Traz para a memória as alterações gravadas por outros processos (as transações já fazem isso)."""
+        self.persistencia.sincronizar(self)
+
+    def fechar(self) -> None:
+        """Conclui gravações pendentes e libera os arquivos abertos (e grava métricas e perfil, se ligados).
+
+        Chamadas repetidas não fazem nada: o que havia para gravar já foi gravado na primeira.
+        """
+        if self._fechado:
+            return
+        self._fechado = True
+        if self.persistencia.salvar_ao_fechar:
+            self._salvar_dados()
+        self.persistencia.fechar()
+        if self.livro:
+            self.livro.fechar()
+        if self.metricas and self.metricas.arquivo:
+            self.metricas.exportar()
+        if self._perfil:
+            perfil, arquivo_perfil = self._perfil
+            perfil.disable()
+            perfil.dump_stats(arquivo_perfil)
+            self._perfil = None
 
     def adicionar_produto(self, nome: str, categoria: str, descricao: str, quantidade: int, preco: float) -> Produto:
         """Adiciona um novo produto ao estoque."""
-        id_novo = self.proximo_id
-        produto_novo = Produto(id=id_novo, nome=nome, categoria=categoria, descricao=descricao, quantidade=quantidade, preco=preco)
-        self.produtos[id_novo] = produto_novo
-        self.proximo_id += 1
-        self._salvar_dados()
-        return produto_novo
+        with self.transacao():
+            self.persistencia.garantir(self, categoria)
+            id_novo = self.proximo_id
+            self._executar({'op': 'adicionar', 'produto': {
+                'id': id_novo, 'nome': nome, 'categoria': categoria,
+                'descricao': descricao, 'quantidade': quantidade, 'preco': preco
+            }})
+            return self.produtos[id_novo]
 
     def buscar_produto(self, id_produto: int) -> Produto | None:
         """Busca um produto pelo seu ID."""
-        return self.produtos.get(id_produto)
+        produto = self.produtos.get(id_produto)
+        if produto is None:  # Pode estar em um fragmento ainda não carregado.
+            self.persistencia.garantir(self)
+            produto = self.produtos.get(id_produto)
+        return produto
 
-    def buscar_produtos_por_termo(self, termo: str) -> list[Produto]:
-        """Busca produtos por ID (exato), nome ou categoria (parcial e case-insensitive)."""
-        termo_lower = termo.lower()
-        resultados = []
-        for produto in self.produtos.values():
-            if produto in resultados:
-                continue
-            if termo == str(produto.id) or \
-               termo_lower in produto.nome.lower() or \
-               termo_lower in produto.categoria.lower():
-                resultados.append(produto)
-        return resultados
+    def buscar_produtos_por_termo(self, termo: str, limite: int | None = None) -> list[Produto]:
+        """Busca produtos por ID (exato), nome ou categoria (parcial, sem diferenciar maiúsculas nem acentos).
+
+        Os resultados vêm ordenados por relevância (ID exato, nome igual, nome começando
+        com o termo, ..., apenas a categoria) e depois por nome; `limite` corta a lista.
+        """
+        if not self.persistencia.carrega_tudo:
+            return [self.produtos[id_p] for id_p in self.persistencia.buscar(termo, limite)]
+        self.persistencia.garantir(self)
+        encontrados = self._indice_busca.buscar(termo, limite)
+        # isascii: `isdigit` também aceita dígitos como '²', que `int` recusa.
+        if termo.isascii() and termo.isdigit() and str(int(termo)) == termo and int(termo) in self.produtos:
+            encontrados[int(termo)] = (0, '')
+        chaves = ((relevancia, nome, id_p) for id_p, (relevancia, nome) in encontrados.items())
+        ordenados = sorted(chaves) if limite is None else heapq.nsmallest(limite, chaves)
+        return [self.produtos[id_p] for _, _, id_p in ordenados]
+
+    def consultar_produtos(self, categoria: str | None = None,
+                           preco_min: float | None = None, preco_max: float | None = None,
+                           quantidade_min: int | None = None, quantidade_max: int | None = None,
+                           ordenar_por: str = 'nome', decrescente: bool = False,
+                           deslocamento: int = 0, limite: int | None = None) -> list[Produto]:
+        """Lista produtos filtrando por categoria e por faixas de preço/quantidade (inclusive).
+
+        Usa os índices ordenados: se o índice do campo de ordenação for a fonte mais
+        seletiva, ele é percorrido em ordem e a leitura para em `deslocamento + limite`;
+        senão, parte do filtro mais seletivo e ordena apenas os candidatos.
+        """
+        if ordenar_por not in CAMPOS_ORDENACAO:
+            raise ValueError(f"Não é possível ordenar por '{ordenar_por}'.")
+        faixas = {'nome': (None, None), 'preco': (preco_min, preco_max), 'quantidade': (quantidade_min, quantidade_max)}
+        fim = None if limite is None else deslocamento + limite
+        if not self.persistencia.carrega_tudo:
+            return [self.produtos[id_p] for id_p in self.persistencia.consultar(
+                categoria, faixas, ordenar_por, decrescente, deslocamento, limite)]
+        self.persistencia.garantir(self, categoria)
+        if isinstance(self.produtos, ArmazemColunar):
+            candidatos = [self.produtos[id_p] for id_p in self.produtos.filtrar(categoria, faixas)]
+            candidatos.sort(key=lambda p: (getattr(p, ordenar_por), p.id), reverse=decrescente)
+            return candidatos[deslocamento:fim]
+
+        def atende(produto: Produto) -> bool:
+            if categoria is not None and produto.categoria != categoria:
+                return False
+            return all((minimo is None or getattr(produto, campo) >= minimo) and
+                       (maximo is None or getattr(produto, campo) <= maximo)
+                       for campo, (minimo, maximo) in faixas.items())
+
+        fontes: list[tuple[int, Iterable[int]]] = []
+        if categoria is not None:
+            ids_categoria = self._indice_busca.ids_da_categoria(categoria)
+            fontes.append((len(ids_categoria), ids_categoria))
+        for campo, (minimo, maximo) in faixas.items():
+            if campo != ordenar_por and (minimo is not None or maximo is not None):
+                indice = self._indices_ordenados[campo]
+                fontes.append((indice.contar(minimo, maximo), indice.intervalo(minimo, maximo)))
+        indice_ordem = self._indices_ordenados[ordenar_por]
+        minimo_ordem, maximo_ordem = faixas[ordenar_por]
+        if not fontes or indice_ordem.contar(minimo_ordem, maximo_ordem) <= min(tamanho for tamanho, _ in fontes):
+            if not fontes:  # Sem outros filtros, a página sai direto da sua posição no índice.
+                ids = indice_ordem.intervalo(minimo_ordem, maximo_ordem, decrescente, deslocamento)
+                return [self.produtos[id_p] for id_p in itertools.islice(ids, limite)]
+            produtos = (self.produtos[id_p] for id_p in indice_ordem.intervalo(minimo_ordem, maximo_ordem, decrescente))
+            return list(itertools.islice(filter(atende, produtos), deslocamento, fim))
+        _, menor_fonte = min(fontes, key=lambda fonte: fonte[0])
+        candidatos = [p for p in (self.produtos[id_p] for id_p in menor_fonte) if atende(p)]
+        candidatos.sort(key=lambda p: (getattr(p, ordenar_por), p.id), reverse=decrescente)
+        return candidatos[deslocamento:fim]
+
+    def listar_estoque_baixo(self, deslocamento: int = 0, limite: int | None = None) -> list[Produto]:
+        """Lista, por nome, os produtos com quantidade abaixo do estoque mínimo."""
+        return self.consultar_produtos(quantidade_max=self.estoque_minimo - 1,
+                                       deslocamento=deslocamento, limite=limite)
 
     def atualizar_produto(self, id_produto: int, nome: str | None, categoria: str | None, descricao: str | None) -> Produto | None:
         """Atualiza os dados de um produto existente."""
-        produto = self.buscar_produto(id_produto)
-        if not produto: return None
-        if nome: produto.nome = nome
-        if categoria: produto.categoria = categoria
-        if descricao: produto.descricao = descricao
-        self._salvar_dados()
-        return produto
+        with self.transacao():
+            produto = self.buscar_produto(id_produto)
+            if not produto: return None
+            campos = {campo: valor for campo, valor in
+                      (('nome', nome), ('categoria', categoria), ('descricao', descricao)) if valor}
+            if 'categoria' in campos:  # Os dois fragmentos (origem e destino) precisam estar carregados.
+                self.persistencia.garantir(self, campos['categoria'])
+            if campos:
+                self._executar({'op': 'atualizar', 'id': id_produto, 'campos': campos})
+            return produto
 
     def remover_produto(self, id_produto: int) -> bool:
         """Remove um produto do estoque."""
-        if id_produto in self.produtos:
-            del self.produtos[id_produto]
-            self._salvar_dados()
-            return True
-        return False
+        with self.transacao():
+            if self.buscar_produto(id_produto):
+                self._executar({'op': 'remover', 'id': id_produto})
+                return True
+            return False
 
-    def movimentar_estoque(self, id_produto: int, quantidade: int) -> Produto | None:
-        """Adiciona ou remove uma quantidade do estoque de um produto."""
-        produto = self.buscar_produto(id_produto)
-        if not produto: return None
-        if produto.quantidade + quantidade < 0:
-            raise ValueError("Quantidade de saída maior que o estoque disponível.")
-        produto.quantidade += quantidade
-        self._salvar_dados()
-        return produto
+    def movimentar_estoque(self, id_produto: int, quantidade: int, motivo: str | None = None) -> Produto | None:
+        """Adiciona ou remove uma quantidade do estoque de um produto, registrando-a no livro de movimentações."""
+        _validar_motivo(motivo)
+        with self.transacao():
+            produto = self.buscar_produto(id_produto)
+            if not produto: return None
+            if produto.quantidade + quantidade < 0:
+                raise ValueError("Quantidade de saída maior que o estoque disponível.")
+            registro = {'op': 'movimentar', 'id': id_produto, 'quantidade': quantidade}
+            if motivo:
+                registro['motivo'] = motivo
+            self._executar(registro)
+            return produto
+
+    def movimentar_estoque_em_lote(self, movimentos: Iterable[tuple[int, int]], motivo: str | None = None) -> list[Produto]:
+        """Aplica várias movimentações (id, quantidade) de forma atômica, com uma única gravação.
+
+        Todas as movimentações são validadas antes de qualquer alteração; se alguma for
+        inválida, um ValueError é lançado e nada é aplicado. `motivo` vale para todas.
+        """
+        movimentos = list(movimentos)
+        _validar_motivo(motivo)
+        with self.transacao():
+            saldos: dict[int, int] = {}
+            for id_produto, quantidade in movimentos:
+                produto = self.buscar_produto(id_produto)
+                if not produto:
+                    raise ValueError(f"Produto com ID {id_produto} não encontrado.")
+                saldo = saldos.get(id_produto, produto.quantidade) + quantidade
+                if saldo < 0:
+                    raise ValueError(f"Quantidade de saída maior que o estoque disponível (ID {id_produto}).")
+                saldos[id_produto] = saldo
+            return [self.movimentar_estoque(id_produto, quantidade, motivo) for id_produto, quantidade in movimentos]
+
+    def adicionar_produtos_em_lote(self, produtos: Iterable[dict[str, Any]]) -> list[Produto]:
+        """Adiciona vários produtos de forma atômica, com uma única gravação.
+
+        Cada item é um dicionário com `nome`, `categoria`, `descricao`, `quantidade` e `preco`.
+        Categorias inexistentes são criadas. Se algum item for inválido, nada é aplicado.
+        """
+        produtos = list(produtos)
+        for posicao, dados_p in enumerate(produtos, 1):
+            if not isinstance(dados_p.get('nome'), str) or not dados_p['nome'].strip():
+                raise ValueError(f"Item {posicao}: o nome deve ser um texto não vazio.")
+            if not isinstance(dados_p.get('categoria'), str) or not dados_p['categoria'].strip():
+                raise ValueError(f"Item {posicao}: a categoria deve ser um texto não vazio.")
+            if dados_p.get('descricao') is not None and not isinstance(dados_p['descricao'], str):
+                raise ValueError(f"Item {posicao}: a descrição deve ser um texto.")
+            # bool é subclasse de int, mas `true` não é uma quantidade nem um preço.
+            quantidade, preco = dados_p.get('quantidade'), dados_p.get('preco')
+            if not isinstance(quantidade, int) or isinstance(quantidade, bool) or quantidade < 0:
+                raise ValueError(f"Item {posicao}: a quantidade deve ser um inteiro zero ou positivo.")
+            if not isinstance(preco, (int, float)) or isinstance(preco, bool) or preco < 0:
+                raise ValueError(f"Item {posicao}: o preço deve ser um número positivo.")
+        with self.transacao():
+            for categoria in dict.fromkeys(dados_p['categoria'].strip() for dados_p in produtos):
+                self.adicionar_categoria(categoria)
+                self.persistencia.garantir(self, categoria)
+            registros = [{'op': 'adicionar', 'produto': {
+                'id': self.proximo_id + posicao, 'nome': dados_p['nome'].strip(), 'categoria': dados_p['categoria'].strip(),
+                'descricao': (dados_p.get('descricao') or '').strip() or 'Sem descrição', 'quantidade': dados_p['quantidade'],
+                'preco': float(dados_p['preco'])}} for posicao, dados_p in enumerate(produtos)]
+            if registros:
+                self._executar_varios(registros)
+            return [self.produtos[registro['produto']['id']] for registro in registros]
 
     def obter_estatisticas(self) -> dict[str, Any]:
-        """Calcula as estatísticas gerais do estoque."""
-        total_produtos = len(self.produtos)
-        if total_produtos == 0:
-            return {'total_produtos': 0, 'total_itens': 0, 'baixo_estoque': 0, 'valor_total': 0.0}
-        produtos_lista = self.produtos.values()
-        return {
-            'total_produtos': total_produtos,
-            'total_itens': sum(p.quantidade for p in produtos_lista),
-            'baixo_estoque': sum(1 for p in produtos_lista if p.quantidade < self.estoque_minimo),
-            'valor_total': sum(p.quantidade * p.preco for p in produtos_lista)
-        }
-    
+        """Retorna as estatísticas gerais do estoque (O(1), a partir dos agregados mantidos)."""
+        estatisticas = self._estatisticas
+        if not self.persistencia.carrega_tudo:
+            estatisticas = self.persistencia.estatisticas(self.estoque_minimo)
+        if self.depuracao:
+            estatisticas.conferir(self._recontar_estatisticas())
+        return dict(estatisticas.gerais)
+
+    def obter_estatisticas_por_categoria(self) -> dict[str, dict[str, Any]]:
+        """Retorna as mesmas estatísticas de `obter_estatisticas`, separadas por categoria."""
+        estatisticas = self._estatisticas
+        if not self.persistencia.carrega_tudo:
+            estatisticas = self.persistencia.estatisticas(self.estoque_minimo)
+        if self.depuracao:
+            estatisticas.conferir(self._recontar_estatisticas())
+        return {categoria: dict(valores) for categoria, valores in sorted(estatisticas.por_categoria.items())}
+
+    def _movimentos_por(self, inicio: date, fim: date, por: str) -> tuple[dict[Any, list[int]], Any]:
+        """Totais do livro no período e uma função que descreve cada chave (produto ou categoria) com o estoque atual."""
+        if self.livro is None:
+            raise ValueError("O livro de movimentações está desligado.")
+        if por not in ('produto', 'categoria'):
+            raise ValueError("Agrupamento inválido: use 'produto' ou 'categoria'.")
+        if fim < inicio:
+            raise ValueError("A data final é anterior à inicial.")
+        if por == 'categoria':
+            por_categoria = self.obter_estatisticas_por_categoria()
+            def descrever(categoria: str) -> dict[str, Any]:
+                return {'categoria': categoria, 'quantidade': por_categoria.get(categoria, {}).get('total_itens', 0)}
+            return self.livro.somar(inicio, fim, 'categorias'), descrever
+
+        def descrever(id_produto: int) -> dict[str, Any]:
+            produto = self.buscar_produto(id_produto)
+            if not produto:
+                return {'id': id_produto, 'nome': "(removido)", 'categoria': '', 'quantidade': 0}
+            return {'id': id_produto, 'nome': produto.nome, 'categoria': produto.categoria, 'quantidade': produto.quantidade}
+        return self.livro.somar(inicio, fim, 'produtos'), descrever
+
+    def relatorio_consumo(self, inicio: date, fim: date | None = None, por: str = 'produto') -> list[dict[str, Any]]:
+        """Entradas, saídas e consumo médio diário de `inicio` a `fim` (padrão: hoje), por produto ou categoria.
+
+        Lê apenas os resumos do livro de movimentações. `dias_cobertura` estima quantos dias o
+        estoque atual dura no ritmo de saídas do período. Ordenado pelas maiores saídas.
+        """
+        fim = fim or date.today()
+        totais, descrever = self._movimentos_por(inicio, fim, por)
+        dias = (fim - inicio).days + 1
+        linhas = []
+        for chave, (entradas, saidas, movimentacoes) in totais.items():
+            linha = descrever(chave)
+            consumo_diario = saidas / dias
+            linha.update({'entradas': entradas, 'saidas': saidas, 'movimentacoes': movimentacoes,
+                          'consumo_diario': consumo_diario,
+                          'dias_cobertura': linha['quantidade'] / consumo_diario if consumo_diario else None})
+            linhas.append(linha)
+        return sorted(linhas, key=lambda linha: -linha['saidas'])
+
+    def relatorio_giro(self, inicio: date, fim: date | None = None, por: str = 'produto') -> list[dict[str, Any]]:
+        """Giro de estoque de `inicio` a `fim` (padrão: hoje): saídas divididas pelo estoque médio do período.
+
+        Os estoques no início e no fim do período são reconstruídos a partir do estoque atual e
+        dos resumos do livro (cadastros, remoções e importações não são movimentações e não
+        entram na conta). Ordenado pelo maior giro; sem estoque médio, o giro é None.
+        """
+        hoje = date.today()
+        fim = fim or hoje
+        totais, descrever = self._movimentos_por(inicio, fim, por)
+        posteriores = self.livro.somar(fim + timedelta(days=1), hoje, 'produtos' if por == 'produto' else 'categorias')
+        linhas = []
+        for chave, (entradas, saidas, movimentacoes) in totais.items():
+            linha = descrever(chave)
+            entradas_depois, saidas_depois, _ = posteriores.get(chave, (0, 0, 0))
+            estoque_final = linha['quantidade'] - entradas_depois + saidas_depois
+            estoque_inicial = estoque_final - entradas + saidas
+            estoque_medio = (estoque_inicial + estoque_final) / 2
+            linha.update({'entradas': entradas, 'saidas': saidas, 'movimentacoes': movimentacoes,
+                          'estoque_inicial': estoque_inicial, 'estoque_final': estoque_final,
+                          'estoque_medio': estoque_medio, 'giro': saidas / estoque_medio if estoque_medio > 0 else None})
+            linhas.append(linha)
+        return sorted(linhas, key=lambda linha: (linha['giro'] is None, -(linha['giro'] or 0)))
+
     def obter_categorias(self) -> list[str]:
         """Retorna uma lista ordenada de todas as categorias."""
         return sorted(list(self.categorias))
 
     def adicionar_categoria(self, nova_categoria: str) -> None:
         """Adiciona uma nova categoria à lista."""
-        self.categorias.add(nova_categoria.strip())
-        self._salvar_dados()
+        categoria = nova_categoria.strip()
+        with self.transacao():
+            if categoria not in self.categorias:
+                self._executar({'op': 'categoria', 'categoria': categoria})
 
 
 class InterfaceUsuario:
@@ -235,28 +3189,38 @@ class InterfaceUsuario:
         self._pressione_enter_para_continuar()
 
     def _selecionar_produto(self, titulo: str) -> Produto | None:
-        self._limpar_tela()
-        print(f"{Cores.HEADER}{titulo}{Cores.ENDC}")
-        if not self.gerenciador.produtos:
+        total = len(self.gerenciador.produtos)
+        if not total:
+            self._limpar_tela()
+            print(f"{Cores.HEADER}{titulo}{Cores.ENDC}")
             self.exibir_aviso("Nenhum produto cadastrado.")
             self._pressione_enter_para_continuar()
             return None
-        print(f"{Cores.BOLD}{'ID':<5}{'Nome':<30}{'Qtd':>5}{Cores.ENDC}")
-        print("-" * 42)
-        produtos_ordenados = sorted(self.gerenciador.produtos.values(), key=lambda p: p.nome)
-        for produto in produtos_ordenados:
-            cor_qtd = Cores.WARNING if produto.quantidade < self.gerenciador.estoque_minimo else ""
-            print(f"{produto.id:<5}{produto.nome:<30}{cor_qtd}{produto.quantidade:>5}{Cores.ENDC}")
-        print("-" * 42)
+        paginas = math.ceil(total / TAMANHO_PAGINA)
+        pagina = 0
         while True:
-            id_str = self._ler_texto("Digite o ID do produto (ou 'cancelar'): ")
-            if id_str.lower() == 'cancelar': return None
-            try:
-                produto = self.gerenciador.buscar_produto(int(id_str))
-                if produto: return produto
-                self.exibir_erro("ID não encontrado.")
-            except ValueError:
-                self.exibir_erro("ID inválido.")
+            self._limpar_tela()
+            print(f"{Cores.HEADER}{titulo}{Cores.ENDC}")
+            print(f"{Cores.BOLD}{'ID':<5}{'Nome':<30}{'Qtd':>5}{Cores.ENDC}")
+            print("-" * 42)
+            for produto in self.gerenciador.consultar_produtos(deslocamento=pagina * TAMANHO_PAGINA, limite=TAMANHO_PAGINA):
+                cor_qtd = Cores.WARNING if produto.quantidade < self.gerenciador.estoque_minimo else ""
+                print(f"{produto.id:<5}{produto.nome:<30}{cor_qtd}{produto.quantidade:>5}{Cores.ENDC}")
+            print("-" * 42)
+            if paginas > 1:
+                print(f"Página {pagina + 1} de {paginas} ('>' próxima, '<' anterior)")
+            while True:
+                id_str = self._ler_texto("Digite o ID do produto (ou 'cancelar'): ")
+                if id_str.lower() == 'cancelar': return None
+                if id_str in ('>', '<') and paginas > 1:
+                    pagina = (pagina + (1 if id_str == '>' else -1)) % paginas
+                    break
+                try:
+                    produto = self.gerenciador.buscar_produto(int(id_str))
+                    if produto: return produto
+                    self.exibir_erro("ID não encontrado.")
+                except ValueError:
+                    self.exibir_erro("ID inválido.")
 
     def editar_produto(self):
         produto = self._selecionar_produto("--- Editar Produto ---")
@@ -289,14 +3253,15 @@ class InterfaceUsuario:
             self.exibir_erro("Opção inválida."); self._pressione_enter_para_continuar()
             return
         qtd = self._ler_inteiro_positivo("Digite a quantidade: ")
+        motivo = self._ler_texto("Motivo (opcional, ex.: venda, compra, avaria): ", permitir_vazio=True)
         try:
-            self.gerenciador.movimentar_estoque(produto.id, qtd if tipo_mov == 'E' else -qtd)
+            self.gerenciador.movimentar_estoque(produto.id, qtd if tipo_mov == 'E' else -qtd, motivo or None)
             self.exibir_sucesso(f"{'Entrada' if tipo_mov == 'E' else 'Saída'} registrada.")
         except ValueError as e:
             self.exibir_erro(str(e))
         self._pressione_enter_para_continuar()
 
-    def _exibir_lista_produtos(self, lista_produtos: list[Produto], titulo: str):
+    def _exibir_lista_produtos(self, lista_produtos: list[Produto], titulo: str, ordenar: bool = True):
         self._limpar_tela()
         print(f"{Cores.HEADER}{titulo}{Cores.ENDC}")
         if not lista_produtos:
@@ -304,23 +3269,23 @@ class InterfaceUsuario:
             return
         print(f"\n{Cores.BOLD}{'ID':<4} {'Nome':<25} {'Categoria':<15} {'Qtd':>5} {'Preço (R$)':>12}{Cores.ENDC}")
         print("-" * 78)
-        for p in sorted(lista_produtos, key=lambda prod: prod.nome):
+        for p in sorted(lista_produtos, key=lambda prod: prod.nome) if ordenar else lista_produtos:
             cor_qtd = Cores.WARNING if p.quantidade < self.gerenciador.estoque_minimo else ""
             preco_str = f"{p.preco:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
             print(f"{p.id:<4} {p.nome:<25} {p.categoria:<15} {cor_qtd}{p.quantidade:>5}{Cores.ENDC} {preco_str:>12}")
         print("-" * 78)
 
     def _relatorio_todos_produtos(self):
-        self._exibir_lista_produtos(list(self.gerenciador.produtos.values()), "--- Relatório: Todos os Produtos ---")
+        self._exibir_lista_produtos(self.gerenciador.consultar_produtos(), "--- Relatório: Todos os Produtos ---", ordenar=False)
 
     def _relatorio_estoque_baixo(self):
-        produtos_baixo = [p for p in self.gerenciador.produtos.values() if p.quantidade < self.gerenciador.estoque_minimo]
+        produtos_baixo = self.gerenciador.listar_estoque_baixo()
         if not produtos_baixo:
             self._limpar_tela()
             print(f"{Cores.HEADER}--- Relatório: Produtos com Estoque Baixo ---{Cores.ENDC}")
             self.exibir_sucesso(f"Nenhum produto com estoque abaixo de {self.gerenciador.estoque_minimo} unidades.")
             return
-        self._exibir_lista_produtos(produtos_baixo, "--- Relatório: Produtos com Estoque Baixo ---")
+        self._exibir_lista_produtos(produtos_baixo, "--- Relatório: Produtos com Estoque Baixo ---", ordenar=False)
 
     def buscar_produto_dialogo(self):
         while True:
@@ -329,8 +3294,8 @@ class InterfaceUsuario:
             termo = self._ler_texto("Digite o termo para buscar (ou 'cancelar' para voltar): ", permitir_vazio=True)
             if termo.lower() == 'cancelar' or not termo:
                 break
-            resultados = self.gerenciador.buscar_produtos_por_termo(termo)
-            self._exibir_lista_produtos(resultados, f"Resultados da Busca por '{termo}'")
+            resultados = self.gerenciador.buscar_produtos_por_termo(termo, limite=LIMITE_RESULTADOS_BUSCA)
+            self._exibir_lista_produtos(resultados, f"Resultados da Busca por '{termo}'", ordenar=False)
             self._pressione_enter_para_continuar()
     
     def _ver_detalhes_produto(self):
@@ -346,12 +3311,34 @@ class InterfaceUsuario:
         preco_str = f"R$ {produto.preco:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
         print(f"{Cores.BOLD}{'Preço:':<12}{Cores.ENDC}{preco_str}")
 
+    def _relatorio_consumo(self, dias: int = 30):
+        self._limpar_tela()
+        print(f"{Cores.HEADER}--- Relatório: Consumo e Giro dos Últimos {dias} Dias ---{Cores.ENDC}")
+        if not self.gerenciador.livro:
+            self.exibir_aviso("O livro de movimentações está desligado.")
+            return
+        inicio = date.today() - timedelta(days=dias - 1)
+        giro = {linha['id']: linha['giro'] for linha in self.gerenciador.relatorio_giro(inicio)}
+        linhas = self.gerenciador.relatorio_consumo(inicio)
+        if not linhas:
+            self.exibir_aviso("Nenhuma movimentação no período.")
+            return
+        print(f"\n{Cores.BOLD}{'ID':<4} {'Nome':<25} {'Entradas':>9} {'Saídas':>8} {'Saídas/dia':>11} {'Cobertura':>10} {'Giro':>6}{Cores.ENDC}")
+        print("-" * 78)
+        for linha in linhas[:20]:
+            cobertura = f"{linha['dias_cobertura']:.0f} d" if linha['dias_cobertura'] is not None else "-"
+            giro_str = f"{giro[linha['id']]:.2f}" if giro.get(linha['id']) is not None else "-"
+            print(f"{linha['id']:<4} {linha['nome'][:25]:<25} {linha['entradas']:>9} {linha['saidas']:>8} "
+                  f"{linha['consumo_diario']:>11.2f} {cobertura:>10} {giro_str:>6}")
+        print("-" * 78)
+
     # [ALTERADO] Menu de relatórios simplificado.
     def _menu_relatorios(self):
         acoes = {
             '1': self._relatorio_todos_produtos,
             '2': self._relatorio_estoque_baixo,
-            '3': self._ver_detalhes_produto
+            '3': self._ver_detalhes_produto,
+            '4': self._relatorio_consumo
         }
         while True:
             self._limpar_tela()
@@ -359,9 +3346,10 @@ class InterfaceUsuario:
             print("[1] Listar todos os produtos")
             print("[2] Listar produtos com estoque baixo")
             print(f"{Cores.OKCYAN}[3] Ver Detalhes de um Produto{Cores.ENDC}")
-            print("[4] Voltar ao menu principal")
+            print("[4] Consumo e giro dos últimos 30 dias")
+            print("[5] Voltar ao menu principal")
             opcao = input("\nEscolha uma opção: ")
-            if opcao == '4': break
+            if opcao == '5': break
             acao = acoes.get(opcao)
             if acao:
                 acao()
@@ -405,10 +3393,11 @@ class InterfaceUsuario:
             '5': self.remover_produto, '6': self.buscar_produto_dialogo,
         }
         while True:
+            self.gerenciador.sincronizar()
             opcao = self.menu_principal()
             if opcao == '7':
                 print(f"\n{Cores.OKCYAN}Saindo do sistema. Até logo!{Cores.ENDC}")
-                sys.exit()
+                return  # quem abriu o gerenciador (`main`) é quem o fecha
             acao = acoes.get(opcao)
             if acao:
                 acao()
@@ -416,11 +3405,168 @@ class InterfaceUsuario:
                 self.exibir_erro("Opção inválida.")
                 self._pressione_enter_para_continuar()
 
-def main():
-    """Função principal para inicializar e rodar o sistema."""
-    gerenciador = GerenciadorEstoque(nome_arquivo='meu_estoque.json', estoque_minimo=10)
+# --- LINHA DE COMANDO ---
+
+def _criar_parser() -> Any:
+    import argparse  # Só a linha de comando usa; o menu interativo não paga a importação.
+    comum = argparse.ArgumentParser(add_help=False)
+    comum.add_argument('--arquivo', default=ARQUIVO_PADRAO, help="arquivo (ou pasta) do estoque (padrão: %(default)s)")
+    comum.add_argument('--formato', choices=('texto', 'json'), default='texto', help="formato da saída (padrão: %(default)s)")
+    comum.add_argument('--estoque-minimo', type=int, default=10, help="limite do estoque baixo (padrão: %(default)s)")
+    parser = argparse.ArgumentParser(prog='gerenciador.py', description="EstoqueFácil. Sem argumentos, abre o menu interativo.")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    adicionar = comandos.add_parser('adicionar', parents=[comum], help="cadastra um produto (e a categoria, se for nova)")
+    adicionar.add_argument('nome')
+    adicionar.add_argument('--categoria', required=True)
+    adicionar.add_argument('--quantidade', type=int, required=True)
+    adicionar.add_argument('--preco', type=float, required=True)
+    adicionar.add_argument('--descricao', default='Sem descrição')
+
+    movimentar = comandos.add_parser('movimentar', parents=[comum], help="entrada (positiva) ou saída (negativa) de estoque")
+    movimentar.add_argument('id', type=int)
+    movimentar.add_argument('quantidade', type=int)
+    movimentar.add_argument('--motivo')
+
+    buscar = comandos.add_parser('buscar', parents=[comum], help="busca por ID, nome ou categoria")
+    buscar.add_argument('termo')
+    buscar.add_argument('--limite', type=int, default=LIMITE_RESULTADOS_BUSCA)
+
+    estatisticas = comandos.add_parser('estatisticas', parents=[comum], help="totais do estoque")
+    estatisticas.add_argument('--por-categoria', action='store_true')
+
+    relatorio = comandos.add_parser('relatorio', parents=[comum], help="estoque baixo, consumo ou giro")
+    relatorio.add_argument('tipo', choices=('estoque-baixo', 'consumo', 'giro'))
+    relatorio.add_argument('--dias', type=int, default=30, help="período do consumo e do giro, até hoje (padrão: %(default)s)")
+    relatorio.add_argument('--por', choices=('produto', 'categoria'), default='produto')
+    relatorio.add_argument('--limite', type=int)
+
+    comandos.add_parser('lote', parents=[comum], help="operações em JSON Lines lidas da entrada padrão",
+                        description='Uma operação por linha: {"op": "movimentar", "id": 1, "quantidade": -2, "motivo": "venda"} '
+                                    'ou {"op": "adicionar", "nome": ..., "categoria": ..., "quantidade": ..., "preco": ...}. '
+                                    'Cada bloco de linhas é gravado de uma vez; uma linha recusada não afeta as demais.')
+    return parser
+
+def _operacao_lote(gerenciador: GerenciadorEstoque, operacao: Any) -> Produto:
+    """Executa uma linha do comando `lote` e retorna o produto afetado."""
+    if not isinstance(operacao, dict):
+        raise ValueError("Cada linha deve ser um objeto JSON.")
+    if operacao.get('op') == 'movimentar':
+        id_produto, quantidade = operacao.get('id'), operacao.get('quantidade')
+        if not all(isinstance(valor, int) and not isinstance(valor, bool) for valor in (id_produto, quantidade)):
+            raise ValueError("'id' e 'quantidade' devem ser inteiros.")
+        motivo = operacao.get('motivo')
+        if motivo is not None and not isinstance(motivo, str):
+            raise ValueError("'motivo' deve ser um texto.")
+        produto = gerenciador.movimentar_estoque(id_produto, quantidade, motivo)
+        if produto is None:
+            raise ValueError(f"Produto com ID {id_produto} não encontrado.")
+        return produto
+    if operacao.get('op') == 'adicionar':
+        return gerenciador.adicionar_produtos_em_lote([operacao])[0]
+    raise ValueError(f"Operação desconhecida: {operacao.get('op')!r} (use 'adicionar' ou 'movimentar').")
+
+def _executar_lote(gerenciador: GerenciadorEstoque, entrada: Iterable[str], formato: str) -> int:
+    """Aplica as operações de `entrada` em blocos de `TAMANHO_BLOCO_LOTE`, com uma gravação por bloco."""
+    linhas = enumerate(entrada, 1)
+    total = recusadas = 0
+    while bloco := list(itertools.islice(linhas, TAMANHO_BLOCO_LOTE)):
+        resultados = []
+        with gerenciador.transacao():
+            for numero, linha in bloco:
+                if not linha.strip():
+                    continue
+                # As operações validam tudo antes de alterar o estado, então uma linha recusada
+                # não deixa nada pela metade na transação do bloco.
+                try:
+                    resultados.append({'linha': numero, 'produto': produto_para_dict(
+                        _operacao_lote(gerenciador, json.loads(linha)))})
+                except ValueError as erro:  # json.JSONDecodeError também é um ValueError.
+                    resultados.append({'linha': numero, 'erro': str(erro)})
+        total += len(resultados)
+        for resultado in resultados:
+            recusadas += 'erro' in resultado
+            if formato == 'json':
+                print(json.dumps(resultado, ensure_ascii=False))
+            elif 'erro' in resultado:
+                print(f"linha {resultado['linha']}: erro: {resultado['erro']}")
+            else:
+                produto = resultado['produto']
+                print(f"linha {resultado['linha']}: ok: ID {produto['id']}, quantidade {produto['quantidade']}")
+    print(f"{total} operações, {recusadas} recusadas.", file=sys.stderr)
+    return 1 if recusadas else 0
+
+def _resultado_comando(gerenciador: GerenciadorEstoque, args: Any) -> Any:
+    """Executa um comando simples e retorna o resultado em tipos serializáveis."""
+    if args.comando == 'adicionar':
+        return produto_para_dict(gerenciador.adicionar_produtos_em_lote([{
+            'nome': args.nome, 'categoria': args.categoria, 'descricao': args.descricao,
+            'quantidade': args.quantidade, 'preco': args.preco}])[0])
+    if args.comando == 'movimentar':
+        produto = gerenciador.movimentar_estoque(args.id, args.quantidade, args.motivo)
+        if produto is None:
+            raise ValueError(f"Produto com ID {args.id} não encontrado.")
+        return produto_para_dict(produto)
+    if args.comando == 'buscar':
+        return [produto_para_dict(p) for p in gerenciador.buscar_produtos_por_termo(args.termo, args.limite)]
+    if args.comando == 'estatisticas':
+        if args.por_categoria:
+            return [{'categoria': categoria, **valores}
+                    for categoria, valores in gerenciador.obter_estatisticas_por_categoria().items()]
+        return gerenciador.obter_estatisticas()
+    if args.tipo == 'estoque-baixo':
+        return [produto_para_dict(p) for p in gerenciador.listar_estoque_baixo(limite=args.limite)]
+    inicio = date.today() - timedelta(days=args.dias - 1)
+    relatorio = gerenciador.relatorio_consumo if args.tipo == 'consumo' else gerenciador.relatorio_giro
+    return relatorio(inicio, por=args.por)[:args.limite]
+
+def _imprimir(resultado: Any, formato: str) -> None:
+    """Mostra o resultado em JSON ou em texto separado por tabulações (listas com uma linha de cabeçalho)."""
+    if formato == 'json':
+        print(json.dumps(resultado, ensure_ascii=False))
+        return
+
+    def texto(valor: Any) -> str:
+        return '-' if valor is None else f"{valor:.2f}" if isinstance(valor, float) else str(valor)
+    if isinstance(resultado, dict):
+        print('\n'.join(f"{chave}\t{texto(valor)}" for chave, valor in resultado.items()))
+    elif resultado:
+        print('\t'.join(resultado[0]))
+        print('\n'.join('\t'.join(map(texto, linha.values())) for linha in resultado))
+
+def executar_comando(argv: list[str]) -> int:
+    """Executa um comando sem a interface interativa (para scripts) e retorna o código de saída.
+
+    Abre só o que o comando precisa: o livro de movimentações fica fechado fora de `movimentar`,
+    `lote` e dos relatórios de consumo e giro, e o índice de busca só é montado pelo `buscar`.
+    """
+    args = _criar_parser().parse_args(argv)
+    movimentos = args.comando in ('movimentar', 'lote') or getattr(args, 'tipo', None) in ('consumo', 'giro')
+    gerenciador = GerenciadorEstoque(args.arquivo, estoque_minimo=args.estoque_minimo,
+                                     movimentos=movimentos, busca_sob_demanda=True)
+    try:
+        if args.comando == 'lote':
+            return _executar_lote(gerenciador, sys.stdin, args.formato)
+        _imprimir(_resultado_comando(gerenciador, args), args.formato)
+        return 0
+    except ValueError as erro:
+        print(f"Erro: {erro}", file=sys.stderr)
+        return 1
+    finally:
+        gerenciador.fechar()
+
+def main(argv: list[str] | None = None) -> int:
+    """Função principal: sem argumentos, abre o menu interativo; com argumentos, executa um comando."""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        return executar_comando(argv)
+    gerenciador = GerenciadorEstoque(nome_arquivo=ARQUIVO_PADRAO, estoque_minimo=10)
     ui = InterfaceUsuario(gerenciador)
-    ui.iniciar()
+    try:
+        ui.iniciar()
+    finally:  # Ctrl+C ou fim da entrada também gravam o que estiver pendente.
+        gerenciador.fechar()
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""Compara memória e latência do armazenamento em dataclasses com o armazenamento colunar.
+
+A primeira tabela mede só o armazenamento dos produtos; a segunda, o `GerenciadorEstoque`
+inteiro carregado do disco, com os índices de busca e ordenados e as estatísticas.
+
+Uso: python medir_armazenamento.py [quantidade_de_produtos]
+"""
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+
+from gerenciador import CATEGORIAS_PADRAO, ArmazemColunar, EstatisticasEstoque, PersistenciaJson, Produto, _numpy
+
+ESTOQUE_MINIMO = 10
+
+@dataclass
+class ProdutoComDict:
+    """Réplica do `Produto` original (sem __slots__), usada como referência."""
+    id: int
+    nome: str
+    categoria: str
+    descricao: str
+    quantidade: int
+    preco: float
+
+def gerar_dados(quantidade: int) -> list[tuple]:
+    aleatorio = random.Random(42)
+    return [(i, f"Produto {i} {aleatorio.choice(CATEGORIAS_PADRAO)}", aleatorio.choice(CATEGORIAS_PADRAO),
+             aleatorio.choice(["Sem descrição", "Importado", "Nacional"]), aleatorio.randint(0, 200),
+             round(aleatorio.uniform(1, 500), 2)) for i in range(1, quantidade + 1)]
+
+def medir_memoria(construir) -> tuple[object, int]:
+    tracemalloc.start()
+    armazem = construir()
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return armazem, memoria
+
+def cronometrar(funcao, repeticoes: int = 3) -> float:
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor * 1000
+
+def recontar_dict(produtos: dict) -> EstatisticasEstoque:
+    estatisticas = EstatisticasEstoque(ESTOQUE_MINIMO)
+    estatisticas.recalcular(produtos.values())
+    return estatisticas
+
+def memoria_gerenciador(caminho: Path, opcoes: dict) -> int:
+    """Carrega o gerenciador em um processo novo, sem textos já internados por esta medição."""
+    codigo = ("import tracemalloc; from gerenciador import GerenciadorEstoque; tracemalloc.start(); "
+              f"g = GerenciadorEstoque({str(caminho)!r}, movimentos=False, **{opcoes!r}); "
+              "print(tracemalloc.get_traced_memory()[0]); g.fechar()")
+    saida = subprocess.run([sys.executable, '-c', codigo], cwd=Path(__file__).resolve().parent,
+                           capture_output=True, text=True, check=True)
+    return int(saida.stdout)
+
+def medir_gerenciadores(dados: list[tuple]) -> None:
+    """Mede a memória do gerenciador carregado, que é o que o processo paga de fato."""
+    pasta = Path(tempfile.mkdtemp(prefix='medir-armazenamento-'))
+    try:
+        caminho = pasta / 'estoque.json'
+        campos = ('id', 'nome', 'categoria', 'descricao', 'quantidade', 'preco')
+        PersistenciaJson(caminho)._gravar_snapshot({
+            'seq': 0, 'proximo_id': len(dados) + 1, 'categorias': sorted(CATEGORIAS_PADRAO),
+            'produtos': {linha[0]: dict(zip(campos, linha)) for linha in dados}})
+        variantes = {
+            'dicionário': {},
+            'colunar': {'colunar': True},
+            'colunar, busca sob demanda': {'colunar': True, 'busca_sob_demanda': True},
+        }
+        print(f"\n{'Gerenciador completo':<30}{'Memória (MB)':>14}")
+        for nome, opcoes in variantes.items():
+            print(f"{nome:<30}{memoria_gerenciador(caminho, opcoes) / 1024 / 1024:>14.1f}")
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    dados = gerar_dados(quantidade)
+    ids_consulta = random.Random(7).choices(range(1, quantidade + 1), k=100_000)
+
+    def construir_colunar():
+        armazem = ArmazemColunar()
+        for linha in dados:
+            armazem[linha[0]] = Produto(*linha)
+        return armazem
+
+    variantes = {
+        'dataclass (original)': lambda: {linha[0]: ProdutoComDict(*linha) for linha in dados},
+        'dataclass com __slots__': lambda: {linha[0]: Produto(*linha) for linha in dados},
+        'colunar': construir_colunar,
+    }
+    print(f"Catálogo sintético com {quantidade} produtos (NumPy: {'sim' if _numpy() else 'não'})\n")
+    print(f"{'Armazenamento':<26}{'Memória (MB)':>14}{'Recontagem (ms)':>18}{'Estoque baixo (ms)':>21}{'100k buscas ID (ms)':>22}")
+    for nome, construir in variantes.items():
+        armazem, memoria = medir_memoria(construir)
+        if isinstance(armazem, ArmazemColunar):
+            recontagem = cronometrar(lambda: armazem.recontar(ESTOQUE_MINIMO))
+            baixo = cronometrar(lambda: armazem.filtrar(faixas={'quantidade': (None, ESTOQUE_MINIMO - 1)}))
+        else:
+            recontagem = cronometrar(lambda: recontar_dict(armazem))
+            baixo = cronometrar(lambda: [p.id for p in armazem.values() if p.quantidade < ESTOQUE_MINIMO])
+        buscas = cronometrar(lambda: [armazem[i].quantidade for i in ids_consulta])
+        print(f"{nome:<26}{memoria / 1024 / 1024:>14.1f}{recontagem:>18.1f}{baixo:>21.1f}{buscas:>22.1f}")
+        del armazem
+    medir_gerenciadores(dados)
+
+if __name__ == "__main__":
+    main()
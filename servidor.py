@@ -0,0 +1,271 @@
+"""Serviço HTTP/JSON local que expõe o estoque a vários terminais ao mesmo tempo.
+
+Um único `GerenciadorEstoque` fica em memória. As leituras são respondidas direto dele, e
+as escritas entram numa fila atendida por uma só tarefa: ela junta as movimentações que
+chegaram juntas em uma transação, ou seja, uma gravação no diário para o grupo inteiro.
+Cada escrita só é respondida depois que a transação do seu grupo é confirmada.
+
+Rotas:
+    GET  /produtos?termo=&limite=              busca por ID, nome ou categoria
+    GET  /produtos?categoria=&deslocamento=&limite=   listagem por nome
+    GET  /produtos/{id}
+    GET  /estatisticas                         gerais e por categoria
+    POST /movimentos       {"id": 1, "quantidade": -2, "motivo": "venda"}
+    POST /movimentos/lote  {"movimentos": [{"id": 1, "quantidade": -2}, ...], "motivo": "venda"}
+
+Uso: python servidor.py [--arquivo meu_estoque.json] [--host 127.0.0.1] [--porta 8080] [--lote-maximo 1000]
+"""
+import argparse
+import asyncio
+import json
+import signal
+import sys
+import traceback
+from typing import Any, Callable
+from urllib.parse import parse_qs, urlsplit
+
+from gerenciador import ARQUIVO_PADRAO, LIMITE_RESULTADOS_BUSCA, TAMANHO_PAGINA, GerenciadorEstoque, produto_para_dict
+
+# Quantidade máxima de escritas enfileiradas aplicadas em uma mesma transação.
+LOTE_MAXIMO = 1_000
+TAMANHO_MAXIMO_CORPO = 1024 * 1024
+MOTIVOS_HTTP = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                409: 'Conflict', 411: 'Length Required', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+ROTAS = {'/produtos': 'GET', '/estatisticas': 'GET', '/movimentos': 'POST', '/movimentos/lote': 'POST'}
+
+class ErroHttp(ValueError):
+    """Erro de requisição com o status HTTP da resposta.
+
+    É um ValueError para que o escritor o trate como uma escrita recusada, e não como uma falha da transação.
+    """
+    def __init__(self, status: int, mensagem: str):
+        super().__init__(mensagem)
+        self.status = status
+
+def _inteiro(valor: Any, nome: str, minimo: int | None = None) -> int:
+    if isinstance(valor, str):
+        try:
+            valor = int(valor)
+        except ValueError:
+            raise ErroHttp(400, f"'{nome}' deve ser um inteiro.") from None
+    if not isinstance(valor, int) or isinstance(valor, bool) or (minimo is not None and valor < minimo):
+        raise ErroHttp(400, f"'{nome}' deve ser um inteiro{'' if minimo is None else f' maior ou igual a {minimo}'}.")
+    return valor
+
+async def _ler_linha(leitor: asyncio.StreamReader) -> bytes:
+    try:
+        return await leitor.readline()
+    except ValueError:  # `readline` troca o LimitOverrunError por ValueError.
+        raise ErroHttp(400, "Linha de requisição ou cabeçalho grande demais.") from None
+
+def _ler_json(corpo: bytes) -> dict[str, Any]:
+    try:
+        dados = json.loads(corpo)
+    except ValueError:
+        raise ErroHttp(400, "O corpo deve ser um JSON válido.") from None
+    if not isinstance(dados, dict):
+        raise ErroHttp(400, "O corpo deve ser um objeto JSON.")
+    return dados
+
+class ServidorEstoque:
+    """Atende as requisições HTTP e serializa as escritas em uma única tarefa (`_escritor`)."""
+
+    def __init__(self, gerenciador: GerenciadorEstoque, lote_maximo: int = LOTE_MAXIMO):
+        self.gerenciador = gerenciador
+        self.lote_maximo = lote_maximo
+        self.escritas = 0
+        self.transacoes = 0
+        self._fila: asyncio.Queue | None = None
+
+    async def executar(self, host: str, porta: int) -> None:
+        """Serve até receber SIGINT/SIGTERM; então para de aceitar conexões e conclui as escritas da fila."""
+        self._fila = asyncio.Queue()
+        escritor = asyncio.create_task(self._escritor())
+        parar = asyncio.Event()
+        for sinal in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_running_loop().add_signal_handler(sinal, parar.set)
+            except NotImplementedError:  # Windows: o Ctrl+C chega como KeyboardInterrupt.
+                pass
+        servidor = await asyncio.start_server(self._atender, host, porta)
+        print(f"Servindo {self.gerenciador.caminho_arquivo} em http://{host}:{porta}", file=sys.stderr, flush=True)
+        try:
+            await parar.wait()
+        finally:
+            servidor.close()
+            await self._fila.put(None)
+            await escritor
+
+    async def _escritor(self) -> None:
+        """Única tarefa que altera o estoque: aplica em uma transação tudo o que está na fila."""
+        while True:
+            item = await self._fila.get()
+            # Cede a vez uma vez, para que as requisições já recebidas também entrem no grupo.
+            await asyncio.sleep(0)
+            lote = []
+            while item is not None:
+                lote.append(item)
+                if len(lote) >= self.lote_maximo or self._fila.empty():
+                    break
+                item = self._fila.get_nowait()
+            if lote:
+                self._aplicar(lote)
+            if item is None:
+                return
+
+    def _aplicar(self, lote: list[tuple[Callable[[], Any], asyncio.Future]]) -> None:
+        resultados = []
+        try:
+            with self.gerenciador.transacao():
+                for operacao, futuro in lote:
+                    # As operações validam tudo antes de alterar o estado, então uma escrita
+                    # recusada não deixa nada pela metade na transação do grupo.
+                    try:
+                        resultados.append((futuro, operacao(), None))
+                    except ValueError as erro:
+                        resultados.append((futuro, None, erro))
+        except Exception as erro:  # Falha na gravação: a transação inteira foi desfeita.
+            for _, futuro in lote:
+                if not futuro.done():
+                    futuro.set_exception(erro)
+            return
+        self.escritas += len(lote)
+        self.transacoes += 1
+        for futuro, resultado, erro in resultados:
+            if futuro.done():  # O cliente desistiu (conexão fechada).
+                continue
+            if erro is None:
+                futuro.set_result(resultado)
+            else:
+                futuro.set_exception(erro)
+
+    async def _escrever(self, operacao: Callable[[], Any]) -> Any:
+        """Enfileira uma escrita para o `_escritor` e espera a confirmação da transação."""
+        futuro = asyncio.get_running_loop().create_future()
+        await self._fila.put((operacao, futuro))
+        return await futuro
+
+    def _movimentar(self, id_produto: int, quantidade: int, motivo: str | None) -> dict[str, Any]:
+        produto = self.gerenciador.movimentar_estoque(id_produto, quantidade, motivo)
+        if produto is None:
+            raise ErroHttp(404, f"Produto com ID {id_produto} não encontrado.")
+        return produto_para_dict(produto)
+
+    def _movimentar_lote(self, movimentos: list[tuple[int, int]], motivo: str | None) -> dict[str, Any]:
+        produtos = self.gerenciador.movimentar_estoque_em_lote(movimentos, motivo)
+        return {'produtos': [produto_para_dict(produto) for produto in produtos]}
+
+    async def _rotear(self, metodo: str, alvo: str, corpo: bytes) -> Any:
+        url = urlsplit(alvo)
+        caminho = url.path.rstrip('/') or '/'
+        consulta = {chave: valores[-1] for chave, valores in parse_qs(url.query).items()}
+        prefixo, _, id_texto = caminho.rpartition('/')
+        if prefixo == '/produtos':
+            if metodo != 'GET':
+                raise ErroHttp(405, f"Use GET em {caminho}.")
+            produto = self.gerenciador.buscar_produto(_inteiro(id_texto, 'id'))
+            if produto is None:
+                raise ErroHttp(404, f"Produto com ID {id_texto} não encontrado.")
+            return produto_para_dict(produto)
+        if caminho not in ROTAS:
+            raise ErroHttp(404, "Rota não encontrada.")
+        if metodo != ROTAS[caminho]:
+            raise ErroHttp(405, f"Use {ROTAS[caminho]} em {caminho}.")
+
+        if caminho == '/produtos':
+            if consulta.get('termo'):
+                limite = _inteiro(consulta.get('limite', LIMITE_RESULTADOS_BUSCA), 'limite', 1)
+                produtos = self.gerenciador.buscar_produtos_por_termo(consulta['termo'], limite)
+            else:
+                produtos = self.gerenciador.consultar_produtos(
+                    categoria=consulta.get('categoria'), deslocamento=_inteiro(consulta.get('deslocamento', 0), 'deslocamento', 0),
+                    limite=_inteiro(consulta.get('limite', TAMANHO_PAGINA), 'limite', 1))
+            return {'produtos': [produto_para_dict(produto) for produto in produtos]}
+        if caminho == '/estatisticas':
+            return {'gerais': self.gerenciador.obter_estatisticas(),
+                    'por_categoria': self.gerenciador.obter_estatisticas_por_categoria()}
+
+        dados = _ler_json(corpo)
+        motivo = dados.get('motivo')
+        if motivo is not None and not isinstance(motivo, str):
+            raise ErroHttp(400, "'motivo' deve ser um texto.")
+        if caminho == '/movimentos':
+            id_produto, quantidade = _inteiro(dados.get('id'), 'id'), _inteiro(dados.get('quantidade'), 'quantidade')
+            return await self._escrever(lambda: self._movimentar(id_produto, quantidade, motivo))
+        if not isinstance(dados.get('movimentos'), list) or not dados['movimentos']:
+            raise ErroHttp(400, "'movimentos' deve ser uma lista não vazia.")
+        if not all(isinstance(movimento, dict) for movimento in dados['movimentos']):
+            raise ErroHttp(400, "Cada movimento deve ser um objeto com 'id' e 'quantidade'.")
+        movimentos = [(_inteiro(movimento.get('id'), 'id'), _inteiro(movimento.get('quantidade'), 'quantidade'))
+                      for movimento in dados['movimentos']]
+        return await self._escrever(lambda: self._movimentar_lote(movimentos, motivo))
+
+    async def _atender(self, leitor: asyncio.StreamReader, escritor: asyncio.StreamWriter) -> None:
+        """Atende uma conexão (HTTP/1.1 com conexões persistentes) até o cliente fechá-la."""
+        try:
+            while True:
+                # Até o corpo estar delimitado, um erro fecha a conexão: o que vem depois não é confiável.
+                manter = False
+                try:
+                    if not (linha := await _ler_linha(leitor)):
+                        break
+                    partes = linha.decode('latin-1').split()
+                    cabecalhos = {}
+                    while (cabecalho := await _ler_linha(leitor)) not in (b'\r\n', b'\n', b''):
+                        nome, _, valor = cabecalho.decode('latin-1').partition(':')
+                        cabecalhos[nome.strip().lower()] = valor.strip()
+                    if len(partes) != 3:
+                        raise ErroHttp(400, "Linha de requisição inválida.")
+                    if 'transfer-encoding' in cabecalhos:
+                        raise ErroHttp(411, "Envie o corpo com Content-Length (Transfer-Encoding não é aceito).")
+                    tamanho = _inteiro(cabecalhos.get('content-length', '0'), 'Content-Length', 0)
+                    if tamanho > TAMANHO_MAXIMO_CORPO:
+                        raise ErroHttp(413, f"O corpo passa de {TAMANHO_MAXIMO_CORPO} bytes.")
+                    manter = (cabecalhos.get('connection', '').lower() == 'keep-alive' if partes[2] == 'HTTP/1.0'
+                              else cabecalhos.get('connection', '').lower() != 'close')
+                    corpo = await leitor.readexactly(tamanho) if tamanho else b''
+                    status, resposta = 200, await self._rotear(partes[0], partes[1], corpo)
+                except ErroHttp as erro:
+                    status, resposta = erro.status, {'erro': str(erro)}
+                except ValueError as erro:  # Regra de negócio (por exemplo, estoque insuficiente).
+                    status, resposta = 409, {'erro': str(erro)}
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception:
+                    traceback.print_exc()
+                    status, resposta = 500, {'erro': "Erro interno."}
+                dados = json.dumps(resposta, ensure_ascii=False).encode('utf-8')
+                escritor.write(f"HTTP/1.1 {status} {MOTIVOS_HTTP[status]}\r\n"
+                               f"Content-Type: application/json; charset=utf-8\r\n"
+                               f"Content-Length: {len(dados)}\r\n"
+                               f"Connection: {'keep-alive' if manter else 'close'}\r\n\r\n".encode('latin-1') + dados)
+                await escritor.drain()
+                if not manter:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escritor.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--arquivo', default=ARQUIVO_PADRAO, help="arquivo (ou pasta) do estoque (padrão: %(default)s)")
+    parser.add_argument('--host', default='127.0.0.1', help="endereço de escuta (padrão: %(default)s)")
+    parser.add_argument('--porta', type=int, default=8080)
+    parser.add_argument('--lote-maximo', type=int, default=LOTE_MAXIMO,
+                        help="escritas por transação; 1 desliga o agrupamento (padrão: %(default)s)")
+    parser.add_argument('--estoque-minimo', type=int, default=10)
+    args = parser.parse_args()
+
+    gerenciador = GerenciadorEstoque(args.arquivo, estoque_minimo=args.estoque_minimo)
+    servidor = ServidorEstoque(gerenciador, args.lote_maximo)
+    try:
+        asyncio.run(servidor.executar(args.host, args.porta))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gerenciador.fechar()
+        print(f"{servidor.escritas} escritas em {servidor.transacoes} transações.", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
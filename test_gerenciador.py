@@ -0,0 +1,459 @@
+"""Testes automatizados do `GerenciadorEstoque` (rode com `python -m pytest`)."""
+import io
+import json
+import random
+import time
+from datetime import date
+
+import pytest
+
+import gerenciador as gerenciador_modulo
+from gerenciador import (GerenciadorEstoque, IndiceOrdenado, Persistencia, Produto, ProdutosSqlite, importar_produtos,
+                         produto_para_dict)
+
+def estado(gerenciador: GerenciadorEstoque) -> dict:
+    return {'produtos': {id_p: produto_para_dict(p) for id_p, p in gerenciador.produtos.items()},
+            'proximo_id': gerenciador.proximo_id, 'categorias': sorted(gerenciador.categorias),
+            'estatisticas': gerenciador.obter_estatisticas()}
+
+@pytest.fixture
+def caminho(tmp_path):
+    return tmp_path / 'estoque.json'
+
+@pytest.fixture
+def gerenciador(caminho):
+    gerenciador = GerenciadorEstoque(caminho, movimentos=False)
+    gerenciador.adicionar_produto("Cabo USB", "Cabos", "Teste", 10, 5.0)
+    gerenciador.adicionar_produto("Capa", "Capas", "Teste", 3, 20.0)
+    yield gerenciador
+    gerenciador.fechar()
+
+# --- Transações ---
+
+def test_transacao_desfaz_tudo_quando_uma_operacao_falha(gerenciador, caminho):
+    antes = estado(gerenciador)
+    with pytest.raises(ValueError):
+        with gerenciador.transacao():
+            gerenciador.adicionar_produto("Novo", "Suporte", "Teste", 1, 1.0)
+            gerenciador.movimentar_estoque(1, -4)
+            gerenciador.atualizar_produto(2, "Capa nova", "Cabos", None)
+            gerenciador.remover_produto(1)
+            gerenciador.movimentar_estoque(2, -99)  # falta estoque: desfaz as anteriores
+    assert estado(gerenciador) == antes
+    assert [p.id for p in gerenciador.buscar_produtos_por_termo("capa")] == [2]
+    assert gerenciador.buscar_produtos_por_termo("novo") == []
+    # Nada da transação desfeita chegou ao diário.
+    assert estado(GerenciadorEstoque(caminho, movimentos=False)) == antes
+
+def test_lote_invalido_nao_aplica_nenhuma_movimentacao(gerenciador):
+    antes = estado(gerenciador)
+    with pytest.raises(ValueError):
+        gerenciador.movimentar_estoque_em_lote([(1, -2), (2, -1), (1, -9)])
+    assert estado(gerenciador) == antes
+
+def test_transacao_grava_uma_unica_linha_no_diario(gerenciador, caminho):
+    diario = caminho.with_name(caminho.name + '.diario')
+    linhas = len(diario.read_bytes().splitlines())
+    with gerenciador.transacao():
+        gerenciador.movimentar_estoque(1, -1)
+        gerenciador.movimentar_estoque(2, 4)
+    registros = [json.loads(linha) for linha in diario.read_bytes().splitlines()]
+    assert len(registros) == linhas + 1 and registros[-1]['op'] == 'lote'
+
+def test_gravacao_que_falha_nao_pula_numeros_no_diario(gerenciador, caminho, monkeypatch):
+    def falhar(*args):
+        raise OSError("disco cheio")
+    with monkeypatch.context() as contexto:
+        contexto.setattr(gerenciador.persistencia, 'registrar', falhar)
+        with pytest.raises(OSError):
+            gerenciador.movimentar_estoque(1, -1)
+    gerenciador.movimentar_estoque(2, 1)
+    diario = caminho.with_name(caminho.name + '.diario')
+    numeros = [json.loads(linha)['seq'] for linha in diario.read_bytes().splitlines()]
+    assert numeros == list(range(numeros[0], numeros[0] + len(numeros))) and numeros[-1] == gerenciador.seq
+    assert estado(GerenciadorEstoque(caminho, movimentos=False)) == estado(gerenciador)
+
+def test_transacao_desfaz_inclusoes_em_lote(gerenciador):
+    antes = estado(gerenciador)
+    with pytest.raises(ValueError):
+        with gerenciador.transacao():
+            gerenciador.adicionar_produtos_em_lote([
+                {'nome': f"Fone {i}", 'categoria': "Fones", 'quantidade': i, 'preco': 1.0} for i in range(5)])
+            gerenciador.movimentar_estoque(1, -99)
+    assert estado(gerenciador) == antes
+    assert gerenciador.buscar_produtos_por_termo("fone") == []
+    assert [p.id for p in gerenciador.consultar_produtos(ordenar_por='quantidade')] == [2, 1]
+
+def test_inclusao_em_lote_guarda_os_textos_sem_espacos_nas_pontas(gerenciador, caminho):
+    [fone] = gerenciador.adicionar_produtos_em_lote([{'nome': "  Fone  ", 'categoria': " Fones ", 'descricao': "  ",
+                                                      'quantidade': 1, 'preco': 2}])
+    assert (fone.nome, fone.categoria, fone.descricao) == ("Fone", "Fones", "Sem descrição")
+    assert [p.id for p in gerenciador.consultar_produtos(ordenar_por='nome')] == [1, 2, fone.id]
+    assert gerenciador.buscar_produtos_por_termo("fone")[0].id == fone.id
+    assert estado(GerenciadorEstoque(caminho, movimentos=False)) == estado(gerenciador)
+
+def test_comando_lote_recusa_so_as_linhas_com_tipos_invalidos(gerenciador, caminho, monkeypatch, capsys):
+    gerenciador.fechar()
+    linhas = [{'op': 'movimentar', 'id': 1, 'quantidade': -2},
+              {'op': 'adicionar', 'nome': "Fone", 'categoria': 5, 'quantidade': 1, 'preco': 1.0},
+              {'op': 'adicionar', 'nome': "Fone", 'categoria': "Fones", 'descricao': [], 'quantidade': 1, 'preco': 1.0},
+              {'op': 'adicionar', 'nome': "Fone", 'categoria': "Fones", 'quantidade': True, 'preco': 1.0},
+              {'op': 'movimentar', 'id': True, 'quantidade': 1},
+              {'op': 'adicionar', 'nome': "Fone", 'categoria': "Fones", 'quantidade': 4, 'preco': 9.0}]
+    monkeypatch.setattr('sys.stdin', io.StringIO(''.join(json.dumps(linha) + '\n' for linha in linhas)))
+    assert gerenciador_modulo.main(['lote', '--arquivo', str(caminho), '--formato', 'json']) == 1
+    resultados = [json.loads(linha) for linha in capsys.readouterr().out.splitlines()]
+    assert ['erro' in resultado for resultado in resultados] == [False, True, True, True, True, False]
+    reaberto = GerenciadorEstoque(caminho, movimentos=False)
+    assert reaberto.produtos[1].quantidade == 8 and reaberto.produtos[2].quantidade == 3
+    assert [(p.nome, p.categoria, p.quantidade) for p in reaberto.buscar_produtos_por_termo("fone")] == [("Fone", "Fones", 4)]
+    reaberto.fechar()
+
+def test_comando_lote_recusa_motivo_que_nao_e_texto(gerenciador, caminho, monkeypatch, capsys):
+    gerenciador.fechar()
+    linhas = [{'op': 'movimentar', 'id': 1, 'quantidade': -2, 'motivo': "venda"},
+              {'op': 'movimentar', 'id': 2, 'quantidade': 1, 'motivo': 5},
+              {'op': 'movimentar', 'id': 2, 'quantidade': -1}]
+    monkeypatch.setattr('sys.stdin', io.StringIO(''.join(json.dumps(linha) + '\n' for linha in linhas)))
+    assert gerenciador_modulo.main(['lote', '--arquivo', str(caminho), '--formato', 'json']) == 1
+    resultados = [json.loads(linha) for linha in capsys.readouterr().out.splitlines()]
+    assert ['erro' in resultado for resultado in resultados] == [False, True, False]
+    reaberto = GerenciadorEstoque(caminho)
+    assert [(p.id, p.quantidade) for p in reaberto.produtos.values()] == [(1, 8), (2, 2)]
+    assert [(m['id'], m['quantidade'], m['motivo']) for m in reaberto.livro.ler()] == [(1, -2, "venda"), (2, -1, None)]
+    reaberto.fechar()
+
+# --- Livro de movimentações ---
+
+def test_livro_so_le_os_resumos_no_primeiro_relatorio(caminho):
+    gerenciador = GerenciadorEstoque(caminho)
+    gerenciador.adicionar_produto("Cabo USB", "Cabos", "Teste", 10, 5.0)
+    gerenciador.movimentar_estoque(1, -2)
+    assert [(linha['entradas'], linha['saidas']) for linha in gerenciador.relatorio_consumo(date.today())] == [(0, 2)]
+    gerenciador.fechar()  # grava os resumos com a marca d'água
+    for quantidade in (5, -1):
+        gerenciador = GerenciadorEstoque(caminho)
+        gerenciador.movimentar_estoque(1, quantidade)
+        assert not gerenciador.livro._resumos_carregados
+        gerenciador.fechar()
+    gerenciador = GerenciadorEstoque(caminho)
+    assert [(linha['entradas'], linha['saidas']) for linha in gerenciador.relatorio_consumo(date.today())] == [(5, 3)]
+    gerenciador.fechar()
+
+def test_motivo_invalido_e_recusado_antes_da_transacao(caminho):
+    gerenciador = GerenciadorEstoque(caminho)
+    gerenciador.adicionar_produto("Cabo USB", "Cabos", "Teste", 10, 5.0)
+    antes = estado(gerenciador)
+    with pytest.raises(ValueError):
+        gerenciador.movimentar_estoque(1, -1, motivo=5)
+    with pytest.raises(ValueError):
+        gerenciador.movimentar_estoque_em_lote([(1, -1)], motivo=['venda'])
+    gerenciador.movimentar_estoque(1, -1, motivo="  \n ")  # só espaços: sem motivo
+    gerenciador.fechar()
+    reaberto = GerenciadorEstoque(caminho)
+    assert reaberto.produtos[1].quantidade == antes['produtos'][1]['quantidade'] - 1
+    assert [(m['quantidade'], m['motivo']) for m in reaberto.livro.ler()] == [(-1, None)]
+    reaberto.fechar()
+
+# --- Importação ---
+
+def test_importacao_equivale_a_cadastrar_um_a_um(gerenciador, caminho, tmp_path):
+    arquivo = tmp_path / 'fornecedor.jsonl'
+    linhas = [{'nome': f"Película {i}", 'categoria': ["Películas", "Cabos", "Novos"][i % 3], 'descricao': "",
+               'quantidade': str(i % 13), 'preco': f"{i},5"} for i in range(30)]
+    linhas[7]['quantidade'] = '²'
+    arquivo.write_text('\n'.join(json.dumps(linha) for linha in linhas), encoding='utf-8')
+    esperado = GerenciadorEstoque(tmp_path / 'esperado.json', movimentos=False)
+    esperado.adicionar_produto("Cabo USB", "Cabos", "Teste", 10, 5.0)
+    esperado.adicionar_produto("Capa", "Capas", "Teste", 3, 20.0)
+    for i, linha in enumerate(linhas):
+        if i != 7:
+            esperado.adicionar_categoria(linha['categoria'])
+            esperado.adicionar_produto(linha['nome'], linha['categoria'], "Sem descrição", i % 13, i + 0.5)
+
+    assert importar_produtos(gerenciador, arquivo, tamanho_bloco=8, processos=1) == {'importados': 29, 'rejeitados': 1}
+    assert estado(gerenciador) == estado(esperado)
+    for ordenar_por in ('nome', 'preco', 'quantidade'):
+        assert ([p.id for p in gerenciador.consultar_produtos(ordenar_por=ordenar_por, deslocamento=3, limite=9)] ==
+                [p.id for p in esperado.consultar_produtos(ordenar_por=ordenar_por, deslocamento=3, limite=9)])
+    assert [p.id for p in gerenciador.buscar_produtos_por_termo("pelicula 2")] == [
+        p.id for p in esperado.buscar_produtos_por_termo("pelicula 2")]
+    assert estado(GerenciadorEstoque(caminho, movimentos=False)) == estado(esperado)  # reaplicando o diário
+    esperado.fechar()
+
+# --- Reaplicação do diário ---
+
+def test_reabrir_sem_fechar_reaplica_o_diario(gerenciador, caminho):
+    gerenciador.movimentar_estoque_em_lote([(1, -3), (2, 2)])
+    gerenciador.atualizar_produto(1, None, "Capas", None)
+    gerenciador.remover_produto(2)
+    # Sem `fechar()`: simula a queda do processo depois das operações confirmadas.
+    assert estado(GerenciadorEstoque(caminho, movimentos=False)) == estado(gerenciador)
+
+def test_queda_no_meio_de_um_lote_descarta_a_linha_incompleta(gerenciador, caminho):
+    confirmado = estado(gerenciador)
+    diario = caminho.with_name(caminho.name + '.diario')
+    with diario.open('ab') as arquivo:  # o processo caiu enquanto gravava a transação seguinte
+        arquivo.write(b'{"seq":99,"op":"lote","ops":[{"op":"movimentar","id":1,"quantid')
+    reaberto = GerenciadorEstoque(caminho, movimentos=False)
+    assert estado(reaberto) == confirmado
+    reaberto.movimentar_estoque(1, 1)  # o diário continua utilizável depois do corte
+    assert GerenciadorEstoque(caminho, movimentos=False).produtos[1].quantidade == 11
+
+def test_gravacao_adiada_nao_bloqueia_outros_processos(gerenciador, caminho):
+    gerenciador.fechar()
+    diario = caminho.with_name(caminho.name + '.diario')
+    adiado = GerenciadorEstoque(caminho, movimentos=False, gravacao_adiada=0.3)
+    tamanho = diario.stat().st_size
+    adiado.movimentar_estoque(1, 4)  # entrada: espera a janela
+    assert diario.stat().st_size == tamanho
+    outro = GerenciadorEstoque(caminho, movimentos=False)  # não espera a janela do primeiro
+    outro.movimentar_estoque(1, -10)  # o outro ainda vê 10
+    mouse = outro.adicionar_produto("Mouse", "Mouses", "Teste", 2, 1.0)
+    outro.fechar()
+    time.sleep(0.5)  # a thread gravadora encontra o diário alterado e deixa a fila para este processo
+    # Saídas e inclusões são conferidas e gravadas na hora, sobre o estado atual do diário.
+    with pytest.raises(ValueError):
+        adiado.movimentar_estoque(1, -5)
+    fone = adiado.adicionar_produto("Fone", "Fones", "Teste", 1, 1.0)
+    adiado.movimentar_estoque(1, -4)
+    assert (mouse.id, fone.id) == (3, 4)
+    esperado = estado(adiado)
+    adiado.fechar()
+    relido = GerenciadorEstoque(caminho, movimentos=False)
+    assert estado(relido) == esperado
+    assert relido.produtos[mouse.id].nome == "Mouse" and relido.produtos[fone.id].nome == "Fone"
+    assert relido.produtos[1].quantidade == 0
+    assert all(produto.quantidade >= 0 for produto in relido.produtos.values())
+    relido.fechar()
+
+def test_fechar_de_novo_nao_grava_nem_trava_outra_vez(gerenciador, caminho, monkeypatch):
+    gerenciador.fechar()
+    adiado = GerenciadorEstoque(caminho, movimentos=False, gravacao_adiada=0.3)
+    adiado.movimentar_estoque(1, 4)
+    chamadas = []
+    descarregar = adiado.persistencia.descarregar
+    monkeypatch.setattr(adiado.persistencia, 'descarregar', lambda: chamadas.append(1) or descarregar())
+    adiado.fechar()
+    adiado.fechar()
+    assert len(chamadas) == 1
+    assert GerenciadorEstoque(caminho, movimentos=False).produtos[1].quantidade == 14
+
+def test_sair_do_menu_fecha_o_gerenciador_uma_vez(gerenciador, caminho, monkeypatch):
+    gerenciador.fechar()
+    monkeypatch.setattr(gerenciador_modulo, 'ARQUIVO_PADRAO', str(caminho))
+    monkeypatch.setattr('builtins.input', lambda _='': '7')
+    fechamentos = []
+    fechar = GerenciadorEstoque.fechar
+    monkeypatch.setattr(GerenciadorEstoque, 'fechar', lambda self: fechamentos.append(self) or fechar(self))
+    assert gerenciador_modulo.main([]) == 0
+    assert len(fechamentos) == 1
+
+# --- Leitura do snapshot ---
+
+@pytest.mark.parametrize('incremental', ['0', '1'])
+def test_leituras_do_snapshot_carregam_o_mesmo_estado(gerenciador, caminho, monkeypatch, incremental):
+    gerenciador._salvar_dados()
+    monkeypatch.setenv('ESTOQUE_JSON_INCREMENTAL', incremental)
+    reaberto = GerenciadorEstoque(caminho, movimentos=False)
+    assert reaberto.persistencia.leitura_incremental == (incremental == '1')
+    assert estado(reaberto) == estado(gerenciador)
+
+@pytest.mark.parametrize('incremental', ['0', '1'])
+@pytest.mark.parametrize('conteudo', [b'[1, 2]', b'{"seq": 1, "produtos": [1]}', b'{"seq": 1, "produt'])
+def test_snapshot_em_formato_inesperado_e_guardado_a_parte(tmp_path, monkeypatch, incremental, conteudo):
+    monkeypatch.setenv('ESTOQUE_JSON_INCREMENTAL', incremental)
+    caminho = tmp_path / 'estoque.json'
+    caminho.write_bytes(conteudo)
+    gerenciador = GerenciadorEstoque(caminho, movimentos=False)
+    assert len(gerenciador.produtos) == 0
+    assert [copia.read_bytes() for copia in tmp_path.glob('estoque.json.corrompido-*')] == [conteudo]
+    gerenciador.fechar()
+
+def test_snapshot_corrompido_com_diario_guarda_os_dois_e_comeca_vazio(gerenciador, caminho):
+    gerenciador._salvar_dados()
+    gerenciador.movimentar_estoque(1, -1)  # o diário depende do snapshot que vai corromper
+    caminho.write_bytes(b'{"seq": 2, "produt')
+    reaberto = GerenciadorEstoque(caminho, movimentos=False)
+    assert len(reaberto.produtos) == 0
+    assert sorted(copia.name.partition('.corrompido-')[0] for copia in caminho.parent.glob('*.corrompido-*')) == [
+        'estoque.json', 'estoque.json.diario']
+    reaberto.adicionar_produto("Capa", "Capas", "Teste", 3, 20.0)
+    reaberto.fechar()
+    assert [p.nome for p in GerenciadorEstoque(caminho, movimentos=False).produtos.values()] == ["Capa"]
+
+# --- Busca ---
+
+@pytest.mark.parametrize('termo', ['²', '١٢', '1²'])
+def test_busca_com_digitos_nao_ascii_nao_falha(gerenciador, termo):
+    assert gerenciador.buscar_produtos_por_termo(termo) == []
+
+def test_busca_por_id_exato_vem_primeiro(gerenciador):
+    assert [p.id for p in gerenciador.buscar_produtos_por_termo("2")][:1] == [2]
+
+def test_busca_ignora_entradas_de_nomes_antigos_e_removidos(gerenciador):
+    for i in range(800):  # remoções suficientes para reconstruir as listas do índice
+        gerenciador.adicionar_produto(f"Fone {i}", "Fones", "Teste", 1, 1.0)
+    for id_p in range(3, 803):
+        gerenciador.remover_produto(id_p)
+    gerenciador.atualizar_produto(1, "Carregador", None, None)
+    assert gerenciador.buscar_produtos_por_termo("usb") == []
+    assert gerenciador.buscar_produtos_por_termo("fone") == []
+    assert [p.id for p in gerenciador.buscar_produtos_por_termo("carreg")] == [1]
+    assert sorted(p.id for p in gerenciador.buscar_produtos_por_termo("ca")) == [1, 2]
+
+# --- Armazenamento colunar ---
+
+def test_colunar_filtra_e_reconta_como_o_dicionario(tmp_path):
+    dicionario = GerenciadorEstoque(tmp_path / 'dicionario.json', movimentos=False)
+    colunar = GerenciadorEstoque(tmp_path / 'colunar.json', movimentos=False, colunar=True)
+    for gerenciador in (dicionario, colunar):
+        aleatorio = random.Random(11)
+        for i in range(200):
+            gerenciador.adicionar_produto(f"Produto {i}", aleatorio.choice(["Cabos", "Capas", "Fones"]), "Teste",
+                                          aleatorio.randint(0, 30), round(aleatorio.uniform(1, 100), 2))
+        for id_p in range(1, 200, 7):
+            gerenciador.remover_produto(id_p)
+    filtros = [{}, {'categoria': "Capas"}, {'quantidade_max': 9}, {'categoria': "Cabos", 'preco_min': 10, 'preco_max': 60}]
+    for filtro in filtros:
+        assert ([produto_para_dict(p) for p in colunar.consultar_produtos(**filtro)] ==
+                [produto_para_dict(p) for p in dicionario.consultar_produtos(**filtro)])
+    recontagem, esperada = colunar._recontar_estatisticas(), dicionario._recontar_estatisticas()
+    assert recontagem.gerais == pytest.approx(esperada.gerais)
+    assert recontagem.por_categoria.keys() == esperada.por_categoria.keys()
+    for categoria, valores in esperada.por_categoria.items():
+        assert recontagem.por_categoria[categoria] == pytest.approx(valores)
+    dicionario.fechar()
+    colunar.fechar()
+
+# --- Catálogo fragmentado ---
+
+def test_fragmentado_compacta_sem_montar_o_indice_de_busca(tmp_path):
+    pasta = tmp_path / 'estoque'
+    pasta.mkdir()
+    gerenciador = GerenciadorEstoque(pasta, movimentos=False, busca_sob_demanda=True)
+    gerenciador.adicionar_produtos_em_lote([{'nome': f"Item {i}", 'categoria': f"Categoria {i % 3}",
+                                             'quantidade': i, 'preco': 2.0} for i in range(9)])
+    gerenciador.atualizar_produto(1, None, "Categoria 1", None)
+    gerenciador.remover_produto(5)
+    gerenciador.persistencia.salvar(gerenciador)
+    assert gerenciador._busca is None
+    esperado = estado(gerenciador)
+    gerenciador.fechar()
+    assert estado(GerenciadorEstoque(pasta, movimentos=False)) == esperado
+
+@pytest.mark.parametrize('linha', [[1, "Cabo", "Teste", "dez", 5.0], [1, "Cabo", "Teste", 10], {'id': 1}])
+def test_fragmento_com_linha_malformada_e_guardado_a_parte(tmp_path, linha):
+    pasta = tmp_path / 'estoque'
+    pasta.mkdir()
+    gerenciador = GerenciadorEstoque(pasta, movimentos=False)
+    gerenciador.adicionar_produto("Cabo USB", "Cabos", "Teste", 10, 5.0)
+    gerenciador.adicionar_produto("Capa", "Capas", "Teste", 3, 20.0)
+    gerenciador.fechar()
+    fragmento = next(pasta.glob('cabos-*.json'))
+    dados = json.loads(fragmento.read_text(encoding='utf-8'))
+    dados['produtos'][0] = linha
+    fragmento.write_text(json.dumps(dados), encoding='utf-8')
+    reaberto = GerenciadorEstoque(pasta, movimentos=False)
+    assert [p.nome for p in reaberto.produtos.values()] == ["Capa"]
+    assert reaberto.obter_estatisticas()['total_produtos'] == 1
+    assert list(pasta.glob('cabos-*.json.corrompido-*'))
+    reaberto.fechar()
+
+# --- SQLite ---
+
+def test_sqlite_mantem_estatisticas_iguais_a_recontagem(tmp_path):
+    banco = tmp_path / 'estoque.db'
+    gerenciador, outro = GerenciadorEstoque(banco, movimentos=False), GerenciadorEstoque(banco, movimentos=False)
+    assert gerenciador.obter_estatisticas()['total_produtos'] == 0  # guarda o estoque mínimo e liga os gatilhos
+    aleatorio = random.Random(3)
+    for passo in range(300):
+        alvo = aleatorio.choice((gerenciador, outro))  # o outro processo também atualiza os agregados
+        ids = list(alvo.produtos)
+        sorteio = aleatorio.random()
+        if not ids or sorteio < 0.3:
+            alvo.adicionar_produto(f"Produto {passo}", aleatorio.choice(["Cabos", "Capas"]), "Teste",
+                                   aleatorio.randint(0, 20), 2.5)
+        elif sorteio < 0.6:
+            alvo.movimentar_estoque(aleatorio.choice(ids), aleatorio.randint(0, 5))
+        elif sorteio < 0.8:
+            alvo.atualizar_produto(aleatorio.choice(ids), None, aleatorio.choice(["Cabos", "Capas", "Fones"]), 4.0)
+        else:
+            alvo.remover_produto(aleatorio.choice(ids))
+    with pytest.raises(ValueError):
+        with gerenciador.transacao():
+            gerenciador.adicionar_produto("Desfeito", "Novos", "Teste", 1, 1.0)
+            gerenciador.movimentar_estoque(next(iter(gerenciador.produtos)), -1_000)
+    for estoque_minimo in (10, 3):  # outro estoque mínimo refaz a tabela
+        gerenciador.estoque_minimo = estoque_minimo
+        mantidas = gerenciador.persistencia.estatisticas(estoque_minimo)
+        recontagem = gerenciador.persistencia.estatisticas(estoque_minimo, recontar=True)
+        mantidas.conferir(recontagem)
+        assert mantidas.por_categoria.keys() == recontagem.por_categoria.keys()
+    outro.fechar()
+    gerenciador.fechar()
+
+def test_sqlite_busca_com_digitos_nao_ascii_e_recusa_colunar(tmp_path):
+    gerenciador = GerenciadorEstoque(tmp_path / 'estoque.db', movimentos=False)
+    gerenciador.adicionar_produto("Cabo USB", "Cabos", "Teste", 10, 5.0)
+    assert gerenciador.buscar_produtos_por_termo('²') == []
+    gerenciador.fechar()
+    with pytest.raises(ValueError):
+        GerenciadorEstoque(tmp_path / 'colunar.db', colunar=True)
+    assert not (tmp_path / 'colunar.db').exists()
+
+def test_cache_do_sqlite_tem_limite(tmp_path):
+    gerenciador = GerenciadorEstoque(tmp_path / 'estoque.db', movimentos=False)
+    gerenciador.produtos = gerenciador.persistencia.produtos = ProdutosSqlite(gerenciador.persistencia._conexao, 10)
+    with gerenciador.transacao():  # na transação, nada é descartado
+        for i in range(25):
+            gerenciador.adicionar_produto(f"Produto {i}", "Cabos", "Teste", i, 1.0)
+    assert len(gerenciador.produtos._cache) == 25
+    gerenciador.produtos.descartar_cache()
+    assert [gerenciador.produtos[id_p].quantidade for id_p in range(1, 26)] == list(range(25))
+    assert len(gerenciador.produtos._cache) <= 10
+    gerenciador.fechar()
+
+def test_persistencia_incompleta_nao_pode_ser_instanciada(tmp_path):
+    class SemSalvar(Persistencia):
+        def carregar(self, gerenciador): ...
+        def registrar(self, gerenciador, registro): ...
+    with pytest.raises(TypeError):
+        SemSalvar(tmp_path / 'estoque')
+
+# --- Índices ordenados ---
+
+def test_indice_ordenado_equivale_a_uma_lista_ordenada(monkeypatch):
+    monkeypatch.setattr(gerenciador_modulo, 'TAMANHO_BLOCO_INDICE', 4)  # força divisões e blocos esvaziados
+    aleatorio = random.Random(5)
+    indice = IndiceOrdenado('quantidade')
+    referencia: set[tuple[int, int]] = set()
+    produtos = {}
+    for passo in range(3000):
+        if produtos and aleatorio.random() < 0.45:
+            produto = produtos.pop(aleatorio.choice(list(produtos)))
+            indice.remover(produto)
+            referencia.discard((produto.quantidade, produto.id))
+        else:
+            produto = Produto(passo, "p", "C", "", aleatorio.randint(0, 40), 1.0)
+            produtos[passo] = produto
+            indice.adicionar(produto)
+            referencia.add((produto.quantidade, produto.id))
+        if passo % 97 == 0:
+            ordenada = sorted(referencia)
+            minimo, maximo = sorted(aleatorio.sample(range(-2, 43), 2))
+            dentro = [id_p for valor, id_p in ordenada if minimo <= valor <= maximo]
+            deslocamento = aleatorio.randint(0, 10)
+            assert indice.contar(minimo, maximo) == len(dentro)
+            assert list(indice.intervalo(minimo, maximo, deslocamento=deslocamento)) == dentro[deslocamento:]
+            assert list(indice.intervalo(minimo, maximo, True, deslocamento)) == dentro[::-1][deslocamento:]
+            assert list(indice.intervalo()) == [id_p for _, id_p in ordenada]
+
+def test_pagina_sem_filtros_igual_a_fatia_da_lista_completa(gerenciador):
+    for i in range(60):
+        gerenciador.adicionar_produto(f"Produto {i:02d}", "Cabos", "Teste", i % 7, float(i))
+    for ordenar_por in ('nome', 'preco', 'quantidade'):
+        for decrescente in (False, True):
+            completa = gerenciador.consultar_produtos(ordenar_por=ordenar_por, decrescente=decrescente)
+            assert gerenciador.consultar_produtos(ordenar_por=ordenar_por, decrescente=decrescente,
+                                                   deslocamento=25, limite=10) == completa[25:35]